@@ -1,5 +1,7 @@
 from .assistant_agent import ConfigurableAssistantAgent, get_llm_config_from_app
-from typing import Dict, Any, Optional
+from core.local_diagrams import SEQUENCE_DIAGRAM_PLACEHOLDER
+from core.profiler import profiled
+from typing import Dict, Any, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,16 +13,17 @@ class APIDesignGeneratorAgent(ConfigurableAssistantAgent):
     """
     DEFAULT_SYSTEM_MESSAGE = "あなたはプロフェッショナルなAPI設計書作成アシスタントです。提供された情報を元に、詳細なAPI仕様書を日本語で作成してください。" # フォールバック用
 
-    def __init__(self, app_config: Dict[str, Any], **kwargs):
+    def __init__(self, app_config: Dict[str, Any], tier: Optional[str] = None, **kwargs):
         """
         コンストラクタ。
 
         Args:
             app_config (Dict[str, Any]): アプリケーション設定。
+            tier (Optional[str]): 使用するモデルのティア (core.model_router.route_for の結果)。省略時は llm_config.model。
             **kwargs: ConfigurableAssistantAgentに渡されるその他の引数。
         """
         agent_name = "APIDesignGenerator"
-        llm_config = get_llm_config_from_app(app_config)
+        llm_config = get_llm_config_from_app(app_config, tier)
         
         prompts_config = app_config.get('prompts', {})
         system_message = prompts_config.get('api_design_generator', self.DEFAULT_SYSTEM_MESSAGE)
@@ -32,17 +35,25 @@ class APIDesignGeneratorAgent(ConfigurableAssistantAgent):
             **kwargs
         )
 
-    def generate_api_document_prompt(self, single_api_analysis: str, full_analysis_report: Optional[str] = None) -> str:
+    @classmethod
+    @profiled("prompt_building")
+    def generate_api_document_prompt(cls, single_api_analysis: str, full_analysis_report: Optional[str] = None,
+                                     sequence_diagram: Optional[str] = None, family_template: bool = False) -> str:
         """
         単一のAPIに関する設計書を生成させるためのLLMへの指示メッセージを作成します。
         このメッセージは、UserProxyAgentからこのAgent (AssistantAgent) に送信され、
         LLMがAPI設計書を生成する際の基礎となります。
+        LLM設定を必要としないため、ドライラン見積もりではインスタンス化せずにクラスから呼び出します。
 
         Args:
             single_api_analysis (str): CodebaseAnalyzerAgentによって抽出された、
                                        単一のAPIエンドポイントに関する分析情報ブロック。
             full_analysis_report (Optional[str]): CodebaseAnalyzerAgentによって生成された
                                                   完全なコード分析レポート。追加コンテキストとして利用可能。
+            sequence_diagram (Optional[str]): ソースコードからローカルで組み立てたシーケンス図 (Mermaid)。
+                                              指定した場合、LLMには図を書かせず、プレースホルダーと説明文だけを書かせます。
+            family_template (bool): 構造が同じ他のAPI (core.endpoint_families) の雛形としても使われるかどうか。
+                                    True の場合、リソース名を訳さずにクラス名・識別子のまま書くよう指示します。
 
         Returns:
             str: LLMへのAPI設計書生成指示を含むメッセージ文字列。
@@ -53,26 +64,79 @@ class APIDesignGeneratorAgent(ConfigurableAssistantAgent):
         # そのため、ここではユーザーメッセージとして、分析対象となる単一のAPI情報を提供します。
         # full_analysis_report もコンテキストとして含めることで、API間の関連性や
         # DTOの詳細などをLLMが参照できる可能性を高めます（トークン数に注意）。
+        #
+        # プロバイダ側のプレフィックスキャッシュ (同じ先頭部分を持つリクエストの入力を再利用する仕組み) が効くよう、
+        # 全APIで共通の部分 (指示文と全体分析レポート) を先頭に置き、APIごとに異なる部分は末尾にまとめます。
+        # 共通部分にAPIごとの値を混ぜると、システムプロンプト以降のキャッシュが効かなくなるので注意してください。
 
         prompt_parts = []
-        prompt_parts.append("以下のAPI分析情報に基づいて、このAPIに関する詳細な設計書を、システムプロンプトの指示に従って作成してください。")
-        prompt_parts.append("\n--- 対象API分析情報 ---")
-        prompt_parts.append(f"```text\n{single_api_analysis}\n```")
+        prompt_parts.append("このメッセージの末尾にある「対象API分析情報」に基づいて、このAPIに関する詳細な設計書を、システムプロンプトの指示に従って作成してください。")
 
         if full_analysis_report:
+            prompt_parts.append("以下の全体分析レポートは、必要に応じて参照してください（特にDTOの定義や他のコンポーネントとの関連など）。ただし、設計書の主対象は末尾の「対象API分析情報」です。")
             prompt_parts.append("\n--- 全体コード分析レポート (参考コンテキスト) ---")
-            # トークン数を考慮し、全体レポートはサマリーや必要な部分に絞ることも検討できますが、
-            # まずはそのまま渡してみます。
-            # CodebaseAnalyzerAgentの出力の "== APIエンドポイント分析結果 ==" 以外の部分
-            # (DBエンティティやその他コンポーネント) が特に有用かもしれません。
-            # ここでは簡単のため、APIリスト以外の部分を抽出する処理は省略し、
-            # 必要であれば Agent のプロンプト側で「このAPI情報に基づいて」と明記することで、
-            # LLMが single_api_analysis に集中するように促します。
-            # もしくは、`app.py` 側で `full_analysis_report` からAPIリスト部分を除去して渡すことも考えられます。
-            # 今回は、`single_api_analysis` に集中するよう指示し、`full_analysis_report` は補足とします。
-            prompt_parts.append("以下の全体分析レポートは、必要に応じて参照してください（特にDTOの定義や他のコンポーネントとの関連など）。ただし、設計書の主対象は上記の「対象API分析情報」です。")
             prompt_parts.append(f"```text\n{full_analysis_report}\n```")
-        
-        prompt_parts.append("\n指示に従い、Mermaid図を含めたこのAPI専用の詳細な設計書を日本語で生成してください。")
-        
-        return "\n\n".join(prompt_parts) 
\ No newline at end of file
+
+        # ここから下はAPIごとに異なる部分
+        prompt_parts.append("\n--- 対象API分析情報 ---")
+        prompt_parts.append(f"```text\n{single_api_analysis}\n```")
+
+        if family_template:
+            prompt_parts.append(
+                "この設計書は、構造が同じ他のAPIの設計書の雛形としても使われます。"
+                "リソース名・DTO名・パス・パラメータ名は日本語に訳さず、ソースコードのクラス名・識別子のまま記載してください。"
+                "説明文でリソースに言及するときも、「`User` の情報を取得します」のようにクラス名をバッククォートで囲んで記載し、"
+                "「ユーザー」「注文」のような日本語の名詞には言い換えないでください。"
+            )
+
+        prompt_parts.extend(cls._sequence_diagram_parts(sequence_diagram))
+        return "\n\n".join(prompt_parts)
+
+    @classmethod
+    @profiled("prompt_building")
+    def generate_api_delta_prompt(cls, canonical_identifier: str, canonical_document: str, single_api_analysis: str,
+                                  referenced_types: Optional[str] = None, sequence_diagram: Optional[str] = None) -> str:
+        """
+        構造が同じAPI (ファミリーの代表) の設計書を雛形にして、対象APIの設計書を生成させるためのメッセージを作成します。
+        全体の分析レポートは含めず、雛形との差分 (パス・パラメータ・DTOのフィールド) だけを渡すため、
+        通常の生成より入力が小さくなります。
+
+        Args:
+            canonical_identifier (str): 雛形にするAPIの識別子 (例: "GET /api/users/{id}")。
+            canonical_document (str): 雛形にするAPIの設計書。
+            single_api_analysis (str): 対象APIの分析情報ブロック。
+            referenced_types (Optional[str]): 対象APIが参照する DTO・エンティティのフィールド一覧
+                                              (core.endpoint_families.describe_referenced_types の結果)。
+            sequence_diagram (Optional[str]): 対象APIのシーケンス図 (Mermaid)。
+
+        Returns:
+            str: LLMへの指示メッセージ文字列。
+        """
+        # 指示文 → 雛形 (同じファミリーのメンバー間で共通) → 対象APIの情報の順に並べ、プレフィックスキャッシュを効かせる
+        prompt_parts = [
+            "以下の「雛形の設計書」は、対象APIと構造が同じAPIの設計書です。これを雛形として、対象APIの設計書を作成してください。",
+            "見出しと構成は雛形と同じにし、API名・パス・パラメータ・リクエスト/レスポンスの項目・説明文を対象APIに合わせて書き換えてください。"
+            "雛形と対象APIで異なる部分 (DTOのフィールドなど) は、末尾の対象APIの情報を正としてください。",
+            f"\n--- 雛形の設計書 ({canonical_identifier}) ---",
+            f"```markdown\n{canonical_document}\n```",
+            "\n--- 対象API分析情報 ---",
+            f"```text\n{single_api_analysis}\n```",
+        ]
+        if referenced_types:
+            prompt_parts.append("\n--- 対象APIが参照するクラスのフィールド (ソースコードから抽出) ---")
+            prompt_parts.append(f"```text\n{referenced_types}\n```")
+        prompt_parts.extend(cls._sequence_diagram_parts(sequence_diagram))
+        return "\n\n".join(prompt_parts)
+
+    @staticmethod
+    def _sequence_diagram_parts(sequence_diagram: Optional[str]) -> List[str]:
+        if not sequence_diagram:
+            return ["\n指示に従い、Mermaid図を含めたこのAPI専用の詳細な設計書を日本語で生成してください。"]
+        return [
+            "\n--- 処理フローのシーケンス図 (ソースコードから自動生成済み) ---",
+            f"```mermaid\n{sequence_diagram}\n```",
+            "このシーケンス図は設計書に自動で挿入されます。Mermaidのシーケンス図は出力せず、"
+            f"「シーケンス図」のセクションには `{SEQUENCE_DIAGRAM_PLACEHOLDER}` の1行だけを書き、"
+            "その下に処理の流れ (条件分岐やエラー時の挙動を含む) を文章で説明してください。",
+            "\n指示に従い、このAPI専用の詳細な設計書を日本語で生成してください。",
+        ] 
\ No newline at end of file
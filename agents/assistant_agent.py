@@ -1,6 +1,8 @@
 import autogen
 from typing import Optional, Dict, Any
 
+from core.model_router import build_llm_config, model_routing_settings
+
 class ConfigurableAssistantAgent(autogen.AssistantAgent):
     """
     設定ファイルからLLM構成を読み込むことができる AssistantAgent のカスタム版。
@@ -29,13 +31,47 @@ class ConfigurableAssistantAgent(autogen.AssistantAgent):
             **kwargs
         )
 
-def get_llm_config_from_app(app_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 直近のLLM応答の使用量 (モデル名・トークン数)。呼び出しごとの計測に使います。
+        self.last_usage: Optional[Dict[str, Any]] = None
+        if getattr(self, "client", None) is not None:
+            original_create = self.client.create
+
+            def create_and_record_usage(*args, **create_kwargs):
+                response = original_create(*args, **create_kwargs)
+                self.last_usage = extract_usage(response)
+                return response
+
+            self.client.create = create_and_record_usage
+
+def extract_usage(response: Any) -> Dict[str, Any]:
+    """
+    OpenAI形式の応答オブジェクトから、モデル名とトークン使用量を取り出します。
+    キャッシュから返された応答など、usage を持たない場合は各値を0とします。
+
+    Args:
+        response (Any): OpenAIWrapper.create の戻り値。
+
+    Returns:
+        Dict[str, Any]: model, prompt_tokens, completion_tokens, cached_tokens を持つ辞書。
+    """
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "model": getattr(response, "model", None),
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+def get_llm_config_from_app(app_config: Dict[str, Any], tier: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     アプリケーション設定辞書からAutogenに必要なLLM設定を抽出します。
     APIキーは環境変数 OPENAI_API_KEY から読み込まれることを想定しています。
 
     Args:
         app_config (Dict[str, Any]): ロードされた app_config.yaml の内容。
+        tier (Optional[str]): model_routing のティア名。ルーティングが有効な場合は、ティアの主モデルと
+                              フォールバックモデルを並べた config_list 形式の設定を返します。
 
     Returns:
         Optional[Dict[str, Any]]: Autogen用のLLM設定辞書。または設定がない場合はNone。
@@ -44,6 +80,9 @@ def get_llm_config_from_app(app_config: Dict[str, Any]) -> Optional[Dict[str, An
         print("エラー: app_config に llm_config が見つかりません。")
         return None
     
+    if tier and model_routing_settings(app_config)["enabled"]:
+        return build_llm_config(app_config, tier)
+
     # app_configからllm_config部分を取得
     config = app_config.get('llm_config', {})
     
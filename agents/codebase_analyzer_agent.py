@@ -1,4 +1,6 @@
 from .assistant_agent import ConfigurableAssistantAgent, get_llm_config_from_app
+from core.profiler import profiled
+from core.source_loader import get_source_loader
 from typing import Dict, Any, Optional, List
 from pathlib import Path # Pathオブジェクトを扱うために追加
 import logging # ログ出力用
@@ -13,16 +15,17 @@ class CodebaseAnalyzerAgent(ConfigurableAssistantAgent):
     MAX_FILES_TO_ANALYZE = 5  # 一度に分析するJavaファイルの最大数
     MAX_CHARS_PER_FILE = 4000 # 各ファイルから読み込む最大文字数 (トークン数に注意)
 
-    def __init__(self, app_config: Dict[str, Any], **kwargs):
+    def __init__(self, app_config: Dict[str, Any], tier: Optional[str] = None, **kwargs):
         """
         コンストラクタ。
 
         Args:
             app_config (Dict[str, Any]): アプリケーション設定。
+            tier (Optional[str]): 使用するモデルのティア (core.model_router.route_for の結果)。省略時は llm_config.model。
             **kwargs: ConfigurableAssistantAgentに渡されるその他の引数。
         """
         agent_name = "JavaCodeAnalyzer"
-        llm_config = get_llm_config_from_app(app_config)
+        llm_config = get_llm_config_from_app(app_config, tier)
         
         prompts_config = app_config.get('prompts', {})
         system_message = prompts_config.get('codebase_analyzer', self.DEFAULT_SYSTEM_MESSAGE)
@@ -34,10 +37,13 @@ class CodebaseAnalyzerAgent(ConfigurableAssistantAgent):
             **kwargs
         )
 
-    def analyze_codebase(self, codebase_path: str, java_files: List[Path], project_structure: str) -> str:
+    @classmethod
+    @profiled("prompt_building")
+    def analyze_codebase(cls, codebase_path: str, java_files: List[Path], project_structure: str) -> str:
         """
         コードベースの分析を実行するための詳細なプロンプトメッセージを生成します。
         このメッセージはUserProxyAgentからこのAgent (AssistantAgent) に送信され、LLMによる分析の基礎となります。
+        LLM設定を必要としないため、ドライラン見積もりではインスタンス化せずにクラスから呼び出します。
 
         Args:
             codebase_path (str): 分析対象のコードベースのパス。
@@ -50,18 +56,12 @@ class CodebaseAnalyzerAgent(ConfigurableAssistantAgent):
         num_java_files_total = len(java_files)
         
         # LLMに渡すメッセージの構築開始 (全体を三重引用符で囲む)
+        # プロジェクトによらない指示文を先頭に置き、プロジェクト固有の情報は後ろにまとめる
+        # (システムプロンプトと指示文がプロバイダ側のプレフィックスキャッシュに載るようにするため)
         analysis_prompt_message = f"""Javaコードベースの分析リクエスト：
 
-プロジェクトパス: {codebase_path}
-検出されたJavaファイル総数: {num_java_files_total}
-
-プロジェクト構造の概要:
-```text
-{project_structure[:1000]}...
-```
-
 主要なJavaファイルの分析:
-分析対象として、以下のJavaファイルの内容（一部）を提供します。
+分析対象として、このメッセージの後半にJavaファイルの内容（一部）を提供します。
 これらの情報とあなたの知識に基づき、プロジェクトの主要なAPIエンドポイント、データベースエンティティ、
 およびその他の重要なコンポーネントを特定し、構造化された形式で報告してください。
 特にSpring BootのRestControllerアノテーションやJPAのEntityアノテーションに注目してください。
@@ -74,25 +74,36 @@ APIエンドポイント:
 - User: id, name, email
 - Order: id, userId, amount
 
+プロジェクトパス: {codebase_path}
+検出されたJavaファイル総数: {num_java_files_total}
+
+プロジェクト構造の概要:
+```text
+{project_structure[:1000]}...
+```
+
 """
 
-        files_to_include_in_prompt = java_files[:self.MAX_FILES_TO_ANALYZE]
+        files_to_include_in_prompt = java_files[:cls.MAX_FILES_TO_ANALYZE]
         # この部分も、文字列の追加なので += を使うが、追加する文字列自体がf-string
         analysis_prompt_message += f"分析対象のファイル ({len(files_to_include_in_prompt)}件):\n\n"
 
-        for i, file_path_obj in enumerate(files_to_include_in_prompt):
+        # ファイルは共有ソースローダーで並列に読み込む (文字コードの自動判定・キャッシュあり)
+        loaded_files = get_source_loader().read_many(files_to_include_in_prompt, max_chars=cls.MAX_CHARS_PER_FILE)
+        for i, (file_path_obj, loaded) in enumerate(zip(files_to_include_in_prompt, loaded_files)):
             try:
+                if loaded["error"]:
+                    raise OSError(loaded["error"])
                 relative_file_path = file_path_obj.relative_to(Path(codebase_path))
                 # ファイルヘッダー部分 (f-string)
                 analysis_prompt_message += f"--- ファイル {i+1}: {relative_file_path} ---\n"
-                with open(file_path_obj, 'r', encoding='utf-8') as f:
-                    content = f.read(self.MAX_CHARS_PER_FILE)
-                    # コードブロック部分 (ここが重要、三重引用符のf-stringにする)
-                    analysis_prompt_message += f"""```java
+                content = loaded["text"]
+                # コードブロック部分 (ここが重要、三重引用符のf-stringにする)
+                analysis_prompt_message += f"""```java
 {content}
 ```
 """
-                if len(content) == self.MAX_CHARS_PER_FILE:
+                if loaded["truncated"]:
                     analysis_prompt_message += "... (ファイル内容が長いため一部省略)\n"
                 analysis_prompt_message += "\n" # 各ファイル間の追加の改行
             except Exception as e:
@@ -1,4 +1,6 @@
 from .assistant_agent import ConfigurableAssistantAgent, get_llm_config_from_app
+from core.local_diagrams import ER_DIAGRAM_PLACEHOLDER
+from core.profiler import profiled
 from typing import Dict, Any, Optional
 import logging
 
@@ -11,16 +13,17 @@ class DBDesignGeneratorAgent(ConfigurableAssistantAgent):
     """
     DEFAULT_SYSTEM_MESSAGE = "あなたは経験豊富なデータベース設計アシスタントです。提供された情報を元に、詳細なデータベース設計書を日本語で作成してください。" # フォールバック用
 
-    def __init__(self, app_config: Dict[str, Any], **kwargs):
+    def __init__(self, app_config: Dict[str, Any], tier: Optional[str] = None, **kwargs):
         """
         コンストラクタ。
 
         Args:
             app_config (Dict[str, Any]): アプリケーション設定。
+            tier (Optional[str]): 使用するモデルのティア (core.model_router.route_for の結果)。省略時は llm_config.model。
             **kwargs: ConfigurableAssistantAgentに渡されるその他の引数。
         """
         agent_name = "DBDesignGenerator"
-        llm_config = get_llm_config_from_app(app_config)
+        llm_config = get_llm_config_from_app(app_config, tier)
         
         prompts_config = app_config.get('prompts', {})
         system_message = prompts_config.get('db_design_generator', self.DEFAULT_SYSTEM_MESSAGE)
@@ -32,15 +35,20 @@ class DBDesignGeneratorAgent(ConfigurableAssistantAgent):
             **kwargs
         )
 
-    def generate_db_document_prompt(self, analysis_report: str) -> str:
+    @classmethod
+    @profiled("prompt_building")
+    def generate_db_document_prompt(cls, analysis_report: str, er_diagram: Optional[str] = None) -> str:
         """
         データベース設計書を生成させるためのLLMへの指示メッセージを作成します。
         このメッセージは、UserProxyAgentからこのAgent (AssistantAgent) に送信され、
         LLMがデータベース設計書を生成する際の基礎となります。
+        LLM設定を必要としないため、ドライラン見積もりではインスタンス化せずにクラスから呼び出します。
 
         Args:
             analysis_report (str): CodebaseAnalyzerAgentによって生成されたコード分析レポート。
                                    このレポートには、データベースエンティティに関する情報が含まれていることを期待します。
+            er_diagram (Optional[str]): JPAアノテーションからローカルで組み立てたER図 (Mermaid)。
+                                        指定した場合、LLMにはER図を書かせず、プレースホルダーだけを書かせます。
 
         Returns:
             str: LLMへのデータベース設計書生成指示を含むメッセージ文字列。
@@ -53,6 +61,50 @@ class DBDesignGeneratorAgent(ConfigurableAssistantAgent):
 {analysis_report}
 ```
 
-指示に従い、ER図 (Mermaid形式) や状態遷移図 (Mermaid形式) を含めた詳細なデータベース設計書を日本語で生成してください。
 """
-        return prompt 
\ No newline at end of file
+        if er_diagram:
+            prompt += f"""ER図 (ソースコードのJPAアノテーションから自動生成済み):
+```mermaid
+{er_diagram}
+```
+
+このER図は設計書に自動で挿入されます。ER図 (erDiagram) は出力せず、「エンティティ関連図」のセクションには
+`{ER_DIAGRAM_PLACEHOLDER}` の1行だけを書いてください。テーブル定義はER図のテーブル名・カラム・キーと一致させてください。
+指示に従い、状態遷移図 (Mermaid形式、必要な場合) を含めた詳細なデータベース設計書を日本語で生成してください。
+"""
+        else:
+            prompt += "指示に従い、ER図 (Mermaid形式) や状態遷移図 (Mermaid形式) を含めた詳細なデータベース設計書を日本語で生成してください。\n"
+        return prompt
+
+    @classmethod
+    @profiled("prompt_building")
+    def generate_db_cluster_prompt(cls, cluster_context: str, cluster_index: int, cluster_count: int) -> str:
+        """
+        エンティティのクラスタ1つ分のテーブル定義 (と必要に応じて状態遷移図) を生成させるためのメッセージを作成します。
+        エンティティ数が多い場合に、DB設計書をクラスタごとに分割して並列に生成するために使われます。
+        全体のER図と見出しはローカルで組み立てるため、LLMには出力させません。
+
+        Args:
+            cluster_context (str): クラスタに含まれるエンティティの情報 (core.db_sharding.format_cluster_context の結果)。
+            cluster_index (int): クラスタの番号 (1始まり)。
+            cluster_count (int): クラスタの総数。
+
+        Returns:
+            str: LLMへの指示メッセージ文字列。
+        """
+        # 全クラスタで共通の指示を先頭に、クラスタごとに異なる部分を末尾に置く (プロバイダ側のプレフィックスキャッシュのため)
+        prompt = f"""データベース設計書を、関連のあるエンティティのまとまり (クラスタ) ごとに分けて作成しています。
+このリクエストでは、末尾の「エンティティ情報」に含まれるエンティティだけを対象にしてください。
+
+以下の形式で、日本語で出力してください。
+- 各エンティティについて「#### テーブル名: (テーブル名)」の見出しで始まるテーブル定義 (論理名・物理名・クラス名・説明・カラム定義の表・インデックス) を記述してください。
+- 他のクラスタのエンティティとの関連は、カラム定義の説明/備考に参照先テーブルとして記載してください。
+- 明確な状態とその遷移を持つエンティティがある場合のみ、最後に「#### 状態遷移図: (エンティティ名)」の見出しと `stateDiagram-v2` 形式のMermaid図を追加してください。
+- ER図 (erDiagram) と、「#」「##」「###」の見出しは出力しないでください (全体のER図と見出しは別途作成されます)。
+
+クラスタ {cluster_index}/{cluster_count} のエンティティ情報:
+```text
+{cluster_context}
+```
+"""
+        return prompt
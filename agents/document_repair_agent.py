@@ -0,0 +1,83 @@
+from .assistant_agent import ConfigurableAssistantAgent, get_llm_config_from_app
+from core.profiler import profiled
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DocumentRepairAgent(ConfigurableAssistantAgent):
+    """
+    生成済み設計書の部分修正を担当するAgent。
+    ローカル検証で不正と判定されたMermaidブロックや、欠落している必須セクションだけを受け取り、
+    その部分だけを生成し直します (設計書全体の再生成は行いません)。
+    """
+    DEFAULT_SYSTEM_MESSAGE = "あなたはMermaid記法と技術文書の校正を行うアシスタントです。指示された部分だけを修正し、説明文を付けずに結果のみを出力してください。" # フォールバック用
+
+    def __init__(self, app_config: Dict[str, Any], tier: Optional[str] = None, **kwargs):
+        """
+        コンストラクタ。
+
+        Args:
+            app_config (Dict[str, Any]): アプリケーション設定。
+            tier (Optional[str]): 使用するモデルのティア (core.model_router.route_for の結果)。省略時は llm_config.model。
+            **kwargs: ConfigurableAssistantAgentに渡されるその他の引数。
+        """
+        agent_name = "DocumentRepairer"
+        llm_config = get_llm_config_from_app(app_config, tier)
+
+        prompts_config = app_config.get('prompts', {})
+        system_message = prompts_config.get('document_repair', self.DEFAULT_SYSTEM_MESSAGE)
+
+        super().__init__(
+            name=agent_name,
+            llm_config=llm_config,
+            system_message=system_message,
+            **kwargs
+        )
+
+    @profiled("prompt_building")
+    def generate_mermaid_repair_prompt(self, mermaid_code: str, errors: List[str]) -> str:
+        """
+        構文エラーのあるMermaid図1つを修正させるための指示メッセージを作成します。
+
+        Args:
+            mermaid_code (str): 修正対象のMermaidコード (コードフェンスを除く)。
+            errors (List[str]): ローカル検証で検出されたエラーメッセージ。
+
+        Returns:
+            str: LLMへの修正指示を含むメッセージ文字列。
+        """
+        error_lines = "\n".join(f"- {error}" for error in errors)
+        return f"""以下のMermaid図には構文エラーがあります。図の意味と図の種類は変えずに、エラー箇所だけを修正してください。
+修正後のMermaidコードを ```mermaid コードブロック1つだけで出力してください。説明文は不要です。
+
+検出されたエラー:
+{error_lines}
+
+修正対象:
+```mermaid
+{mermaid_code}
+```
+"""
+
+    @profiled("prompt_building")
+    def generate_section_prompt(self, section_title: str, source_context: str) -> str:
+        """
+        設計書に欠けている必須セクション1つを生成させるための指示メッセージを作成します。
+
+        Args:
+            section_title (str): 欠けているセクションの見出し (例: "4. 認証・認可")。
+            source_context (str): セクションの内容の根拠となる分析情報 (単一APIの分析ブロックなど)。
+
+        Returns:
+            str: LLMへのセクション生成指示を含むメッセージ文字列。
+        """
+        return f"""設計書から「{section_title}」セクションが欠落しています。
+以下の分析情報に基づいて、このセクションだけを「### {section_title}」という見出しから始まるMarkdownで日本語で作成してください。
+他のセクションや前置きの説明文は出力しないでください。
+
+分析情報:
+```text
+{source_context}
+```
+"""
@@ -1,20 +1,25 @@
+import time
+_SCRIPT_STARTED_AT = time.perf_counter() # 再実行ごとのレイテンシ計測用 (インポートより前に記録する)
+
 import streamlit as st
 import yaml
 import os
+import logging
 from pathlib import Path
-import autogen
 from dotenv import load_dotenv # .envファイル読み込みのため追加
-from typing import Dict, List, Tuple # Tupleを追加
-import re # 正規表現モジュールをインポート
+from typing import Dict, List, Optional
 from datetime import datetime # datetimeをインポート
 from copy import deepcopy # deepcopyを追加
 
-from core.file_utils import get_project_structure_text, get_java_files, sanitize_filename, save_markdown_to_file # sanitize_filename と save_markdown_to_file を追加
-from agents.codebase_analyzer_agent import CodebaseAnalyzerAgent
-from agents.api_design_generator_agent import APIDesignGeneratorAgent
-from agents.db_design_generator_agent import DBDesignGeneratorAgent
-from agents.user_proxy_agent import StreamlitUserProxyAgent
-# from agents.assistant_agent import get_llm_config_from_app # Agent内で呼び出すので不要かも
+from core.file_utils import get_project_structure_text, get_java_files, save_design_documents
+from core.config_loader import load_config_cached, resolve_ui_texts
+from core.mermaid_validator import split_mermaid_parts, validate_mermaid
+from core.profiler import profiling_settings, start_profiling, stop_profiling
+from core.source_loader import configure_source_loader
+# autogen / openai / tiktoken を読み込む Agent モジュールは重いため、
+# パイプライン実行時に run_full_analysis_pipeline 内でインポートします。
+
+logger = logging.getLogger(__name__)
 
 # .envファイルから環境変数を読み込む (アプリケーションの最初の方で呼び出す)
 load_dotenv()
@@ -25,6 +30,51 @@ CONFIG_FILE_PATH = Path(__file__).resolve().parent / "configs" / "app_config.yam
 # グローバル変数として設定を保持 (アプリケーション全体で利用するため)
 APP_CONFIG = {}
 
+# UIテキストのデフォルト値 (app_config.yaml の ui_texts で上書きされます)
+UI_TEXT_DEFAULTS = {
+    'app_title': "コード分析・設計書生成システム",
+    'codebase_path_label': "分析対象のJavaコードベースへの絶対パス:",
+    'start_analysis_button': "分析開始",
+    'error_path_invalid': "有効なディレクトリパスを入力してください。",
+    'error_path_not_found': "指定されたパスが見つかりません。",
+    'analysis_in_progress': "分析を実行中です。しばらくお待ちください...",
+    'results_title': "生成された設計ドキュメント",
+    'directory_structure_title': "ディレクトリ構造",
+    'java_files_title': "検出されたJavaファイル",
+    'initial_analysis_title': "初期分析結果 (Agent応答)",
+    'api_docs_tab': "API仕様書",
+    'db_docs_tab': "データベース設計書",
+    'mermaid_render_error': "Mermaid図のレンダリングに失敗しました。コードを確認してください。",
+    'project_overview_tab': "プロジェクト概要",
+    'no_apis_found': "APIエンドポイントは見つかりませんでした。",
+    'input_section_header': "1. 分析対象の指定",
+    'no_documents_to_save': "保存できる生成済みドキュメントがありません。",
+    'save_all_to_project_root_button': "一括保存",
+    'save_all_success_message': "全ての設計書がプロジェクトルートの {path} に保存されました。",
+    'save_all_error_message': "設計書の一括保存(プロジェクトルート)中にエラーが発生しました。",
+    'info_project_overview_empty': "分析を開始すると、ここにプロジェクトの概要情報が表示されます。",
+    'expander_raw_analyzer_output': "CodebaseAnalyzerAgentの生出力を見る",
+    'info_initial_analysis_empty': "分析を開始すると、ここにコード分析Agentの初期レポートが表示されます。",
+    'info_api_docs_empty': "分析が完了すると、ここにAPI仕様書が表示されます。",
+    'info_db_docs_empty': "分析が完了すると、ここにデータベース設計書が表示されます。",
+    'dry_run_button': "見積もり (ドライラン)",
+    'dry_run_help': "LLMを呼び出さずに、送信されるプロンプトを組み立ててトークン数・コスト・所要時間を見積もります。",
+    'dry_run_in_progress': "プロンプトを組み立ててトークン数を計算しています...",
+    'dry_run_result_title': "ドライラン見積もり",
+    'export_site_button': "静的サイトを出力",
+    'export_site_help': "設計書一式を、サーバー不要で閲覧・全文検索できる静的HTMLサイトとして分析対象の出力ディレクトリに出力します。2回目以降は変更されたページだけを書き直します。",
+    'export_site_success_message': "静的サイトを {path} に出力しました ({pages}ページ、更新 {written}ページ、{seconds:.2f}秒)。",
+    'export_site_error_message': "静的サイトの出力中にエラーが発生しました。",
+    'resume_run_notice': "中断または一部の生成に失敗した分析があります (実行ID: {run_id}、開始: {created_at}、失敗: {failures}件)。再開すると、保存済みの結果はそのまま使い、残りと失敗した項目だけを生成します。",
+    'resume_run_button': "中断した分析を再開",
+    'llm_usage_title': "直近の分析のLLM使用量 (プロンプトキャッシュを含む)",
+    'watch_mode_toggle': "ウォッチモード (変更を検知して設計書を自動更新)",
+    'watch_mode_help': "分析対象のコードベースを監視し、変更されたファイルに関係するAPI設計書・DB設計書だけをバックグラウンドで再生成します。",
+    'profiling_toggle': "プロファイリング",
+    'profiling_help': "画面の再実行ごとに、ローカル処理 (ツリー構築・ファイル探索・プロンプト組み立て・レポート解析・Mermaidの分割など) のCPU時間とメモリを段階ごとに計測し、flamegraph形式のプロファイルと概要を出力します。",
+    'profiling_output_caption': "🔬 前回の再実行のプロファイル: {path}",
+}
+
 # --- 設定読み込み関数 ---
 def load_config():
     """
@@ -32,8 +82,8 @@ def load_config():
     """
     global APP_CONFIG
     try:
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            APP_CONFIG = yaml.safe_load(f)
+        # ファイルが更新されていなければ、解析済みの設定がキャッシュから返されます
+        APP_CONFIG = load_config_cached(CONFIG_FILE_PATH)
         if not APP_CONFIG: # 空のファイルや不正な形式の場合
             st.error("設定ファイル (app_config.yaml) の読み込みに失敗しました。内容を確認してください。")
             APP_CONFIG = {} # エラー時もAPP_CONFIGが定義されるようにする
@@ -46,6 +96,9 @@ def load_config():
             )
             # return False # キーがなくても起動はさせるが、Agent呼び出しで失敗する
 
+        # ソースファイル読み込みの設定 (設定が変わらなければ既存のローダーとキャッシュを使い続けます)
+        configure_source_loader(APP_CONFIG.get('source_loader'))
+
         # LLM設定の検証
         llm_conf = APP_CONFIG.get('llm_config', {})
         if not llm_conf.get('model'):
@@ -69,53 +122,14 @@ def load_config():
 
 # display_directory_tree 関数は core.file_utils.get_project_structure_text に置き換えられたため削除
 
-def parse_api_endpoints_from_report(analysis_report_text: str) -> List[Tuple[str, str]]:
-    """
-    CodebaseAnalyzerAgentの分析レポートからAPIエンドポイントのリストを抽出します。
-    各APIのタイトル (例: "API 1: GET /api/users/{id}") と詳細情報をタプルで返します。
-    """
-    api_endpoints = []
-    try:
-        api_list_match = re.search(r"API_LIST_START(.*?)API_LIST_END", analysis_report_text, re.DOTALL)
-        if api_list_match:
-            api_content = api_list_match.group(1).strip()
-            # "### API X:" または "### API X (追加情報):" のようなパターンで分割
-            # 各APIブロックは "### API" で始まる想定
-            raw_apis = re.split(r"(?=### API\s*\d*[:\s])", api_content)
-            for api_block in raw_apis:
-                api_block = api_block.strip()
-                if not api_block.startswith("### API"):
-                    continue
-
-                title_match = re.search(r"###\s*(API\s*\d*[:\s]*.*?)\n", api_block, re.IGNORECASE)
-                api_title = title_match.group(1).strip() if title_match else f"API Endpoint {len(api_endpoints) + 1}"
-
-                http_method_match = re.search(r"-\s*HTTPメソッド\s*:\s*(.+)", api_block, re.IGNORECASE)
-                path_match = re.search(r"-\s*パス\s*:\s*(.+)", api_block, re.IGNORECASE)
-                
-                identifier = api_title # デフォルト
-                if http_method_match and path_match:
-                    identifier = f"{http_method_match.group(1).strip()} {path_match.group(1).strip()}"
-                
-                api_endpoints.append((identifier, api_block))
-        
-        if not api_endpoints and "API_LIST_START" in analysis_report_text:
-             st.warning("API_LIST_START/ENDブロックは検出されましたが、個別のAPI情報を抽出できませんでした。CodebaseAnalyzerAgentの出力形式を確認してください。")
-        elif not api_endpoints:
-            st.info("分析レポート内にAPI_LIST_START/ENDブロックが見つかりませんでした。APIは検出されなかった可能性があります。")
-
-    except Exception as e:
-        st.error(f"APIエンドポイントの解析中にエラーが発生しました: {e}")
-    return api_endpoints
-
-def run_full_analysis_pipeline(codebase_path_str: str, java_files_list: List[Path], dir_tree_str: str, status_container=None) -> Dict[str, any]:
+def run_full_analysis_pipeline(codebase_path_str: str, java_files_list: List[Path], dir_tree_str: str, status_container=None,
+                               resume_run_id: Optional[str] = None) -> Dict[str, any]:
     """
     コード分析から設計書生成までの完全なパイプラインを実行します。
-    結果は st.session_state に直接書き込まれます。
+    パイプライン本体は core.pipeline にあり、ここでは結果を st.session_state と履歴に反映します。
+    完了した段階とドキュメントは実行ごとのチェックポイントに保存され、resume_run_id を指定するとその実行の続きから生成します。
     """
     global APP_CONFIG
-    results = {"status": "Error", "message": "パイプラインの開始に失敗しました。", 
-                 "initial_analysis": "", "api_docs": {}, "db_doc": ""}
 
     def log_to_status(message, level="info"):
         if status_container:
@@ -130,156 +144,170 @@ def run_full_analysis_pipeline(codebase_path_str: str, java_files_list: List[Pat
             elif level == "warning": st.warning(message)
             else: st.info(message)
 
-    if not APP_CONFIG:
-        results["message"] = "アプリケーション設定がロードされていません。処理を中止します。"
-        log_to_status(results["message"], "error")
-        return results
-    
-    if not os.getenv("OPENAI_API_KEY"):
-        results["message"] = "OPENAI_API_KEYが設定されていません。.envファイルを確認してください。Agent処理をスキップします。"
-        log_to_status(results["message"], "error")
-        return results
+    # autogen (および openai / tiktoken) の読み込みはパイプライン内で初めて行われます
+    from core.checkpoint import open_checkpoint
+    from core.pipeline import run_analysis_pipeline
+    from core.single_flight import analysis_request_key, get_coordinator
 
-    try:
-        user_proxy = StreamlitUserProxyAgent(
-            name="StreamlitUserProxy",
-            human_input_mode="NEVER",
-            code_execution_config=False,
-        )
+    request_key = analysis_request_key(codebase_path_str, java_files_list, APP_CONFIG)
 
-        st.session_state.analysis_results_text = ""
-        st.session_state.api_documents = {}
-        st.session_state.db_document = ""
-        st.session_state.project_overview_text = f"### {APP_CONFIG.get('ui_texts', {}).get('directory_structure_title', 'ディレクトリ構造')}\n```\n{dir_tree_str}\n```\n\n"
-        st.session_state.project_overview_text += f"### {APP_CONFIG.get('ui_texts', {}).get('java_files_title', '検出されたJavaファイル')}\n"
-        st.session_state.project_overview_text += "\n".join([f"- {f.name} ({f.relative_to(Path(codebase_path_str))})" for f in java_files_list[:20]])
-        if len(java_files_list) > 20:
-            st.session_state.project_overview_text += f"\n...他{len(java_files_list) - 20}ファイル"
-
-        log_to_status("ステップ3.1: CodebaseAnalyzerAgent との対話を開始します (コード分析中)...")
-        analyzer = CodebaseAnalyzerAgent(app_config=APP_CONFIG)
-        initial_analysis_prompt = analyzer.analyze_codebase(
-            codebase_path=codebase_path_str,
-            java_files=java_files_list,
-            project_structure=dir_tree_str
+    def run_pipeline():
+        checkpoint = open_checkpoint(APP_CONFIG, codebase_path_str, request_key, resume_run_id, log=log_to_status)
+        return run_analysis_pipeline(
+            APP_CONFIG, codebase_path_str, java_files_list, dir_tree_str,
+            log=log_to_status, ui_texts=resolve_ui_texts(APP_CONFIG, UI_TEXT_DEFAULTS),
+            checkpoint=checkpoint,
         )
-        
-        user_proxy.initiate_chat(recipient=analyzer, message=initial_analysis_prompt, max_turns=1, clear_history=True)
-        analysis_report_message = user_proxy.last_message(agent=analyzer)
-
-        if not (analysis_report_message and analysis_report_message.get("content")):
-            results["message"] = "CodebaseAnalyzerAgentから有効な分析レポートを取得できませんでした。"
-            log_to_status(results["message"], "warning")
-            st.session_state.analysis_results_text = results["message"]
-            return results
-        
-        analysis_report_text = str(analysis_report_message["content"])
-        st.session_state.analysis_results_text = analysis_report_text
-        results["initial_analysis"] = analysis_report_text
-        log_to_status("CodebaseAnalyzerAgentによる初期分析が完了しました。")
 
-        api_endpoints = parse_api_endpoints_from_report(analysis_report_text)
-        
-        if not api_endpoints:
-            log_to_status("CodebaseAnalyzerAgentの分析結果からAPIエンドポイントが見つかりませんでした。API設計書の生成はスキップされます。")
-        else:
-            log_to_status(f"ステップ3.2: {len(api_endpoints)}件のAPIエンドポイントを検出。APIDesignGeneratorAgent との対話を開始します...")
-            api_designer = APIDesignGeneratorAgent(app_config=APP_CONFIG)
-            
-            for i, (api_identifier, api_info_block) in enumerate(api_endpoints):
-                log_to_status(f"  API設計書を生成中 ({i+1}/{len(api_endpoints)}): {api_identifier} ...")
-                api_doc_prompt = api_designer.generate_api_document_prompt(
-                    single_api_analysis=api_info_block,
-                    full_analysis_report=analysis_report_text
-                )
-                
-                user_proxy.initiate_chat(recipient=api_designer, message=api_doc_prompt, max_turns=1, clear_history=True)
-                api_document_message = user_proxy.last_message(agent=api_designer)
-
-                if api_document_message and api_document_message.get("content"):
-                    doc_content = str(api_document_message["content"])
-                    st.session_state.api_documents[api_identifier] = doc_content
-                    results["api_docs"][api_identifier] = doc_content
-                    log_to_status(f"  API「{api_identifier}」の設計書生成完了。")
-                else:
-                    error_msg = f"API「{api_identifier}」の設計書生成に失敗しました。"
-                    log_to_status(error_msg, "warning")
-                    st.session_state.api_documents[api_identifier] = error_msg
-            
-            if st.session_state.api_documents:
-                 log_to_status(f"全{len(st.session_state.api_documents)}件のAPI設計書生成処理が完了しました。")
+    dedup_settings = APP_CONFIG.get('dedup_settings', {}) or {}
+    if dedup_settings.get('enabled', True):
+        # 他のセッションで同じコードベース・同じ設定の分析が実行中/完了済みなら、その結果を共有する。
+        # 再開は実行IDごとにまとめ、同じチェックポイントに複数のセッションが同時に書き込まないようにする
+        target = f"実行 {resume_run_id} の再開" if resume_run_id else "同じコードベース・設定の分析"
 
-        log_to_status("ステップ3.3: DBDesignGeneratorAgent との対話を開始します (DB設計書生成中)...")
-        db_designer = DBDesignGeneratorAgent(app_config=APP_CONFIG)
-        db_doc_prompt = db_designer.generate_db_document_prompt(analysis_report_text)
-
-        user_proxy.initiate_chat(recipient=db_designer, message=db_doc_prompt, max_turns=1, clear_history=True)
-        db_document_message = user_proxy.last_message(agent=db_designer)
-
-        if db_document_message and db_document_message.get("content"):
-            st.session_state.db_document = str(db_document_message["content"])
-            results["db_doc"] = st.session_state.db_document
-            log_to_status("DBDesignGeneratorAgentによるDB設計書の生成が完了しました。")
-        else:
-            error_msg = "DBDesignGeneratorAgentから有効なDB設計書を取得できませんでした。"
-            log_to_status(error_msg, "warning")
-            st.session_state.db_document = error_msg
-            results["db_doc"] = error_msg
-        
-        results["status"] = "Success"
-        results["message"] = "設計書生成パイプラインが完了しました。"
-        
+        def on_join(role):
+            if role == "joined":
+                log_to_status(f"{target}が他のセッションで実行中のため、その完了を待って結果を共有します...")
+            else:
+                log_to_status(f"{target}の結果が直近に生成されているため、その結果を再利用します。")
+
+        coordinator = get_coordinator(dedup_settings.get('result_ttl_seconds'))
+        results, _ = coordinator.run(
+            f"resume:{resume_run_id}" if resume_run_id else request_key,
+            run_pipeline,
+            # 一部の項目の生成に失敗した結果は再利用せず、次の実行で失敗した項目を生成し直させる
+            cache_if=lambda r: r.get("status") == "Success" and not r.get("failed_items"),
+            on_join=on_join,
+        )
+    else:
+        results = run_pipeline()
+    if results.get("project_overview"): # 前提条件のチェックで中止した場合は表示中の結果を残す
+        apply_results_to_session(results)
+    if results.get("llm_usage"):
+        st.session_state.llm_usage = results["llm_usage"]
+
+    if results["status"] == "Success":
         # 成功した場合、生成結果を履歴に保存
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if "history" not in st.session_state:
-            st.session_state.history = {}
-        st.session_state.history[timestamp] = {
-            "project_overview": deepcopy(st.session_state.project_overview_text),
-            "api_documents": deepcopy(st.session_state.api_documents),
-            "db_document": deepcopy(st.session_state.db_document)
-        }
+        st.session_state.last_pipeline_results = results
+        timestamp = save_session_to_history()
         log_to_status(f"ステップ4: 生成結果を履歴に保存しました ({timestamp})。")
 
-        return results
+    return results
 
-    except Exception as e:
-        results["message"] = f"Agent対話パイプラインエラー: {str(e)}"
-        log_to_status(f"Agentの対話パイプライン中にエラーが発生しました: {e}", "error")
-        return results
+def save_session_to_history() -> str:
+    """
+    現在表示中の生成結果を履歴に追加し、そのタイムスタンプを返します。
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if "history" not in st.session_state:
+        st.session_state.history = {}
+    st.session_state.history[timestamp] = {
+        "project_overview": deepcopy(st.session_state.project_overview_text),
+        "api_documents": deepcopy(st.session_state.api_documents),
+        "db_document": deepcopy(st.session_state.db_document)
+    }
+    return timestamp
+
+def apply_results_to_session(results: Dict[str, any]):
+    """
+    パイプラインの結果辞書を、画面表示用の st.session_state に反映します。
+    """
+    st.session_state.project_overview_text = results.get("project_overview", "")
+    st.session_state.analysis_results_text = results.get("initial_analysis", "")
+    st.session_state.api_documents = dict(results.get("api_docs", {}))
+    st.session_state.db_document = results.get("db_doc", "")
+
+def render_watch_mode_controls(codebase_path_str: str, ui_texts: Dict[str, str]):
+    """
+    ウォッチモードのオン/オフ切り替えと状態表示を描画します。
+    監視と再生成はバックグラウンドスレッドで行われ、更新があれば画面を再実行して最新の設計書を表示します。
+    """
+    watcher = st.session_state.get("doc_watcher")
+    can_watch = bool(st.session_state.get("documents_generated") and st.session_state.get("last_pipeline_results") and codebase_path_str)
+    watch_enabled = st.toggle(
+        f"👁️ {ui_texts['watch_mode_toggle']}",
+        value=bool(watcher and watcher.is_running),
+        disabled=not can_watch and not (watcher and watcher.is_running),
+        help=ui_texts['watch_mode_help'],
+        key="watch_mode_toggle",
+    )
+
+    if watch_enabled and not (watcher and watcher.is_running):
+        from core.doc_watcher import DocWatcher
+
+        watcher = DocWatcher(APP_CONFIG, codebase_path_str, st.session_state.last_pipeline_results, ui_texts=ui_texts)
+        watcher.start()
+        st.session_state.doc_watcher = watcher
+        st.session_state.doc_watcher_seen_version = watcher.version
+    elif not watch_enabled and watcher and watcher.is_running:
+        watcher.stop()
+        st.session_state.doc_watcher = None
+
+    watcher = st.session_state.get("doc_watcher")
+    if watcher and watcher.is_running:
+        _render_watch_status()
+
+@st.fragment(run_every=3)
+def _render_watch_status():
+    watcher = st.session_state.get("doc_watcher")
+    if not watcher:
+        return
+    if watcher.version != st.session_state.get("doc_watcher_seen_version"):
+        # バックグラウンドで更新された設計書を画面に反映する
+        st.session_state.doc_watcher_seen_version = watcher.version
+        st.session_state.last_pipeline_results = watcher.snapshot()
+        apply_results_to_session(st.session_state.last_pipeline_results)
+        save_session_to_history() # 最新の履歴として表示されるようにする
+        st.rerun()
+    state_text = "🔄 再生成中..." if watcher.is_busy else "✅ 最新"
+    updated_text = f" / 最終更新: {watcher.last_updated}" if watcher.last_updated else ""
+    st.caption(f"{state_text}{updated_text}")
+    if watcher.logs:
+        with st.expander("ウォッチモードのログ", expanded=False):
+            st.text("\n".join(list(watcher.logs)[-20:]))
 
 def main():
     global APP_CONFIG
     if not load_config():
         st.stop()
 
-    ui_texts = APP_CONFIG.get('ui_texts', {})
-    app_title = ui_texts.get('app_title', "コード分析・設計書生成システム")
-    codebase_path_label = ui_texts.get('codebase_path_label', "分析対象のJavaコードベースへの絶対パス:")
-    start_analysis_button_text = ui_texts.get('start_analysis_button', "分析開始")
-    error_path_invalid = ui_texts.get('error_path_invalid', "有効なディレクトリパスを入力してください。")
-    error_path_not_found = ui_texts.get('error_path_not_found', "指定されたパスが見つかりません。")
-    analysis_in_progress_text = ui_texts.get('analysis_in_progress', "分析を実行中です。しばらくお待ちください...")
-    results_title_text = ui_texts.get('results_title', "生成された設計ドキュメント")
-    initial_analysis_title = ui_texts.get('initial_analysis_title', "初期分析結果 (Agent応答)")
-    api_docs_tab_text = ui_texts.get('api_docs_tab', "API仕様書")
-    db_docs_tab_text = ui_texts.get('db_docs_tab', "データベース設計書")
-    mermaid_render_error_text = ui_texts.get('mermaid_render_error', "Mermaid図のレンダリングに失敗しました。コードを確認してください。")
-    project_overview_tab_text = ui_texts.get('project_overview_tab', "プロジェクト概要")
-    no_apis_found_text = ui_texts.get('no_apis_found', "APIエンドポイントは見つかりませんでした。")
-    input_section_header_text = ui_texts.get('input_section_header', "1. 分析対象の指定")
-    # save_documents_button_text = ui_texts.get('save_documents_button', "設計書を保存") # 旧ボタンのためコメントアウトまたは削除
-    output_dir_name = APP_CONFIG.get('output_settings', {}).get('output_directory_name', "autogen_docs")
-    project_overview_dir_name = APP_CONFIG.get('output_settings', {}).get('project_overview_subdir', "project_overview")
-    api_specs_dir_name = APP_CONFIG.get('output_settings', {}).get('api_spec_subdir', "api_specifications")
-    db_design_dir_name = APP_CONFIG.get('output_settings', {}).get('db_design_subdir', "database_design")
-    # save_success_message_text = ui_texts.get('save_success_message', "設計書が {path} に保存されました。") # 旧ボタンのためコメントアウトまたは削除
-    # save_error_message_text = ui_texts.get('save_error_message', "設計書の保存中にエラーが発生しました。") # 旧ボタンのためコメントアウトまたは削除
-    no_documents_to_save_text = ui_texts.get('no_documents_to_save', "保存できる生成済みドキュメントがありません。")
-
-    # 新しい一括保存ボタン用のUIテキスト
-    save_all_to_project_root_button_text = ui_texts.get('save_all_to_project_root_button', "一括保存")
-    save_all_success_message_text = ui_texts.get('save_all_success_message', "全ての設計書がプロジェクトルートの {path} に保存されました。")
-    save_all_error_message_text = ui_texts.get('save_all_error_message', "設計書の一括保存(プロジェクトルート)中にエラーが発生しました。")
+    # UIテキストはデフォルト値とマージ済みのものを再利用します (設定が変わらない限り再計算しない)
+    ui_texts = resolve_ui_texts(APP_CONFIG, UI_TEXT_DEFAULTS)
+
+    # プロファイリングが有効な場合 (サイドバーの切り替え。初期値は profiling_settings.enabled)、この再実行のローカル処理を計測する
+    profiler = None
+    if st.session_state.get("profiling_enabled", profiling_settings(APP_CONFIG)["enabled"]):
+        profiler = start_profiling(APP_CONFIG, "ui")
+    try:
+        render_main(ui_texts)
+    finally:
+        summary_path = stop_profiling(profiler, "ui", APP_CONFIG)
+        if summary_path:
+            st.session_state.last_profile_path = str(summary_path)
+
+def render_main(ui_texts: Dict[str, str]):
+    app_title = ui_texts['app_title']
+    codebase_path_label = ui_texts['codebase_path_label']
+    start_analysis_button_text = ui_texts['start_analysis_button']
+    error_path_invalid = ui_texts['error_path_invalid']
+    error_path_not_found = ui_texts['error_path_not_found']
+    analysis_in_progress_text = ui_texts['analysis_in_progress']
+    results_title_text = ui_texts['results_title']
+    initial_analysis_title = ui_texts['initial_analysis_title']
+    api_docs_tab_text = ui_texts['api_docs_tab']
+    db_docs_tab_text = ui_texts['db_docs_tab']
+    mermaid_render_error_text = ui_texts['mermaid_render_error']
+    project_overview_tab_text = ui_texts['project_overview_tab']
+    no_apis_found_text = ui_texts['no_apis_found']
+    input_section_header_text = ui_texts['input_section_header']
+    output_settings = APP_CONFIG.get('output_settings', {})
+    output_dir_name = output_settings.get('output_directory_name', "autogen_docs")
+    no_documents_to_save_text = ui_texts['no_documents_to_save']
+
+    # 一括保存ボタン用のUIテキスト
+    save_all_to_project_root_button_text = ui_texts['save_all_to_project_root_button']
+    save_all_success_message_text = ui_texts['save_all_success_message']
+    save_all_error_message_text = ui_texts['save_all_error_message']
 
     st.set_page_config(page_title=app_title, layout="wide")
     st.title(f"🛠️ {app_title}")
@@ -293,7 +321,7 @@ def main():
     )
 
     # ボタン用の列を定義
-    col_start_analysis, col_save_all_docs = st.columns(2)
+    col_start_analysis, col_estimate, col_save_all_docs, col_export_site = st.columns(4)
 
     with col_start_analysis:
         start_button_clicked = st.button(
@@ -302,6 +330,14 @@ def main():
             use_container_width=True
         )
 
+    with col_estimate:
+        estimate_button_clicked = st.button(
+            f"💰 {ui_texts['dry_run_button']}",
+            key="dry_run_estimate_button",
+            use_container_width=True,
+            help=ui_texts['dry_run_help'],
+        )
+
     with col_save_all_docs:
         disable_save_all_button = not (st.session_state.get("documents_generated", False) and st.session_state.get("codebase_path", ""))
         if st.button(
@@ -315,40 +351,14 @@ def main():
             unique_save_dir_name = f"generated_design_documents_{timestamp}"
             output_base_path_root = project_root_path / unique_save_dir_name
 
-            save_errors_root = []
-            saved_any_root = False
-
             try:
-                # プロジェクト概要の保存
-                if "project_overview_text" in st.session_state and st.session_state.project_overview_text:
-                    overview_dir_root = output_base_path_root / project_overview_dir_name
-                    success, error_msg = save_markdown_to_file(st.session_state.project_overview_text, overview_dir_root, "project_overview.md")
-                    if success:
-                        saved_any_root = True
-                    else:
-                        save_errors_root.append(f"项目概览保存失败: {error_msg}")
-                
-                # API仕様書の保存
-                if "api_documents" in st.session_state and isinstance(st.session_state.api_documents, dict):
-                    api_docs_dir_root = output_base_path_root / api_specs_dir_name
-                    for api_name, doc_content in st.session_state.api_documents.items():
-                        if isinstance(doc_content, str) and not doc_content.startswith("⚠️"):
-                            safe_filename = sanitize_filename(api_name) + ".md"
-                            success, error_msg = save_markdown_to_file(doc_content, api_docs_dir_root, safe_filename)
-                            if success:
-                                saved_any_root = True
-                            else:
-                                save_errors_root.append(f"API规范 '{api_name}' 保存失败: {error_msg}")
-                
-                # データベース設計書の保存
-                if "db_document" in st.session_state and st.session_state.db_document:
-                    if isinstance(st.session_state.db_document, str) and not st.session_state.db_document.startswith("⚠️"):
-                        db_design_dir_root = output_base_path_root / db_design_dir_name
-                        success, error_msg = save_markdown_to_file(st.session_state.db_document, db_design_dir_root, "database_design.md")
-                        if success:
-                            saved_any_root = True
-                        else:
-                            save_errors_root.append(f"数据库设计文档保存失败: {error_msg}")
+                saved_any_root, save_errors_root = save_design_documents(
+                    st.session_state.get("project_overview_text", ""),
+                    st.session_state.get("api_documents", {}),
+                    st.session_state.get("db_document", ""),
+                    output_base_path_root,
+                    output_settings,
+                )
 
                 if not saved_any_root and not save_errors_root:
                     st.info(no_documents_to_save_text)
@@ -362,7 +372,69 @@ def main():
             except Exception as e:
                 st.error(f"{save_all_error_message_text} 詳細: {str(e)}")
 
-    if start_button_clicked:
+    with col_export_site:
+        if st.button(
+            f"🌐 {ui_texts['export_site_button']}",
+            key="export_static_site_button",
+            use_container_width=True,
+            disabled=disable_save_all_button,
+            help=ui_texts['export_site_help'],
+        ):
+            from core.site_exporter import DEFAULT_SITE_SETTINGS, export_static_site
+
+            site_settings = APP_CONFIG.get('site_settings', {}) or {}
+            site_dir = Path(st.session_state.get("codebase_path", "")) / output_dir_name / site_settings.get('output_subdir', DEFAULT_SITE_SETTINGS['output_subdir'])
+            try:
+                site_stats = export_static_site(
+                    st.session_state.get("project_overview_text", ""),
+                    st.session_state.get("api_documents", {}),
+                    st.session_state.get("db_document", ""),
+                    site_dir,
+                    site_settings,
+                )
+                st.success(ui_texts['export_site_success_message'].format(
+                    path=str(site_stats["index_path"].resolve()), pages=site_stats["pages"],
+                    written=site_stats["written"], seconds=site_stats["seconds"]))
+            except OSError as e:
+                st.error(f"{ui_texts['export_site_error_message']} 詳細: {str(e)}")
+
+    resumable_run = None
+    if codebase_path_str and Path(codebase_path_str).is_dir():
+        from core.checkpoint import checkpoint_settings, find_resumable_run, runs_version
+
+        if checkpoint_settings(APP_CONFIG)["enabled"]:
+            # 再実行のたびに state.json を読み直さないよう、実行の一覧が変わるまで結果を使い回す
+            lookup_key = (codebase_path_str, runs_version(APP_CONFIG))
+            cached_lookup = st.session_state.get("resumable_run_lookup")
+            if cached_lookup and cached_lookup[0] == lookup_key:
+                resumable_run = cached_lookup[1]
+            else:
+                resumable_run = find_resumable_run(APP_CONFIG, codebase_path_str)
+                st.session_state.resumable_run_lookup = (lookup_key, resumable_run)
+    resume_button_clicked = False
+    if resumable_run:
+        st.info(ui_texts['resume_run_notice'].format(
+            run_id=resumable_run["run_id"], created_at=resumable_run.get("created_at", ""),
+            failures=len(resumable_run.get("failures", {}))))
+        resume_button_clicked = st.button(f"⏯️ {ui_texts['resume_run_button']}", key="resume_run_button")
+
+    if estimate_button_clicked:
+        if not codebase_path_str:
+            st.error(error_path_invalid)
+        elif not Path(codebase_path_str).is_dir():
+            st.error(error_path_not_found)
+        else:
+            with st.spinner(ui_texts['dry_run_in_progress']):
+                from core.estimator import estimate_pipeline, format_estimate_markdown
+
+                java_files = get_java_files(codebase_path_str)
+                dir_tree = get_project_structure_text(codebase_path_str, max_depth=5, include_files=False)
+                estimate = estimate_pipeline(APP_CONFIG, codebase_path_str, java_files, dir_tree)
+            st.subheader(ui_texts['dry_run_result_title'])
+            st.markdown(format_estimate_markdown(estimate))
+
+    if start_button_clicked or resume_button_clicked:
+        resume_run_id = resumable_run["run_id"] if resume_button_clicked else None
         if not codebase_path_str:
             st.error(error_path_invalid)
         else:
@@ -384,7 +456,7 @@ def main():
                         else:
                             status_container.write("ステップ3/4: Agentによる分析と設計書生成を開始します...")
                             st.session_state.documents_generated = False # 分析開始時にリセット
-                            pipeline_results = run_full_analysis_pipeline(codebase_path_str, java_files, dir_tree, status_container)
+                            pipeline_results = run_full_analysis_pipeline(codebase_path_str, java_files, dir_tree, status_container, resume_run_id)
                             
                             if pipeline_results.get("status") == "Success":
                                 status_container.update(label=pipeline_results.get("message", "分析完了！"), state="complete", expanded=False)
@@ -398,6 +470,14 @@ def main():
                         status_container.update(label=f"分析準備エラー: {e}", state="error", expanded=True)
                         st.session_state.documents_generated = False
     
+    if st.session_state.get("llm_usage"):
+        from core.llm_stats import format_usage_markdown
+
+        with st.expander(ui_texts['llm_usage_title'], expanded=False):
+            st.markdown(format_usage_markdown(st.session_state.llm_usage))
+
+    render_watch_mode_controls(codebase_path_str, ui_texts)
+
     st.markdown("---")
     st.header(results_title_text)
 
@@ -438,14 +518,14 @@ def main():
         if "project_overview_text" in st.session_state and st.session_state.project_overview_text:
             st.markdown(st.session_state.project_overview_text)
         else:
-            st.info(ui_texts.get('info_project_overview_empty', "分析を開始すると、ここにプロジェクトの概要情報が表示されます。"))
+            st.info(ui_texts['info_project_overview_empty'])
 
     with tab2:
         if "analysis_results_text" in st.session_state and st.session_state.analysis_results_text:
-            with st.expander(ui_texts.get('expander_raw_analyzer_output', "CodebaseAnalyzerAgentの生出力を見る"), expanded=False):
+            with st.expander(ui_texts['expander_raw_analyzer_output'], expanded=False):
                 st.markdown(st.session_state.analysis_results_text)
         else:
-            st.info(ui_texts.get('info_initial_analysis_empty', "分析を開始すると、ここにコード分析Agentの初期レポートが表示されます。"))
+            st.info(ui_texts['info_initial_analysis_empty'])
     
     with tab3:
         if "api_documents" in st.session_state and st.session_state.api_documents:
@@ -455,42 +535,73 @@ def main():
                     with api_tabs[i]:
                         st.subheader(api_name)
                         doc_content = st.session_state.api_documents[api_name]
-                        parts = re.split(r"(```mermaid\n.*?\n```)", doc_content, flags=re.DOTALL)
-                        for part_idx, part in enumerate(parts):
-                            if part.startswith("```mermaid"):
-                                mermaid_code = part.strip().replace("```mermaid", "").replace("```", "").strip()
-                                try:
-                                    st.markdown(f"```mermaid\n{mermaid_code}\n```")
-                                except Exception as e_mermaid:
-                                    st.warning(f"{mermaid_render_error_text} (詳細: {e_mermaid})")
-                                    st.code(mermaid_code, language="mermaid")
-                            else:
-                                st.markdown(part, unsafe_allow_html=True)
+                        render_markdown_with_mermaid(doc_content, mermaid_render_error_text)
             elif isinstance(st.session_state.api_documents, str):
                  st.warning(st.session_state.api_documents)
             else:
                 st.info(no_apis_found_text)
         else:
-            st.info(ui_texts.get('info_api_docs_empty', "分析が完了すると、ここにAPI仕様書が表示されます。"))
+            st.info(ui_texts['info_api_docs_empty'])
 
     with tab4:
         if "db_document" in st.session_state and st.session_state.db_document:
-            parts = re.split(r"(```mermaid\n.*?\n```)", st.session_state.db_document, flags=re.DOTALL)
-            for part in parts:
-                if part.startswith("```mermaid"):
-                    mermaid_code = part.strip().replace("```mermaid", "").replace("```", "").strip()
-                    try:
-                        st.markdown(f"```mermaid\n{mermaid_code}\n```")
-                    except Exception as e_mermaid:
-                        st.warning(f"{mermaid_render_error_text} (詳細: {e_mermaid})")
-                        st.code(mermaid_code, language="mermaid")
-                else:
-                    st.markdown(part, unsafe_allow_html=True)
+            render_markdown_with_mermaid(st.session_state.db_document, mermaid_render_error_text)
         else:
-            st.info(ui_texts.get('info_db_docs_empty', "分析が完了すると、ここにデータベース設計書が表示されます。"))
+            st.info(ui_texts['info_db_docs_empty'])
 
     # 旧保存ボタンセクションは完全に削除されました。
 
+    render_profiling_controls(ui_texts)
+    record_rerun_latency()
+
+def render_markdown_with_mermaid(doc_content: str, mermaid_render_error_text: str):
+    """
+    設計書を描画します。Mermaidブロックはローカルで検証し、不正なものは警告とコードを表示します。
+    (st.markdown は不正なMermaidでも例外を出さないため、描画前に検証します。)
+    """
+    for part in split_mermaid_parts(doc_content):
+        if part["type"] == "mermaid":
+            mermaid_code = part["code"]
+            errors = validate_mermaid(mermaid_code)
+            if errors:
+                st.warning(f"{mermaid_render_error_text} (詳細: {' / '.join(errors[:3])})")
+                st.code(mermaid_code, language="mermaid")
+            else:
+                st.markdown(f"```mermaid\n{mermaid_code}\n```")
+        else:
+            st.markdown(part["text"], unsafe_allow_html=True)
+
+def render_profiling_controls(ui_texts: Dict[str, str]):
+    """
+    サイドバーにプロファイリングの切り替えと、前回の再実行のプロファイルの出力先を表示します。
+    """
+    profiling_enabled = st.sidebar.toggle(
+        ui_texts['profiling_toggle'],
+        value=profiling_settings(APP_CONFIG)["enabled"],
+        help=ui_texts['profiling_help'],
+        key="profiling_enabled",
+    )
+    if profiling_enabled and st.session_state.get("last_profile_path"):
+        st.sidebar.caption(ui_texts['profiling_output_caption'].format(path=st.session_state.last_profile_path))
+
+def record_rerun_latency():
+    """
+    スクリプト先頭からの経過時間を再実行レイテンシとして記録します。
+    セッション最初の実行はコールドスタートとして別に保持し、前回の計測値をサイドバーに表示します。
+    """
+    elapsed_ms = (time.perf_counter() - _SCRIPT_STARTED_AT) * 1000
+    if "cold_start_ms" not in st.session_state:
+        st.session_state.cold_start_ms = elapsed_ms
+        logger.info(f"コールドスタート: {elapsed_ms:.1f} ms")
+    else:
+        logger.info(f"再実行レイテンシ: {elapsed_ms:.1f} ms")
+    previous_ms = st.session_state.get("last_rerun_ms")
+    st.session_state.last_rerun_ms = elapsed_ms
+    if previous_ms is not None:
+        st.sidebar.caption(
+            f"⏱️ 起動: {st.session_state.cold_start_ms:.0f} ms / 前回の再実行: {previous_ms:.0f} ms"
+        )
+
 if __name__ == "__main__":
     if "codebase_path" not in st.session_state:
         st.session_state.codebase_path = ""
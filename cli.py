@@ -0,0 +1,251 @@
+# このファイルは、Streamlit UIを使わずにパイプラインを実行するためのヘッドレス用エントリポイントです。
+# 使用例:
+#   python cli.py watch /Users/username/my-java-project --output ./docs
+#   python cli.py estimate /Users/username/my-java-project
+#   python cli.py export /Users/username/my-java-project --output ./docs
+#   python cli.py resume /Users/username/my-java-project --output ./docs
+#   python cli.py --profile estimate /Users/username/my-java-project
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from core.config_loader import load_config_cached
+from core.file_utils import get_java_files, get_project_structure_text, load_saved_documents, save_design_documents
+from core.checkpoint import find_resumable_run, list_runs, open_checkpoint
+from core.llm_stats import format_usage_markdown
+from core.pipeline import run_analysis_pipeline
+from core.profiler import profiling_session, profiling_settings
+from core.single_flight import analysis_request_key
+from core.source_loader import configure_source_loader
+
+CONFIG_FILE_PATH = Path(__file__).resolve().parent / "configs" / "app_config.yaml"
+
+
+def _print_log(message: str, level: str = "info") -> None:
+    prefix = {"error": "⚠️", "warning": "👀"}.get(level, "➡️")
+    print(f"{prefix} {message}", flush=True)
+
+
+def _save_results(results: Dict[str, Any], output_dir: Path, app_config: Dict[str, Any]) -> bool:
+    saved_any, errors = save_design_documents(
+        results.get("project_overview", ""), results.get("api_docs", {}), results.get("db_doc", ""),
+        output_dir, app_config.get('output_settings', {}),
+    )
+    for error in errors:
+        _print_log(error, "error")
+    if saved_any:
+        _print_log(f"設計書を {output_dir.resolve()} に保存しました。")
+    return not errors
+
+
+def _export_site(results: Dict[str, Any], output_dir: Path, app_config: Dict[str, Any]) -> None:
+    from core.site_exporter import DEFAULT_SITE_SETTINGS, export_static_site
+
+    site_settings = app_config.get('site_settings', {}) or {}
+    site_dir = output_dir / site_settings.get('output_subdir', DEFAULT_SITE_SETTINGS['output_subdir'])
+    stats = export_static_site(results.get("project_overview", ""), results.get("api_docs", {}), results.get("db_doc", ""),
+                               site_dir, site_settings, log=_print_log)
+    _print_log(f"サイトのトップページ: {stats['index_path'].resolve()}")
+
+
+def _output_dir(args, app_config: Dict[str, Any]) -> Path:
+    if args.output:
+        return Path(args.output)
+    return Path(app_config.get('output_settings', {}).get('output_directory_name', "autogen_docs"))
+
+
+def _discover(codebase_path: str):
+    dir_tree = get_project_structure_text(codebase_path, max_depth=5, include_files=False)
+    java_files = get_java_files(codebase_path)
+    return dir_tree, java_files
+
+
+def _run_pipeline(app_config: Dict[str, Any], codebase_path: str, java_files, dir_tree: str,
+                  resume_run_id: Optional[str] = None) -> Dict[str, Any]:
+    # 完了した段階とドキュメントはチェックポイントに保存され、中断しても resume で続きから生成できる
+    checkpoint = open_checkpoint(app_config, codebase_path, analysis_request_key(codebase_path, java_files, app_config),
+                                 resume_run_id, log=_print_log)
+    if checkpoint:
+        _print_log(f"実行ID: {checkpoint.run_id}")
+    results = run_analysis_pipeline(app_config, codebase_path, java_files, dir_tree, log=_print_log, checkpoint=checkpoint)
+    if results.get("llm_usage"):
+        print(format_usage_markdown(results["llm_usage"]), flush=True)
+    return results
+
+
+def cmd_watch(args, app_config: Dict[str, Any]) -> int:
+    """
+    フルパイプラインを1回実行して保存した後、コードベースを監視し、変更に影響するドキュメントだけを更新し続けます。
+    """
+    from core.doc_watcher import DocWatcher
+
+    if not Path(args.codebase_path).is_dir():
+        _print_log(f"指定されたパスが見つかりません: {args.codebase_path}", "error")
+        return 1
+    output_dir = _output_dir(args, app_config)
+    dir_tree, java_files = _discover(args.codebase_path)
+    if not java_files:
+        _print_log("指定されたディレクトリにJavaファイルが見つかりませんでした。", "error")
+        return 1
+
+    results = _run_pipeline(app_config, args.codebase_path, java_files, dir_tree)
+    if results.get("status") != "Success":
+        _print_log(results.get("message", "パイプラインの実行に失敗しました。"), "error")
+        return 1
+    _save_results(results, output_dir, app_config)
+    if args.site:
+        _export_site(results, output_dir, app_config)
+
+    def on_update(updated: Dict[str, Any]) -> None:
+        _save_results(updated, output_dir, app_config)
+        if args.site:
+            # 変更されたページだけが書き直される
+            _export_site(updated, output_dir, app_config)
+
+    watcher = DocWatcher(
+        app_config, args.codebase_path, results, debounce_seconds=args.debounce,
+        on_update=on_update, log=_print_log,
+    )
+    watcher.start()
+    _print_log("変更を監視しています。終了するには Ctrl+C を押してください。")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+    return 0
+
+
+def cmd_estimate(args, app_config: Dict[str, Any]) -> int:
+    """
+    LLMを呼び出さずに、パイプラインのトークン数・コスト・所要時間を見積もって表示します。
+    """
+    from core.estimator import estimate_pipeline, format_estimate_markdown
+
+    if not Path(args.codebase_path).is_dir():
+        _print_log(f"指定されたパスが見つかりません: {args.codebase_path}", "error")
+        return 1
+    dir_tree, java_files = _discover(args.codebase_path)
+    estimate = estimate_pipeline(app_config, args.codebase_path, java_files, dir_tree)
+    print(format_estimate_markdown(estimate))
+    return 0
+
+
+def cmd_export(args, app_config: Dict[str, Any]) -> int:
+    """
+    設計書一式を静的HTMLサイトとして出力します。
+    --from-docs を指定した場合は、保存済みの設計書 (Markdown) から、指定しない場合はパイプラインを実行して出力します。
+    """
+    output_dir = _output_dir(args, app_config)
+    if args.from_docs:
+        docs_dir = Path(args.from_docs)
+        if not docs_dir.is_dir():
+            _print_log(f"指定されたパスが見つかりません: {args.from_docs}", "error")
+            return 1
+        project_overview, api_docs, db_doc = load_saved_documents(docs_dir, app_config.get('output_settings', {}))
+        results = {"project_overview": project_overview, "api_docs": api_docs, "db_doc": db_doc}
+        if not args.output:
+            output_dir = docs_dir
+    else:
+        if not args.codebase_path or not Path(args.codebase_path).is_dir():
+            _print_log(f"指定されたパスが見つかりません: {args.codebase_path}", "error")
+            return 1
+        dir_tree, java_files = _discover(args.codebase_path)
+        if not java_files:
+            _print_log("指定されたディレクトリにJavaファイルが見つかりませんでした。", "error")
+            return 1
+        results = _run_pipeline(app_config, args.codebase_path, java_files, dir_tree)
+        if results.get("status") != "Success":
+            _print_log(results.get("message", "パイプラインの実行に失敗しました。"), "error")
+            return 1
+        _save_results(results, output_dir, app_config)
+    _export_site(results, output_dir, app_config)
+    return 0
+
+
+def cmd_resume(args, app_config: Dict[str, Any]) -> int:
+    """
+    中断・一部失敗した実行を、チェックポイントに保存済みの段階とドキュメントを使って続きから実行し、保存します。
+    """
+    if args.list:
+        for state in list_runs(app_config, args.codebase_path):
+            print(f"{state['run_id']}  {state.get('status', '')}  {state.get('codebase_path', '')}  "
+                  f"失敗 {len(state.get('failures', {}))}件  {state.get('message', '')}")
+        return 0
+    if not args.codebase_path or not Path(args.codebase_path).is_dir():
+        _print_log(f"指定されたパスが見つかりません: {args.codebase_path}", "error")
+        return 1
+    run_id = args.run_id
+    if not run_id:
+        resumable = find_resumable_run(app_config, args.codebase_path)
+        if not resumable:
+            _print_log("再開できる実行が見つかりませんでした (最新の実行は完了しているか、実行中です)。", "error")
+            return 1
+        run_id = resumable["run_id"]
+    _print_log(f"実行 {run_id} を再開します。")
+
+    dir_tree, java_files = _discover(args.codebase_path)
+    results = _run_pipeline(app_config, args.codebase_path, java_files, dir_tree, resume_run_id=run_id)
+    if results.get("status") != "Success":
+        _print_log(results.get("message", "パイプラインの実行に失敗しました。"), "error")
+        return 1
+    _save_results(results, _output_dir(args, app_config), app_config)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Javaコード分析・設計書自動生成システム (ヘッドレス実行)")
+    parser.add_argument("--profile", action="store_true",
+                        help="ローカル処理を段階ごとにプロファイルし、profiling_settings.directory に出力する (設定の enabled でも有効)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    watch_parser = subparsers.add_parser("watch", help="コードベースを監視し、設計書を継続的に更新します。")
+    watch_parser.add_argument("codebase_path", help="分析対象のJavaコードベースへのパス")
+    watch_parser.add_argument("--output", default=None, help="設計書の保存先ディレクトリ (省略時は output_settings.output_directory_name)")
+    watch_parser.add_argument("--debounce", type=float, default=None, help="ファイルイベントをまとめる期間 (秒)")
+    watch_parser.add_argument("--site", action="store_true", help="静的HTMLサイトも出力し、更新のたびに差分を反映する")
+    watch_parser.set_defaults(func=cmd_watch)
+
+    estimate_parser = subparsers.add_parser("estimate", help="LLMを呼び出さずに、トークン数・コスト・所要時間を見積もります (ドライラン)。")
+    estimate_parser.add_argument("codebase_path", help="分析対象のJavaコードベースへのパス")
+    estimate_parser.set_defaults(func=cmd_estimate)
+
+    export_parser = subparsers.add_parser("export", help="設計書一式を、全文検索付きの静的HTMLサイトとして出力します。")
+    export_parser.add_argument("codebase_path", nargs="?", default=None, help="分析対象のJavaコードベースへのパス (--from-docs 指定時は不要)")
+    export_parser.add_argument("--output", default=None, help="設計書の保存先ディレクトリ (サイトは site_settings.output_subdir に出力)")
+    export_parser.add_argument("--from-docs", default=None, help="パイプラインを実行せず、保存済みの設計書 (一括保存の出力先) からサイトを出力する")
+    export_parser.set_defaults(func=cmd_export)
+
+    resume_parser = subparsers.add_parser("resume", help="中断・一部失敗した実行を、チェックポイントから続きを生成して再開します。")
+    resume_parser.add_argument("codebase_path", nargs="?", default=None, help="分析対象のJavaコードベースへのパス")
+    resume_parser.add_argument("--run-id", default=None, help="再開する実行ID (省略時はコードベースの最新の未完了の実行)")
+    resume_parser.add_argument("--output", default=None, help="設計書の保存先ディレクトリ (省略時は output_settings.output_directory_name)")
+    resume_parser.add_argument("--list", action="store_true", help="保存済みの実行の一覧を表示する")
+    resume_parser.set_defaults(func=cmd_resume)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    app_config = load_config_cached(CONFIG_FILE_PATH)
+    configure_source_loader(app_config.get('source_loader'))
+    if args.profile or profiling_settings(app_config)["enabled"]:
+        # watch ではCtrl+Cで終了したときに、それまでの計測結果を出力する
+        with profiling_session(app_config, args.command, log=_print_log):
+            return args.func(args, app_config)
+    return args.func(args, app_config)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+# このファイルは checkpoint モジュールです。
+# パイプラインの実行 (run) ごとに、完了した段階 (初期分析など) と生成済みのドキュメントを
+# 完了した時点でディスクに保存し、中断・失敗した実行を途中から再開できるようにします。
+# - 保存先: checkpoint_settings.directory / <run_id> /
+#     state.json        … 実行の状態 (コードベース、キー、完了した段階の名前、失敗した項目)。一覧表示のため小さく保つ
+#     items/<種別>/<ハッシュ>.json … API設計書・DB設計書のクラスタ・段階 (種別 "stage") など、項目ごとの生成結果
+# - 各ファイルは一時ファイルに書いてから置き換えるため、途中で強制終了しても壊れたファイルは残りません。
+# - 失敗した項目は記録だけして処理を続け、再開時にその項目だけを生成し直します。
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .file_utils import write_text_atomic
+from .report_parser import LogFunc
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+STATE_FILE_NAME = "state.json"
+STAGE_ITEM_KIND = "stage"
+
+DEFAULT_CHECKPOINT_SETTINGS = {
+    "enabled": True,
+    "directory": ".checkpoints",
+    "keep_runs": 20,
+    "stale_after_seconds": 1800,
+}
+
+STATUS_RUNNING = "running"
+STATUS_INCOMPLETE = "incomplete"
+STATUS_COMPLETED = "completed"
+
+
+def checkpoint_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_CHECKPOINT_SETTINGS)
+    settings.update(app_config.get('checkpoint_settings', {}) or {})
+    return settings
+
+
+def checkpoint_directory(app_config: Dict[str, Any]) -> Path:
+    """
+    チェックポイントの保存先を返します。相対パスはアプリケーションのルートからのパスとみなします。
+    """
+    directory = Path(checkpoint_settings(app_config)["directory"]).expanduser()
+    return directory if directory.is_absolute() else PROJECT_ROOT / directory
+
+
+def _item_file_name(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+
+class PipelineCheckpoint:
+    """
+    1回のパイプライン実行のチェックポイント。スレッドセーフです (DB設計書のクラスタは並列に保存されます)。
+    """
+    def __init__(self, run_dir: Path, state: Dict[str, Any]):
+        self.run_dir = Path(run_dir)
+        self.state = state
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> str:
+        return self.state["run_id"]
+
+    @classmethod
+    def create(cls, base_dir: Path, codebase_path: str, request_key: str) -> "PipelineCheckpoint":
+        """
+        新しい実行のチェックポイントを作成します。
+
+        Args:
+            base_dir (Path): チェックポイントの保存先 (checkpoint_directory の結果)。
+            codebase_path (str): 分析対象のコードベースのパス。
+            request_key (str): コードベースの内容と設定から計算したキー (core.single_flight.analysis_request_key)。
+        """
+        now = datetime.now()
+        run_id = f"{now.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        state = {
+            "run_id": run_id,
+            "codebase_path": str(codebase_path),
+            "request_key": request_key,
+            "status": STATUS_RUNNING,
+            "message": "",
+            "created_at": now.isoformat(timespec="seconds"),
+            "updated_at": now.isoformat(timespec="seconds"),
+            "stages": [],
+            "failures": {},
+            "owner": _current_owner(),
+        }
+        checkpoint = cls(Path(base_dir) / run_id, state)
+        checkpoint._write_state()
+        return checkpoint
+
+    @classmethod
+    def load(cls, base_dir: Path, run_id: str) -> Optional["PipelineCheckpoint"]:
+        """
+        保存済みのチェックポイントを読み込みます。存在しない・読めない場合は None を返します。
+        """
+        run_dir = Path(base_dir) / run_id
+        try:
+            state = json.loads((run_dir / STATE_FILE_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"チェックポイント {run_id} を読み込めませんでした: {e}")
+            return None
+        checkpoint = cls(run_dir, state)
+        legacy_stages = state.get("stages")
+        if isinstance(legacy_stages, dict):
+            # 段階の本文を state.json に持っていた以前の形式は、本文を項目のファイルに移す
+            for name, content in legacy_stages.items():
+                checkpoint.save_item(STAGE_ITEM_KIND, name, content)
+            state["stages"] = list(legacy_stages)
+            checkpoint._write_state()
+        return checkpoint
+
+    # --- 保存 ---
+    def _write_state(self) -> None:
+        self.state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        write_text_atomic(self.run_dir / STATE_FILE_NAME, json.dumps(self.state, ensure_ascii=False, indent=1))
+        # 実行の一覧のキャッシュ (runs_version) を無効にするため、保存先ディレクトリの更新時刻を進める
+        os.utime(self.run_dir.parent)
+
+    def save_stage(self, name: str, content: str) -> None:
+        """
+        完了した段階 (例: "initial_analysis", "db_doc") の結果を保存します。
+        本文は項目 (種別 "stage") として別のファイルに保存し、state.json には段階の名前だけを記録します。
+        """
+        self.save_item(STAGE_ITEM_KIND, name, content)
+        with self._lock:
+            if name not in self.state["stages"]:
+                self.state["stages"].append(name)
+                self._write_state()
+
+    def save_item(self, kind: str, key: str, content: str) -> None:
+        """
+        生成が完了した項目 (例: kind="api_doc", key=API識別子) を保存し、失敗の記録があれば消します。
+        """
+        write_text_atomic(self.run_dir / "items" / kind / _item_file_name(key),
+                          json.dumps({"key": key, "content": content}, ensure_ascii=False))
+        with self._lock:
+            if self.state["failures"].pop(f"{kind}:{key}", None) is not None:
+                self._write_state()
+
+    def record_failure(self, kind: str, key: str, error: str) -> None:
+        """
+        生成に失敗した項目を記録します。再開時にはこの項目だけが生成し直されます。
+        """
+        with self._lock:
+            self.state["failures"][f"{kind}:{key}"] = {"kind": kind, "key": key, "error": str(error)}
+            self._write_state()
+
+    def discard_results(self, request_key: str) -> None:
+        """
+        保存済みの段階・項目・失敗の記録をすべて破棄し、キーを request_key に更新します。
+        コードベースまたは設定が変わった実行を再開するときに、古い結果を復元しないために使います。
+        """
+        with self._lock:
+            shutil.rmtree(self.run_dir / "items", ignore_errors=True)
+            self.state["stages"] = []
+            self.state["failures"] = {}
+            self.state["request_key"] = request_key
+            self._write_state()
+
+    def finish(self, status: str, message: str = "") -> None:
+        with self._lock:
+            self.state["status"] = status
+            self.state["message"] = message
+            if status == STATUS_RUNNING:
+                self.state["owner"] = _current_owner()
+            self._write_state()
+
+    # --- 読み出し ---
+    def get_stage(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name not in self.state["stages"]:
+                return None
+        return self.get_item(STAGE_ITEM_KIND, name)
+
+    def get_item(self, kind: str, key: str) -> Optional[str]:
+        try:
+            return json.loads((self.run_dir / "items" / kind / _item_file_name(key)).read_text(encoding="utf-8"))["content"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def items(self, kind: str) -> Dict[str, str]:
+        """
+        指定した種別の保存済み項目を {key: content} で返します。
+        """
+        loaded = {}
+        for path in sorted((self.run_dir / "items" / kind).glob("*.json")):
+            try:
+                item = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            loaded[item["key"]] = item["content"]
+        return loaded
+
+    def failures(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.state["failures"].values())
+
+
+def _current_owner() -> Dict[str, Any]:
+    return {"host": socket.gethostname(), "pid": os.getpid()}
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True  # 別ユーザーのプロセスとして存在する
+    return True
+
+
+def is_run_active(app_config: Dict[str, Any], state: Dict[str, Any]) -> bool:
+    """
+    実行が他のセッションやプロセスで実行中かどうかを返します。
+    同じホストの実行は実行中のプロセスが存在するかどうかで、別のホスト (共有ディレクトリ) の実行や
+    Windows では最終更新から checkpoint_settings.stale_after_seconds 以内かどうかで判定します
+    (強制終了された実行は状態が running のまま残るため、状態だけでは判定できません)。
+    """
+    if state.get("status") != STATUS_RUNNING:
+        return False
+    owner = state.get("owner") or {}
+    # Windows の os.kill はシグナル 0 でもプロセスを終了させるため使わない
+    if owner.get("host") == socket.gethostname() and owner.get("pid") and os.name != "nt":
+        return _process_alive(int(owner["pid"]))
+    try:
+        updated_at = datetime.fromisoformat(state.get("updated_at", ""))
+    except ValueError:
+        return False
+    stale_after = float(checkpoint_settings(app_config)["stale_after_seconds"])
+    return (datetime.now() - updated_at).total_seconds() < stale_after
+
+
+def list_runs(app_config: Dict[str, Any], codebase_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    保存済みの実行の状態 (state.json の内容) を新しい順に返します。codebase_path を指定するとその実行だけに絞ります。
+    """
+    base_dir = checkpoint_directory(app_config)
+    runs = []
+    for state_path in base_dir.glob(f"*/{STATE_FILE_NAME}"):
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if codebase_path is None or Path(state.get("codebase_path", "")) == Path(codebase_path):
+            runs.append(state)
+    return sorted(runs, key=lambda state: state.get("run_id", ""), reverse=True)
+
+
+def runs_version(app_config: Dict[str, Any]) -> Optional[int]:
+    """
+    保存済みの実行の一覧が変わると変わる値 (保存先ディレクトリの更新時刻) を返します。保存先がない場合は None を返します。
+    UIの再実行ごとに state.json を読み直さないよう、find_resumable_run の結果のキャッシュキーに使います。
+    """
+    try:
+        return checkpoint_directory(app_config).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def find_resumable_run(app_config: Dict[str, Any], codebase_path: str) -> Optional[Dict[str, Any]]:
+    """
+    コードベースの最新の実行が完了していない (中断・一部失敗) 場合、その状態を返します。
+    最新の実行が他のセッションやプロセスで実行中 (is_run_active) の場合は None を返します。
+    """
+    runs = list_runs(app_config, codebase_path)
+    if runs and runs[0].get("status") != STATUS_COMPLETED and not is_run_active(app_config, runs[0]):
+        return runs[0]
+    return None
+
+
+def prune_runs(app_config: Dict[str, Any]) -> None:
+    """
+    新しい実行を作成する前に呼ばれ、作成後の実行数が checkpoint_settings.keep_runs になるよう古い実行を削除します。
+    """
+    keep = max(1, int(checkpoint_settings(app_config)["keep_runs"]))
+    for state in list_runs(app_config)[keep - 1:]:
+        shutil.rmtree(checkpoint_directory(app_config) / state["run_id"], ignore_errors=True)
+
+
+def open_checkpoint(app_config: Dict[str, Any], codebase_path: str, request_key: str,
+                    resume_run_id: Optional[str] = None, log: Optional[LogFunc] = None) -> Optional[PipelineCheckpoint]:
+    """
+    パイプライン実行用のチェックポイントを返します。
+    resume_run_id を指定した場合はその実行を読み込み、指定しない場合は新しい実行を作成します。
+    再開する実行の作成後にコードベースまたは設定が変わっている (request_key が異なる) 場合は、
+    古い結果を現在のものとして復元しないよう保存済みの段階と項目を破棄し、log に警告を出します。
+    再開する実行が他のセッションまたはプロセスで実行中の場合は、同じディレクトリに同時に書き込まないよう新しい実行を作成します。
+    checkpoint_settings.enabled が無効な場合や、保存先に書き込めない場合は None を返します (チェックポイントなしで実行)。
+    """
+    if not checkpoint_settings(app_config)["enabled"]:
+        return None
+    base_dir = checkpoint_directory(app_config)
+    try:
+        if resume_run_id:
+            checkpoint = PipelineCheckpoint.load(base_dir, resume_run_id)
+            if checkpoint is not None and is_run_active(app_config, checkpoint.state):
+                message = f"チェックポイント {resume_run_id} は他のセッションまたはプロセスで実行中のため、新しい実行として最初から生成します。"
+                logger.warning(message)
+                if log:
+                    log(message, "warning")
+                checkpoint = None
+            elif checkpoint is not None:
+                if checkpoint.state.get("request_key") != request_key:
+                    message = (f"チェックポイント {resume_run_id} の作成後にコードベースまたは設定が変更されているため、"
+                               "保存済みの結果を破棄して最初から生成します。")
+                    logger.warning(message)
+                    if log:
+                        log(message, "warning")
+                    checkpoint.discard_results(request_key)
+                checkpoint.finish(STATUS_RUNNING, "再開")
+            if checkpoint is not None:
+                return checkpoint
+        prune_runs(app_config)
+        return PipelineCheckpoint.create(base_dir, codebase_path, request_key)
+    except OSError as e:
+        logger.warning(f"チェックポイントを作成できないため、チェックポイントなしで実行します: {e}")
+        return None
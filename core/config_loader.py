@@ -0,0 +1,75 @@
+# このファイルは config_loader モジュールです。
+# 設定ファイル (app_config.yaml) の読み込みと、そのキャッシュを担当します。
+# Streamlit はウィジェット操作のたびにスクリプト全体を再実行するため、
+# 毎回YAMLを解析し直さないよう、プロセス内でファイルの更新時刻をキーにキャッシュします。
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import yaml
+
+# 解決済みパス -> (st_mtime_ns, st_size, 解析済み設定)
+_CONFIG_CACHE: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+_CONFIG_CACHE_LOCK = threading.Lock()
+
+# 直近に解決したUIテキスト (設定オブジェクトの同一性とデフォルト辞書の内容で再利用を判定)
+_UI_TEXTS_CACHE: Dict[str, Any] = {"config": None, "defaults": None, "texts": {}}
+
+
+def load_config_cached(config_path: Path) -> Dict[str, Any]:
+    """
+    YAML設定ファイルを読み込みます。ファイルの更新時刻とサイズが前回と同じであれば、
+    解析済みの辞書をそのまま返します。
+
+    返される辞書はキャッシュと共有されるため、呼び出し側で変更しないでください。
+
+    Args:
+        config_path (Path): 設定ファイルのパス。
+
+    Returns:
+        Dict[str, Any]: 解析済みの設定。空のファイルの場合は空の辞書。
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合。
+        yaml.YAMLError: YAMLの解析に失敗した場合。
+    """
+    path = Path(config_path)
+    stat = path.stat()
+    cache_key = str(path.resolve())
+
+    with _CONFIG_CACHE_LOCK:
+        cached = _CONFIG_CACHE.get(cache_key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    with _CONFIG_CACHE_LOCK:
+        _CONFIG_CACHE[cache_key] = (stat.st_mtime_ns, stat.st_size, config)
+    return config
+
+
+def resolve_ui_texts(app_config: Dict[str, Any], defaults: Dict[str, str]) -> Dict[str, str]:
+    """
+    設定の ui_texts とデフォルト値をマージした辞書を返します。
+    同じ設定オブジェクトと同じ内容のデフォルト辞書に対しては、前回の結果を再利用します。
+    (app.py は再実行のたびにデフォルト辞書を作り直すため、内容で比較します。)
+
+    Args:
+        app_config (Dict[str, Any]): ロードされた設定。
+        defaults (Dict[str, str]): キーごとのデフォルトのUIテキスト。
+
+    Returns:
+        Dict[str, str]: 全てのデフォルトキーを含むUIテキスト辞書。
+    """
+    if _UI_TEXTS_CACHE["config"] is app_config and _UI_TEXTS_CACHE["defaults"] == defaults:
+        return _UI_TEXTS_CACHE["texts"]
+
+    texts = dict(defaults)
+    texts.update({k: v for k, v in (app_config.get('ui_texts') or {}).items() if v is not None})
+
+    _UI_TEXTS_CACHE.update({"config": app_config, "defaults": defaults, "texts": texts})
+    return texts
+
@@ -0,0 +1,215 @@
+# このファイルは db_sharding モジュールです。
+# エンティティ数の多いコードベースでDB設計書を1回のLLM呼び出しで生成すると、出力上限で途中が切れたり
+# 時間がかかりすぎたりするため、JPA の関連 (@OneToMany / @ManyToOne / @OneToOne / @ManyToMany と
+# @JoinColumn) に沿ってエンティティをクラスタに分割し、クラスタごとに生成したセクションを1つの設計書にまとめます。
+# 全体のER図はLLMに書かせず、ローカルで解析したエンティティ情報から組み立てます。
+
+import re
+from typing import Any, Dict, List, Optional
+
+from .local_diagrams import build_er_diagram, er_entity_name, mermaid_block
+from .mermaid_validator import extract_mermaid_blocks
+from .profiler import profiled
+
+DEFAULT_DB_DESIGN_SETTINGS = {
+    "shard_min_entities": 15,
+    "max_entities_per_cluster": 10,
+}
+
+_STATE_SECTION_HEADING = re.compile(r"^#{2,6}\s*(\d+\.\s*)?状態遷移図.*$", re.MULTILINE)
+_TOP_LEVEL_HEADING = re.compile(r"^#{1,3}\s.*$\n?", re.MULTILINE)
+
+
+def db_design_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_DB_DESIGN_SETTINGS)
+    settings.update(app_config.get('db_design_settings', {}) or {})
+    return settings
+
+
+def _connected_components(entities: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    関連で結ばれたエンティティの連結成分を、元の出現順を保って返します (Union-Find)。
+    """
+    parent = {entity["class_name"]: entity["class_name"] for entity in entities}
+
+    def find(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for entity in entities:
+        for relation in entity["relations"]:
+            if relation["target"] in parent:
+                parent[find(entity["class_name"])] = find(relation["target"])
+
+    components: Dict[str, List[Dict[str, Any]]] = {}
+    for entity in entities:
+        components.setdefault(find(entity["class_name"]), []).append(entity)
+    return list(components.values())
+
+
+def _split_component(component: List[Dict[str, Any]], max_size: int) -> List[List[Dict[str, Any]]]:
+    """
+    大きすぎる連結成分を、関連の多いエンティティから幅優先でたどった順に max_size 件ずつに分けます。
+    隣接するエンティティができるだけ同じクラスタに入るようにするためです。
+    """
+    by_class = {entity["class_name"]: entity for entity in component}
+    neighbors: Dict[str, List[str]] = {name: [] for name in by_class}
+    for entity in component:
+        for relation in entity["relations"]:
+            if relation["target"] in by_class and relation["target"] != entity["class_name"]:
+                neighbors[entity["class_name"]].append(relation["target"])
+                neighbors[relation["target"]].append(entity["class_name"])
+
+    ordered: List[str] = []
+    visited = set()
+    for start in sorted(by_class, key=lambda name: -len(neighbors[name])):
+        if start in visited:
+            continue
+        queue = [start]
+        visited.add(start)
+        while queue:
+            name = queue.pop(0)
+            ordered.append(name)
+            for neighbor in neighbors[name]:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+    return [[by_class[name] for name in ordered[i:i + max_size]] for i in range(0, len(ordered), max_size)]
+
+
+def cluster_entities(entities: List[Dict[str, Any]], max_cluster_size: int) -> List[List[Dict[str, Any]]]:
+    """
+    エンティティを関連に沿ってクラスタに分割します。
+
+    - 関連で結ばれたエンティティは同じクラスタに入ります (連結成分)。
+    - max_cluster_size を超える連結成分は、隣接関係をできるだけ保ったまま分割します。
+    - 小さな連結成分 (関連のない単独のエンティティなど) は、呼び出し回数を減らすため max_cluster_size まで詰め合わせます。
+    """
+    max_cluster_size = max(1, int(max_cluster_size))
+    clusters: List[List[Dict[str, Any]]] = []
+    small: List[List[Dict[str, Any]]] = []
+    for component in _connected_components(entities):
+        if len(component) > max_cluster_size:
+            clusters.extend(_split_component(component, max_cluster_size))
+        else:
+            small.append(component)
+
+    bins: List[List[Dict[str, Any]]] = []
+    for component in sorted(small, key=len, reverse=True):
+        target = next((b for b in bins if len(b) + len(component) <= max_cluster_size), None)
+        if target is None:
+            bins.append(list(component))
+        else:
+            target.extend(component)
+    return clusters + bins
+
+
+def plan_db_shards(app_config: Dict[str, Any], entities: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+    """
+    DB設計書を分割生成する場合のクラスタを返します。
+    エンティティ数が db_design_settings.shard_min_entities 未満の場合は、従来どおり1回で生成するため None を返します。
+    """
+    settings = db_design_settings(app_config)
+    if len(entities) < int(settings["shard_min_entities"]):
+        return None
+    clusters = cluster_entities(entities, int(settings["max_entities_per_cluster"]))
+    return clusters if len(clusters) > 1 else None
+
+
+@profiled("prompt_building")
+def format_cluster_context(cluster: List[Dict[str, Any]], all_entities: List[Dict[str, Any]],
+                           entity_section: str = "") -> str:
+    """
+    1つのクラスタについて、LLMに渡すエンティティ情報 (ローカル解析結果 + 初期分析レポートの該当行) を組み立てます。
+    """
+    cluster_classes = {entity["class_name"] for entity in cluster}
+    known_classes = {entity["class_name"] for entity in all_entities}
+    lines = []
+    for entity in cluster:
+        lines.append(f"エンティティ: {entity['class_name']} ({entity['qualified_name']}) / テーブル: {entity['table_name']}")
+        for field in entity["fields"]:
+            flags = [flag for flag, on in (("PK", field["primary_key"]), ("FK", field.get("foreign_key"))) if on]
+            annotations = ", ".join(f"@{name}" for name in field["annotations"])
+            lines.append(f"  - {field['column']}: {field['type']}"
+                         + (f" [{', '.join(flags)}]" if flags else "")
+                         + (f" ({annotations})" if annotations else ""))
+        for relation in entity["relations"]:
+            if relation["target"] in cluster_classes:
+                scope = ""
+            elif relation["target"] in known_classes:
+                scope = " (他のクラスタのエンティティ)"
+            else:
+                scope = " (エンティティとして検出されていない型)"
+            join = f", JoinColumn={relation['join_column']}" if relation["join_column"] else ""
+            mapped = f", mappedBy={relation['mapped_by']}" if relation["mapped_by"] else ""
+            lines.append(f"  - 関連 {relation['field']}: @{relation['kind']} -> {relation['target']}{scope}{join}{mapped}")
+
+    context = "\n".join(lines)
+    excerpt = [
+        line for line in (entity_section or "").splitlines()
+        if any(re.search(rf"\b{re.escape(name)}\b", line) for name in cluster_classes)
+    ]
+    if excerpt:
+        context += "\n\n初期分析レポートの該当箇所:\n" + "\n".join(excerpt)
+    return context
+
+
+def _split_cluster_section(section: str) -> Dict[str, str]:
+    """
+    クラスタごとの生成結果から、テーブル定義部分と状態遷移図部分を取り出します。
+    LLMが指示に反して出力した大見出しと erDiagram は取り除きます (全体の見出しとER図はローカルで組み立てるため)。
+    """
+    for block in reversed(extract_mermaid_blocks(section)):
+        if block["code"].lstrip().startswith("erDiagram"):
+            section = section[:block["start"]] + section[block["end"]:]
+    match = _STATE_SECTION_HEADING.search(section)
+    tables, states = (section[:match.start()], section[match.start():]) if match else (section, "")
+    return {
+        "tables": _TOP_LEVEL_HEADING.sub("", tables).strip(),
+        "states": _TOP_LEVEL_HEADING.sub("", states).strip(),
+    }
+
+
+def merge_db_sections(clusters: List[List[Dict[str, Any]]], sections: List[Optional[str]]) -> str:
+    """
+    クラスタごとに生成されたセクションを、ローカルで組み立てた全体のER図とともに1つのDB設計書にまとめます。
+    生成に失敗したクラスタ (None) は、その旨と対象エンティティを記載します。
+    """
+    all_entities = [entity for cluster in clusters for entity in cluster]
+    table_parts, state_parts = [], []
+    for index, (cluster, section) in enumerate(zip(clusters, sections), start=1):
+        names = ", ".join(entity["class_name"] for entity in cluster)
+        if not section:
+            table_parts.append(f"> ⚠️ クラスタ {index} ({names}) のテーブル定義の生成に失敗しました。")
+            continue
+        parts = _split_cluster_section(section)
+        table_parts.append(parts["tables"])
+        if parts["states"]:
+            state_parts.append(parts["states"])
+
+    document = [
+        "# データベース設計書",
+        "",
+        f"エンティティ {len(all_entities)} 件を、関連に基づく {len(clusters)} 個のクラスタに分けて生成しました。",
+        "",
+        "### 1. エンティティ関連図 (ER図 - Mermaid)",
+        "",
+        mermaid_block(build_er_diagram(all_entities)),
+        "",
+        "### 2. テーブル定義",
+        "",
+        "\n\n".join(table_parts),
+    ]
+    if state_parts:
+        document += ["", "### 3. 状態遷移図", "", "\n\n".join(state_parts)]
+    return "\n".join(document) + "\n"
+
+
+def cluster_label(cluster: List[Dict[str, Any]]) -> str:
+    """
+    ログ表示用のクラスタ名 (先頭のテーブル名と件数) を返します。
+    """
+    head = er_entity_name(cluster[0]) if cluster else ""
+    return f"{head} ほか{len(cluster) - 1}件" if len(cluster) > 1 else head
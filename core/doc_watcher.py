@@ -0,0 +1,228 @@
+# このファイルは doc_watcher モジュールです。
+# 分析対象のコードベースを watchdog で監視し、変更されたファイルに影響するドキュメントだけを
+# バックグラウンドで再生成する「ウォッチモード」を提供します。
+# Streamlit に依存しないため、UI (セッションごと) とヘッドレス実行 (cli.py watch) の両方から利用できます。
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from .file_utils import get_java_files, get_project_structure_text
+from .pipeline import regenerate_for_changes
+from .report_parser import LogFunc, log_with_logger
+
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+DEFAULT_MAX_RETRY_SECONDS = 300.0
+WATCHED_SUFFIXES = (".java",)
+
+
+class _ChangeCollector(FileSystemEventHandler):
+    """
+    watchdog のイベントを受け取り、対象拡張子のファイルパスを DocWatcher に渡すハンドラ。
+    """
+    def __init__(self, on_path_changed: Callable[[Path], None]):
+        super().__init__()
+        self._on_path_changed = on_path_changed
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path_str in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path_str and str(path_str).endswith(WATCHED_SUFFIXES):
+                self._on_path_changed(Path(path_str))
+
+
+class DocWatcher:
+    """
+    コードベースの変更を監視し、影響を受けるドキュメントを再生成するクラス。
+
+    ファイルイベントはデバウンス期間 (debounce_seconds) の間まとめられ、最後のイベントから
+    その期間が経過した時点で1つのバッチとして処理されます。再生成は専用のワーカースレッドで
+    1バッチずつ実行され、処理中に届いたイベントは次のバッチに回されます。
+    再生成に失敗したバッチは保留中の変更に戻し、デバウンス期間から倍々に延ばした待ち時間
+    (上限 watch_settings.max_retry_seconds) の後に再試行します。
+    """
+    def __init__(
+        self,
+        app_config: Dict[str, Any],
+        codebase_path: str,
+        initial_results: Dict[str, Any],
+        debounce_seconds: Optional[float] = None,
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+        ui_texts: Optional[Dict[str, str]] = None,
+        log: Optional[LogFunc] = None,
+    ):
+        """
+        コンストラクタ。
+
+        Args:
+            app_config (Dict[str, Any]): アプリケーション設定。
+            codebase_path (str): 監視対象のコードベースのパス。
+            initial_results (Dict[str, Any]): 最初のパイプライン結果 (initial_analysis, api_docs, db_doc など)。
+            debounce_seconds (Optional[float]): イベントをまとめる期間 (秒)。省略時は watch_settings.debounce_seconds。
+            on_update (Optional[Callable]): ドキュメントが更新されるたびに、最新の結果辞書を引数に呼ばれるコールバック。
+            ui_texts (Optional[Dict[str, str]]): プロジェクト概要の見出しに使うUIテキスト。
+            log (Optional[LogFunc]): 進捗メッセージの追加の出力先。メッセージは常に self.logs にも残ります。
+        """
+        watch_settings = app_config.get('watch_settings', {}) or {}
+        self.app_config = app_config
+        self.codebase_path = str(codebase_path)
+        self.debounce_seconds = float(
+            debounce_seconds if debounce_seconds is not None
+            else watch_settings.get('debounce_seconds', DEFAULT_DEBOUNCE_SECONDS)
+        )
+        self.max_retry_seconds = float(watch_settings.get('max_retry_seconds', DEFAULT_MAX_RETRY_SECONDS))
+        self.on_update = on_update
+        self.ui_texts = ui_texts
+        self._external_log = log
+
+        self._lock = threading.Lock()
+        self._results = deepcopy(initial_results)
+        self._java_files: List[Path] = get_java_files(self.codebase_path)
+        self._pending: Set[Path] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._observer = None
+        self._busy = False
+        self._failed_attempts = 0 # 連続して失敗した回数 (再試行の待ち時間の計算用)
+
+        self.version = 0 # ドキュメントが更新されるたびに増加する
+        self.last_updated: Optional[str] = None
+        self.logs = deque(maxlen=200)
+
+    # --- 公開API ---
+    def start(self) -> None:
+        """
+        監視を開始します。既に開始している場合は何もしません。
+        """
+        if self._observer is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="doc-watcher")
+        self._observer = Observer()
+        self._observer.schedule(_ChangeCollector(self._on_path_changed), self.codebase_path, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        self._log(f"ウォッチモードを開始しました: {self.codebase_path} (デバウンス {self.debounce_seconds:.1f}秒)")
+
+    def stop(self) -> None:
+        """
+        監視を停止します。実行中の再生成は完了まで待たずに切り離されます。
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._log("ウォッチモードを停止しました。")
+
+    @property
+    def is_running(self) -> bool:
+        return self._observer is not None
+
+    @property
+    def is_busy(self) -> bool:
+        """再生成処理の実行中、またはデバウンス待ちの変更がある場合に True。"""
+        with self._lock:
+            return self._busy or bool(self._pending)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        最新の結果辞書のコピーを返します。
+        """
+        with self._lock:
+            return deepcopy(self._results)
+
+    # --- 内部処理 ---
+    def _log(self, message: str, level: str = "info") -> None:
+        self.logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+        if self._external_log:
+            self._external_log(message, level)
+        else:
+            log_with_logger(message, level)
+
+    def _on_path_changed(self, path: Path) -> None:
+        with self._lock:
+            self._pending.add(path)
+            self._schedule(self.debounce_seconds)
+
+    def _schedule(self, delay: float) -> None:
+        # self._lock を保持した状態で呼び出す
+        if self._executor is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_debounce_elapsed)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _retry_later(self, batch: Set[Path]) -> None:
+        """
+        失敗したバッチを保留中の変更に戻し、待ち時間を倍々に延ばして再試行を予約します。
+        """
+        with self._lock:
+            self._pending |= batch
+            self._failed_attempts += 1
+            delay = min(self.debounce_seconds * 2 ** self._failed_attempts, self.max_retry_seconds)
+            self._schedule(delay)
+        self._log(f"{delay:.1f}秒後に再試行します (連続{self._failed_attempts}回目の失敗)。", "warning")
+
+    def _on_debounce_elapsed(self) -> None:
+        executor = self._executor
+        if executor is not None:
+            executor.submit(self._process_pending)
+
+    def _process_pending(self) -> None:
+        with self._lock:
+            batch = self._pending
+            self._pending = set()
+            previous_results = deepcopy(self._results)
+            self._busy = bool(batch)
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            self._log(f"{len(batch)}件のファイル変更を検出しました: " + ", ".join(sorted(p.name for p in batch)))
+            java_files = get_java_files(self.codebase_path)
+            dir_tree = get_project_structure_text(self.codebase_path, max_depth=5, include_files=False)
+            new_results = regenerate_for_changes(
+                self.app_config, self.codebase_path, java_files, dir_tree, previous_results, batch,
+                previous_java_files=self._java_files, log=self._log, ui_texts=self.ui_texts,
+            )
+            if new_results.get("status") != "Success":
+                self._log(new_results.get("message", "ドキュメントの再生成に失敗しました。"), "warning")
+                self._retry_later(batch)
+                return
+
+            self._java_files = java_files
+            with self._lock:
+                self._failed_attempts = 0
+            if new_results.get("regenerated"):
+                with self._lock:
+                    self._results = new_results
+                    self.version += 1
+                    self.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._log(f"{new_results['message']} ({time.perf_counter() - started:.1f}秒)")
+                if self.on_update:
+                    self.on_update(deepcopy(new_results))
+        except Exception as e:
+            self._log(f"ウォッチモードでの再生成中にエラーが発生しました: {e}", "error")
+            self._retry_later(batch)
+        finally:
+            with self._lock:
+                self._busy = False
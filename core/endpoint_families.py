@@ -0,0 +1,308 @@
+# このファイルは endpoint_families モジュールです。
+# 構造が同じエンドポイント (例: UserController と OrderController の GET /api/{リソース}/{id}) を
+# 「ファミリー」にまとめ、代表のエンドポイントだけ設計書を通常どおり生成し、残りは代表の設計書から導出します。
+# - 構造の指紋: HTTPメソッド、パスの形、パラメータ (種類・型・名前)、戻り値の型、呼び出し木の形。
+#   いずれもリソース名 (コントローラ名から Controller などを除いた部分) を伏せて比較します。
+# - 導出: 参照する DTO・エンティティのフィールド構成まで同じ場合は、リソース名の置換だけでローカルに導出し、
+#   異なる場合は代表の設計書を雛形にした小さな差分プロンプトで生成します (core.pipeline)。
+# autogen に依存しないため、ドライラン見積もり (core.estimator) からも利用できます。
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .java_parser import build_call_tree, type_fields
+from .local_diagrams import match_local_endpoint
+
+DEFAULT_ENDPOINT_FAMILY_SETTINGS = {
+    "enabled": True,
+    "min_family_size": 2,
+    "local_substitution": True,
+    "subject_translations": {},
+}
+
+# コントローラ名からリソース名を取り出すときに取り除く接尾辞 (長いものから順に試す)
+_CONTROLLER_SUFFIXES = ("RestController", "Controller", "Resource", "Endpoint", "Api")
+_SUBJECT_MASK = "§"
+
+# リソース名の英単語 (小文字) に対して、設計書の日本語の説明文で使われやすい訳語。
+# 代表の設計書にこれらが残っていると置換だけでは正しい設計書にならないため、差分プロンプトに切り替える
+# (endpoint_family_settings.subject_translations で追加できます)
+_SUBJECT_TRANSLATIONS = {
+    "user": ["ユーザー", "ユーザ", "利用者", "会員"],
+    "order": ["注文", "オーダー", "受注", "発注"],
+    "product": ["商品", "製品", "プロダクト"],
+    "category": ["カテゴリ", "分類"],
+    "customer": ["顧客", "カスタマー"],
+    "item": ["アイテム", "商品", "品目", "明細"],
+    "account": ["アカウント", "口座"],
+    "employee": ["従業員", "社員"],
+    "department": ["部署", "部門"],
+    "book": ["書籍"],
+    "comment": ["コメント"],
+    "post": ["投稿"],
+    "article": ["記事"],
+    "message": ["メッセージ"],
+    "payment": ["支払", "決済"],
+    "invoice": ["請求"],
+    "address": ["住所", "アドレス"],
+    "role": ["ロール", "役割"],
+    "group": ["グループ"],
+    "project": ["プロジェクト"],
+    "task": ["タスク"],
+    "team": ["チーム"],
+    "file": ["ファイル"],
+    "image": ["画像"],
+    "tag": ["タグ"],
+    "review": ["レビュー"],
+    "store": ["店舗", "ストア"],
+    "shop": ["店舗", "ショップ"],
+    "cart": ["カート"],
+    "stock": ["在庫"],
+    "inventory": ["在庫"],
+    "supplier": ["仕入先"],
+    "member": ["会員", "メンバー"],
+    "notification": ["通知"],
+    "report": ["レポート", "報告"],
+    "schedule": ["スケジュール", "予定"],
+    "reservation": ["予約"],
+    "booking": ["予約"],
+    "ticket": ["チケット"],
+    "event": ["イベント"],
+    "company": ["会社", "企業"],
+    "organization": ["組織"],
+    "student": ["学生", "生徒"],
+    "course": ["コース", "講座"],
+    "room": ["部屋", "ルーム"],
+}
+
+
+def endpoint_family_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_ENDPOINT_FAMILY_SETTINGS)
+    settings.update(app_config.get('endpoint_family_settings', {}) or {})
+    return settings
+
+
+def resource_subject(endpoint: Dict[str, Any]) -> str:
+    """
+    エンドポイントのリソース名を、コントローラの単純名から接尾辞を除いて返します (UserController -> User)。
+    取り出せない場合は空文字列を返します。
+    """
+    name = endpoint["controller_simple_name"]
+    for suffix in _CONTROLLER_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return ""
+
+
+def _plural(word: str) -> str:
+    if re.search(r"(s|x|z|ch|sh)$", word):
+        return word + "es"
+    if re.search(r"[^aeiou]y$", word):
+        return word[:-1] + "ies"
+    return word + "s"
+
+
+def subject_variants(subject: str) -> List[str]:
+    """
+    リソース名がソースコードや設計書に現れうる表記 (単数・複数 × PascalCase・camelCase・小文字・snake_case・
+    kebab-case・大文字) を返します。順序は subject を変えても対応が保たれます。
+    """
+    words = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+", subject)
+    if not words:
+        return []
+    variants = []
+    for form in (words[:-1] + [_plural(words[-1])], words):
+        lower = [w.lower() for w in form]
+        variants.extend([
+            "".join(w[:1].upper() + w[1:] for w in form),
+            lower[0] + "".join(w.capitalize() for w in lower[1:]),
+            "".join(lower),
+            "_".join(lower),
+            "-".join(lower),
+            "_".join(lower).upper(),
+        ])
+    return variants
+
+
+def _variant_pattern(variant: str) -> str:
+    # 小文字の表記は単語の途中 (superuser の user など) に、大文字の表記は定数名の途中に一致させない。
+    # PascalCase は getUserById のような識別子の途中でも置き換える
+    if variant.isupper():
+        return rf"(?<![A-Z]){re.escape(variant)}(?![A-Z])"
+    if variant[:1].islower():
+        return rf"(?<![a-z]){re.escape(variant)}(?![a-z])"
+    return rf"{re.escape(variant)}(?![a-z])"
+
+
+def substitute_subject(text: str, source: str, target: Optional[str]) -> str:
+    """
+    text 中のリソース名 source の各表記を、target の対応する表記に置き換えます。
+    target が None の場合は伏せ字に置き換えます (構造の比較用)。
+    """
+    source_variants = subject_variants(source)
+    if not source_variants or not text:
+        return text
+    target_variants = subject_variants(target) if target else [_SUBJECT_MASK] * len(source_variants)
+    # 1語のリソース名では camelCase・小文字・snake_case などが同じ表記になるため、置換先の候補をすべて持っておく
+    replacements: Dict[str, List[str]] = {}
+    for source_variant, target_variant in zip(source_variants, target_variants):
+        candidates = replacements.setdefault(source_variant, [])
+        if target_variant not in candidates:
+            candidates.append(target_variant)
+    ordered = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile("|".join(f"({_variant_pattern(v)})" for v in ordered))
+
+    def replace(match: re.Match) -> str:
+        candidates = replacements[ordered[match.lastindex - 1]]
+        # 前後の区切り文字 (user_id の "_"、order-items の "-") に合わせて表記を選ぶ
+        neighbors = text[max(0, match.start() - 1):match.start()] + text[match.end():match.end() + 1]
+        for separator in ("_", "-"):
+            if separator in neighbors:
+                return next((c for c in candidates if separator in c), candidates[0])
+        return candidates[0]
+
+    return pattern.sub(replace, text)
+
+
+def endpoint_fingerprint(endpoint: Dict[str, Any], discovery: Dict[str, Any]) -> Tuple:
+    """
+    エンドポイントの構造の指紋を返します。リソース名だけが異なるエンドポイントは同じ指紋になります。
+    """
+    subject = resource_subject(endpoint)
+
+    def mask(text: str) -> str:
+        return substitute_subject(text, subject, None)
+
+    def shape(nodes: List[Dict[str, Any]]) -> Tuple:
+        return tuple((node["role"], mask(node["callee"]), mask(node["method"]), shape(node["calls"])) for node in nodes)
+
+    path = mask(endpoint["path"]).rstrip("/") or "/"
+    parameters = tuple((p["kind"], mask(p["type"]), mask(p["name"]), tuple(sorted(p["annotations"])))
+                       for p in endpoint["parameters"])
+    tree = build_call_tree(discovery["types"], endpoint["controller_simple_name"], endpoint["body"])
+    return (endpoint["http_method"], path, parameters, mask(endpoint["return_type"]), shape(tree))
+
+
+def plan_endpoint_families(app_config: Dict[str, Any], identifiers: List[str],
+                           discovery: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    API識別子を構造の指紋でファミリーにまとめます。各ファミリーの先頭 (identifiers の順で最初のもの) が代表です。
+    ローカルで対応するエンドポイントが見つからないAPIや、リソース名を取り出せないAPIはまとめません。
+
+    Returns:
+        Dict[str, Any]: {"families": [[代表, メンバー, ...], ...], "canonical_of": {メンバー: 代表}}
+                        families には min_family_size 以上のファミリーだけを含みます。
+    """
+    settings = endpoint_family_settings(app_config)
+    if not settings["enabled"] or not discovery:
+        return {"families": [], "canonical_of": {}}
+
+    groups: Dict[Tuple, List[str]] = {}
+    subjects_by_group: Dict[Tuple, set] = {}
+    for identifier in identifiers:
+        endpoint = match_local_endpoint(identifier, discovery["endpoints"])
+        if endpoint is None or not resource_subject(endpoint):
+            continue
+        key = endpoint_fingerprint(endpoint, discovery)
+        subject = resource_subject(endpoint)
+        # 同じリソースのエンドポイントどうしはリソース名の置換で導出できないため、まとめない
+        if subject in subjects_by_group.get(key, set()):
+            continue
+        groups.setdefault(key, []).append(identifier)
+        subjects_by_group.setdefault(key, set()).add(subject)
+
+    families = [members for members in groups.values() if len(members) >= max(2, int(settings["min_family_size"]))]
+    canonical_of = {member: family[0] for family in families for member in family[1:]}
+    return {"families": families, "canonical_of": canonical_of}
+
+
+def _referenced_type_names(endpoint: Dict[str, Any], subject: str) -> List[str]:
+    # パラメータと戻り値の型 (ジェネリクスの型引数を含む) のうち、リソース名を含む型とリソース名そのもの
+    signature = " ".join([p["type"] for p in endpoint["parameters"]] + [endpoint["return_type"]])
+    names = {name.split(".")[-1] for name in re.findall(r"[A-Za-z_][\w.]*", signature)}
+    names.add(subject)
+    return sorted(name for name in names if substitute_subject(name, subject, None) != name)
+
+
+def referenced_type_shapes(endpoint: Dict[str, Any], discovery: Dict[str, Any]) -> Tuple:
+    """
+    エンドポイントが参照する DTO・エンティティのフィールド構成を、リソース名を伏せた形で返します。
+    """
+    subject = resource_subject(endpoint)
+
+    def mask(text: str) -> str:
+        return substitute_subject(text, subject, None)
+
+    shapes = []
+    for name in _referenced_type_names(endpoint, subject):
+        java_type = discovery["types"].get(name)
+        fields = tuple((mask(f["name"]), mask(f["type"])) for f in type_fields(java_type)) if java_type else None
+        shapes.append((mask(name), fields))
+    return tuple(sorted(shapes, key=lambda shape: shape[0]))
+
+
+def can_substitute_locally(app_config: Dict[str, Any], canonical_endpoint: Dict[str, Any],
+                           member_endpoint: Dict[str, Any], discovery: Dict[str, Any]) -> bool:
+    """
+    メンバーの設計書を、代表の設計書のリソース名の置換だけで導出できるかどうかを返します。
+    参照する DTO・エンティティのフィールド構成 (名前と型) が同じ場合だけ置換できるとみなします。
+    """
+    if not endpoint_family_settings(app_config)["local_substitution"]:
+        return False
+    return referenced_type_shapes(canonical_endpoint, discovery) == referenced_type_shapes(member_endpoint, discovery)
+
+
+def subject_translations(subject: str, extra: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """
+    リソース名を構成する英単語 (単数形) の日本語の訳語を返します。extra は {英単語: [訳語, ...]} の追加分です。
+    """
+    translations = []
+    for word in re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+", subject):
+        word = word.lower()
+        for table in (_SUBJECT_TRANSLATIONS, extra or {}):
+            translations.extend(t for t in table.get(word, []) if t and t not in translations)
+    return translations
+
+
+def derive_document_locally(canonical_identifier: str, canonical_endpoint: Dict[str, Any],
+                            member_endpoint: Dict[str, Any], canonical_document: str,
+                            translations: Optional[Dict[str, List[str]]] = None) -> Optional[str]:
+    """
+    代表の設計書のリソース名をメンバーのものに置き換えて、メンバーの設計書を導出します。
+    置換できるのはソースコード上の表記 (User、users、user_id など) だけのため、代表の設計書の説明文に
+    リソース名の日本語の訳語 (subject_translations。例: 「ユーザー情報を取得します」) が含まれる場合や、
+    代表の設計書に代表のパスが書かれていない場合は None を返します (呼び出し元で差分プロンプトに切り替えます)。
+
+    Args:
+        translations (Optional[Dict[str, List[str]]]): 組み込みの訳語に追加する {英単語: [訳語, ...]}
+                                                        (endpoint_family_settings.subject_translations)。
+    """
+    canonical_subject = resource_subject(canonical_endpoint)
+    if any(term in canonical_document for term in subject_translations(canonical_subject, translations)):
+        return None
+    # パスは表記の揺れ (orderItems と order-items など) があるため、代表のパスをそのままメンバーのパスに置き換える
+    path_token = "\0PATH\0"
+    document = canonical_document.replace(canonical_endpoint["path"], path_token)
+    document = substitute_subject(document, canonical_subject, resource_subject(member_endpoint))
+    document = document.replace(path_token, member_endpoint["path"])
+    if member_endpoint["path"] not in document:  # 代表の設計書にパスが書かれていない
+        return None
+    note = f"> この設計書は `{canonical_identifier}` の設計書から自動生成されました。"
+    heading = re.search(r"^#[^\n]*$", document, re.MULTILINE)
+    if heading:
+        return f"{document[:heading.end()]}\n\n{note}\n{document[heading.end():]}"
+    return f"{note}\n\n{document}"
+
+
+def describe_referenced_types(endpoint: Dict[str, Any], discovery: Dict[str, Any]) -> str:
+    """
+    エンドポイントが参照する DTO・エンティティのフィールド一覧を、差分プロンプト用のテキストに整形します。
+    """
+    lines = []
+    for name in _referenced_type_names(endpoint, resource_subject(endpoint)):
+        java_type = discovery["types"].get(name)
+        if java_type is None:
+            continue
+        fields = ", ".join(f"{f['name']} ({f['type']})" for f in type_fields(java_type)) or "なし"
+        lines.append(f"- {name}: {fields}")
+    return "\n".join(lines)
@@ -0,0 +1,375 @@
+# このファイルは estimator モジュールです。
+# LLMを呼び出さずに、パイプラインが送信するプロンプトを全て組み立ててトークン数を数え、
+# 段階ごと・全体の入出力トークン数、コスト、所要時間を見積もる「ドライラン」を提供します。
+# エンドポイントとエンティティは core.java_parser でローカルに検出し、初期分析の出力は
+# 同じ形式のローカルレポートで代用します。
+
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .db_sharding import cluster_label, format_cluster_context, plan_db_shards
+from .endpoint_families import can_substitute_locally, describe_referenced_types, plan_endpoint_families
+from .java_parser import discover_codebase, format_local_analysis_report
+from .llm_stats import observed_average_completion_tokens, observed_seconds_per_output_token
+from .local_diagrams import er_diagram_for, match_local_endpoint, sequence_diagram_for
+from .model_router import endpoint_complexity, route_for
+from .report_parser import extract_entity_section, parse_api_endpoints_from_report
+
+logger = logging.getLogger(__name__)
+
+# tiktoken が使えない場合の概算 (日本語混じりのテキストで 1トークン ≒ 2文字程度)
+APPROX_CHARS_PER_TOKEN = 2.0
+
+DEFAULT_ESTIMATOR_SETTINGS = {
+    "api_design_output_tokens": 2500,
+    "db_design_base_output_tokens": 800,
+    "db_design_output_tokens_per_entity": 450,
+    "seconds_per_output_token": 0.02,
+    "seconds_per_call_overhead": 1.5,
+    "prompt_cache_min_tokens": 1024,
+    "prompt_cache_increment_tokens": 128,
+}
+
+_ENCODINGS: Dict[str, Any] = {}
+
+
+def _get_encoding(model: str):
+    """
+    モデルに対応する tiktoken のエンコーディングを返します (初回のみ読み込み)。
+    tiktoken が利用できない場合は None を返します。
+    """
+    if model in _ENCODINGS:
+        return _ENCODINGS[model]
+    encoding = None
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken を利用できないため、文字数からトークン数を概算します: {e}")
+    _ENCODINGS[model] = encoding
+    return encoding
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    テキストのトークン数を返します。tiktoken が利用できない場合は文字数から概算します。
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return int(math.ceil(len(text or "") / APPROX_CHARS_PER_TOKEN))
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def _price_for(app_config: Dict[str, Any], model: str) -> Dict[str, float]:
+    pricing = app_config.get('model_pricing', {}) or {}
+    # "gpt-4o-mini-2024-07-18" のような日付付きの名前にも、最長一致で対応する
+    for name in sorted(pricing, key=len, reverse=True):
+        if model.startswith(name):
+            return pricing[name]
+    return {}
+
+
+def _context_window_for(app_config: Dict[str, Any], model: str) -> Optional[Dict[str, int]]:
+    windows = app_config.get('model_context_windows', {}) or {}
+    for name in sorted(windows, key=len, reverse=True):
+        if model.startswith(name):
+            return windows[name]
+    return None
+
+
+def _stage_estimate(stage: str, model: str, prompts: List[Dict[str, Any]], app_config: Dict[str, Any],
+                    settings: Dict[str, Any], concurrency: int, warnings: List[str]) -> Dict[str, Any]:
+    """
+    1つの段階に含まれる全プロンプトについて、トークン数・コスト・所要時間を集計します。
+    prompts の各要素は {"label", "input_tokens", "output_tokens"} と、任意で "model" (model_routing で選ばれたモデル)、
+    "cached_tokens" (入力のうちプロバイダ側のプレフィックスキャッシュから読み込まれる見込みのトークン数)。
+    "model" がない場合は段階の model を使います。
+    """
+    input_tokens = sum(p["input_tokens"] for p in prompts)
+    output_tokens = sum(p["output_tokens"] for p in prompts)
+    cached_tokens = sum(p.get("cached_tokens", 0) for p in prompts)
+
+    cost = 0.0
+    per_call_seconds = []
+    for p in prompts:
+        price = _price_for(app_config, p.get("model", model))
+        input_price = price.get('input_per_1m_tokens', 0.0)
+        # キャッシュされた入力の料金が設定されていないモデルは、キャッシュ分も通常の入力料金で計算する
+        cached_price = price.get('cached_input_per_1m_tokens', input_price)
+        cached = p.get("cached_tokens", 0)
+        cost += ((p["input_tokens"] - cached) * input_price + cached * cached_price
+                 + p["output_tokens"] * price.get('output_per_1m_tokens', 0.0)) / 1_000_000
+        per_call_seconds.append(_call_seconds(p.get("model", model), p["output_tokens"], settings))
+    lanes = max(1, min(concurrency, len(prompts)))
+    # 並列実行時は、合計時間を並列数で割った値と、最も長い1呼び出しの大きい方を所要時間とみなす
+    wall_seconds = max(sum(per_call_seconds) / lanes, max(per_call_seconds, default=0.0))
+
+    for p in prompts:
+        prompt_model = p.get("model", model)
+        window = _context_window_for(app_config, prompt_model)
+        if window:
+            if p["input_tokens"] + p["output_tokens"] > window.get('context', float('inf')):
+                warnings.append(
+                    f"[{stage}] {p['label']}: 入力 {p['input_tokens']:,} + 出力 {p['output_tokens']:,} トークンが "
+                    f"{prompt_model} のコンテキストウィンドウ ({window['context']:,}) を超えます。"
+                )
+            elif p["output_tokens"] > window.get('max_output', float('inf')):
+                warnings.append(
+                    f"[{stage}] {p['label']}: 予測出力 {p['output_tokens']:,} トークンが {prompt_model} の最大出力 "
+                    f"({window['max_output']:,}) を超えるため、出力が途中で切れる可能性があります。"
+                )
+
+    models = sorted({p.get("model", model) for p in prompts}) or [model]
+    return {
+        "stage": stage,
+        "model": ", ".join(models),
+        "calls": len(prompts),
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "output_tokens": output_tokens,
+        "cost": cost,
+        "wall_seconds": wall_seconds,
+        "seconds_per_output_token": _seconds_per_token(models[0], settings),
+    }
+
+
+def _seconds_per_token(model: str, settings: Dict[str, Any]) -> float:
+    return observed_seconds_per_output_token(model) or settings["seconds_per_output_token"]
+
+
+def _call_seconds(model: str, output_tokens: int, settings: Dict[str, Any]) -> float:
+    """
+    1回の呼び出しの所要時間を見積もります。実測値 (core.llm_stats) は呼び出しごとの固定的な待ち時間を含むため、
+    実測値を使う場合は seconds_per_call_overhead を加えません。
+    """
+    observed = observed_seconds_per_output_token(model)
+    if observed:
+        return output_tokens * observed
+    return settings["seconds_per_call_overhead"] + output_tokens * settings["seconds_per_output_token"]
+
+
+def _apply_prefix_cache(prompts: List[Dict[str, Any]], texts: List[str], system_tokens: int,
+                        count: Any, settings: Dict[str, Any]) -> None:
+    """
+    同じ段階のプロンプトどうしで先頭が一致する部分 (システムプロンプト + 共通の指示・コンテキスト) を、
+    2件目以降の呼び出しでプロバイダ側のキャッシュから読み込まれる入力として各要素の "cached_tokens" に設定します。
+    OpenAI と同様に、一致部分が prompt_cache_min_tokens 以上の場合だけ、prompt_cache_increment_tokens 単位でキャッシュされるとみなします。
+    比較相手は、段階の最初のプロンプトと直前のプロンプトです。
+    """
+    minimum = int(settings["prompt_cache_min_tokens"])
+    increment = max(1, int(settings["prompt_cache_increment_tokens"]))
+    for i in range(1, len(prompts)):
+        shared = max(len(os.path.commonprefix([texts[i], texts[j]])) for j in {0, i - 1})
+        prefix_tokens = system_tokens + (count(texts[i][:shared]) if shared else 0)
+        if prefix_tokens >= minimum:
+            cached = minimum + (prefix_tokens - minimum) // increment * increment
+            prompts[i]["cached_tokens"] = min(cached, prompts[i]["input_tokens"])
+
+
+def estimate_pipeline(app_config: Dict[str, Any], codebase_path: str, java_files: List[Path],
+                      dir_tree: str) -> Dict[str, Any]:
+    """
+    パイプライン全体のドライラン見積もりを行います。LLMは一切呼び出しません。
+
+    Args:
+        app_config (Dict[str, Any]): アプリケーション設定。
+        codebase_path (str): 分析対象のコードベースのパス。
+        java_files (List[Path]): 検出されたJavaファイルのリスト。
+        dir_tree (str): ディレクトリ構造を表す文字列。
+
+    Returns:
+        Dict[str, Any]: {"model", "discovery", "stages": [...], "total": {...}, "warnings": [...], "token_counter"}
+    """
+    from agents.api_design_generator_agent import APIDesignGeneratorAgent
+    from agents.codebase_analyzer_agent import CodebaseAnalyzerAgent
+    from agents.db_design_generator_agent import DBDesignGeneratorAgent
+
+    settings = dict(DEFAULT_ESTIMATOR_SETTINGS)
+    settings.update(app_config.get('estimator_settings', {}) or {})
+    model = (app_config.get('llm_config', {}) or {}).get('model', "gpt-4o-mini")
+    concurrency = int((app_config.get('pipeline_settings', {}) or {}).get('max_concurrency', 1))
+    prompts_config = app_config.get('prompts', {}) or {}
+    warnings: List[str] = []
+
+    def tokens(text: str) -> int:
+        return count_tokens(text, model)
+
+    def routed_model(task: str, agent_name: str, prompt: str, complexity: Optional[int] = None) -> str:
+        # model_routing が有効な場合は、実行時と同じ規則で選ばれる主モデルの料金・速度で見積もる
+        return route_for(app_config, task, agent_name, prompt=prompt, complexity=complexity)["models"][0]
+
+    discovery = discover_codebase(java_files)
+    local_report = format_local_analysis_report(discovery["endpoints"], discovery["entities"])
+
+    # 段階1: 初期分析 (出力は、同じ形式で組み立てたローカルレポートの長さで予測する)
+    analyzer_system = prompts_config.get('codebase_analyzer', CodebaseAnalyzerAgent.DEFAULT_SYSTEM_MESSAGE)
+    analyzer_prompt = CodebaseAnalyzerAgent.analyze_codebase(codebase_path, java_files, dir_tree)
+    stages = [_stage_estimate("codebase_analyzer", model, [{
+        "label": "初期分析",
+        "input_tokens": tokens(analyzer_system) + tokens(analyzer_prompt),
+        "output_tokens": tokens(local_report),
+        "model": routed_model("codebase_analyzer", "JavaCodeAnalyzer", analyzer_prompt),
+    }], app_config, settings, 1, warnings)]
+
+    # 段階2: API設計書 (エンドポイントごとに1回)
+    api_system_tokens = tokens(prompts_config.get('api_design_generator', APIDesignGeneratorAgent.DEFAULT_SYSTEM_MESSAGE))
+    api_output_tokens = int(observed_average_completion_tokens("api_design") or settings["api_design_output_tokens"])
+    api_prompts, api_prompt_texts = [], []
+    local_api_endpoints = parse_api_endpoints_from_report(local_report, lambda *_: None)
+    families = plan_endpoint_families(app_config, [identifier for identifier, _ in local_api_endpoints], discovery)
+    family_canonicals = {family[0] for family in families["families"]}
+    derived_locally = 0
+    for identifier, block in local_api_endpoints:
+        sequence_diagram = sequence_diagram_for(app_config, identifier, discovery)
+        canonical = families["canonical_of"].get(identifier)
+        if canonical:
+            # ファミリーのメンバーは代表の設計書から導出する。置換で導出できるものはLLMを呼ばない
+            canonical_endpoint = match_local_endpoint(canonical, discovery["endpoints"])
+            member_endpoint = match_local_endpoint(identifier, discovery["endpoints"])
+            if can_substitute_locally(app_config, canonical_endpoint, member_endpoint, discovery):
+                derived_locally += 1
+                continue
+            prompt = APIDesignGeneratorAgent.generate_api_delta_prompt(
+                canonical_identifier=canonical, canonical_document="", single_api_analysis=block,
+                referenced_types=describe_referenced_types(member_endpoint, discovery), sequence_diagram=sequence_diagram)
+            # 雛形の設計書の長さは、代表の設計書の予測出力トークン数で見積もる
+            api_prompts.append({"label": f"{identifier} (差分)", "input_tokens": api_system_tokens + tokens(prompt) + api_output_tokens,
+                                "output_tokens": api_output_tokens,
+                                "model": routed_model("api_design_delta", "APIDesignGenerator", prompt)})
+            api_prompt_texts.append(prompt)
+            continue
+        prompt = APIDesignGeneratorAgent.generate_api_document_prompt(
+            single_api_analysis=block, full_analysis_report=local_report,
+            sequence_diagram=sequence_diagram, family_template=identifier in family_canonicals)
+        api_prompts.append({"label": identifier, "input_tokens": api_system_tokens + tokens(prompt), "output_tokens": api_output_tokens,
+                            "model": routed_model("api_design", "APIDesignGenerator", prompt, endpoint_complexity(identifier, discovery))})
+        api_prompt_texts.append(prompt)
+    if api_prompts:
+        # API設計書は順番に生成されるため、共通の先頭部分 (全体分析レポートまで) は2件目以降キャッシュから読み込まれる
+        _apply_prefix_cache(api_prompts, api_prompt_texts, api_system_tokens, tokens, settings)
+        # API設計書はファミリーの代表から導出するため1件ずつ順番に生成される (並列数は DB設計書のクラスタにだけ適用される)
+        stages.append(_stage_estimate("api_design", model, api_prompts, app_config, settings, 1, warnings))
+
+    # 段階3: DB設計書 (エンティティが多い場合はクラスタごとに分割して並列に生成される)
+    db_system_tokens = tokens(prompts_config.get('db_design_generator', DBDesignGeneratorAgent.DEFAULT_SYSTEM_MESSAGE))
+    clusters = plan_db_shards(app_config, discovery["entities"])
+    if clusters:
+        entity_section = extract_entity_section(local_report)
+        db_prompts, db_prompt_texts = [], []
+        for index, cluster in enumerate(clusters, start=1):
+            prompt = DBDesignGeneratorAgent.generate_db_cluster_prompt(
+                format_cluster_context(cluster, discovery["entities"], entity_section), index, len(clusters))
+            db_prompt_texts.append(prompt)
+            db_prompts.append({
+                "label": f"DB設計書 クラスタ {index} ({cluster_label(cluster)})",
+                "input_tokens": db_system_tokens + tokens(prompt),
+                "output_tokens": int(settings["db_design_output_tokens_per_entity"] * len(cluster)),
+                "model": routed_model("db_design_cluster", "DBDesignGenerator", prompt),
+            })
+        if (app_config.get('pipeline_settings', {}) or {}).get('warm_up_prompt_cache', True):
+            # 最初のクラスタを先に生成してから残りを並列に送るため、共通の指示はキャッシュから読み込まれる
+            _apply_prefix_cache(db_prompts, db_prompt_texts, db_system_tokens, tokens, settings)
+        stages.append(_stage_estimate("db_design", model, db_prompts, app_config, settings, concurrency, warnings))
+    else:
+        db_prompt = DBDesignGeneratorAgent.generate_db_document_prompt(local_report, er_diagram=er_diagram_for(app_config, discovery))
+        db_output_tokens = int(settings["db_design_base_output_tokens"]
+                               + settings["db_design_output_tokens_per_entity"] * len(discovery["entities"]))
+        stages.append(_stage_estimate("db_design", model, [{
+            "label": "DB設計書",
+            "input_tokens": db_system_tokens + tokens(db_prompt),
+            "output_tokens": db_output_tokens,
+            "model": routed_model("db_design", "DBDesignGenerator", db_prompt),
+        }], app_config, settings, 1, warnings))
+
+    for used_model in sorted({m for stage in stages for m in stage["model"].split(", ")}):
+        if not _price_for(app_config, used_model):
+            warnings.append(f"model_pricing に {used_model} の料金が設定されていないため、コストは0として計算しています。")
+    if len(java_files) > CodebaseAnalyzerAgent.MAX_FILES_TO_ANALYZE:
+        warnings.append(
+            f"初期分析にはJavaファイル {len(java_files)} 件のうち先頭 {CodebaseAnalyzerAgent.MAX_FILES_TO_ANALYZE} 件の内容のみが含まれます。"
+        )
+
+    total = {
+        "calls": sum(s["calls"] for s in stages),
+        "input_tokens": sum(s["input_tokens"] for s in stages),
+        "cached_tokens": sum(s["cached_tokens"] for s in stages),
+        "output_tokens": sum(s["output_tokens"] for s in stages),
+        "cost": sum(s["cost"] for s in stages),
+        # 段階は順番に実行されるため、所要時間は各段階の合計
+        "wall_seconds": sum(s["wall_seconds"] for s in stages),
+    }
+    return {
+        "model": model,
+        "concurrency": concurrency,
+        "discovery": {"java_files": len(java_files), "endpoints": len(discovery["endpoints"]),
+                      "entities": len(discovery["entities"]), "parse_errors": discovery["errors"],
+                      "endpoint_families": len(families["families"]), "derived_endpoints": len(families["canonical_of"]),
+                      "derived_locally": derived_locally},
+        "stages": stages,
+        "total": total,
+        "warnings": warnings,
+        "token_counter": "tiktoken" if _get_encoding(model) is not None else "approx",
+    }
+
+
+STAGE_LABELS = {
+    "codebase_analyzer": "初期分析",
+    "api_design": "API設計書",
+    "db_design": "DB設計書",
+}
+
+
+def format_estimate_markdown(estimate: Dict[str, Any]) -> str:
+    """
+    見積もり結果をMarkdownの表に整形します。
+    """
+    discovery = estimate["discovery"]
+    lines = [
+        f"**モデル**: {estimate['model']} / **DB設計書の並列数**: {estimate['concurrency']} / "
+        f"**トークン計数**: {'tiktoken' if estimate['token_counter'] == 'tiktoken' else '概算 (文字数ベース)'}",
+        "",
+        f"検出: Javaファイル {discovery['java_files']:,} 件、APIエンドポイント {discovery['endpoints']:,} 件、"
+        f"エンティティ {discovery['entities']:,} 件",
+        "",
+    ]
+    if discovery.get("derived_endpoints"):
+        lines.extend([
+            f"構造が同じAPIのファミリー {discovery['endpoint_families']:,} 件: {discovery['derived_endpoints']:,} 件の設計書を代表から導出 "
+            f"(うちローカルの置換 {discovery['derived_locally']:,} 件はLLMを呼び出しません)",
+            "",
+        ])
+    lines += [
+        "| 段階 | モデル | 呼び出し数 | 入力トークン | うちキャッシュ (予測) | 出力トークン (予測) | コスト (USD) | 所要時間 (予測) |",
+        "|------|--------|-----------:|-------------:|----------------------:|--------------------:|-------------:|----------------:|",
+    ]
+    for stage in estimate["stages"]:
+        lines.append(
+            f"| {STAGE_LABELS.get(stage['stage'], stage['stage'])} | {stage['model']} | {stage['calls']:,} | {stage['input_tokens']:,} | "
+            f"{stage['cached_tokens']:,} | {stage['output_tokens']:,} | ${stage['cost']:.4f} | {_format_seconds(stage['wall_seconds'])} |"
+        )
+    total = estimate["total"]
+    lines.append(
+        f"| **合計** | | **{total['calls']:,}** | **{total['input_tokens']:,}** | **{total['cached_tokens']:,}** | "
+        f"**{total['output_tokens']:,}** | **${total['cost']:.4f}** | **{_format_seconds(total['wall_seconds'])}** |"
+    )
+    if estimate["warnings"]:
+        lines.append("")
+        lines.extend(f"- ⚠️ {warning}" for warning in estimate["warnings"])
+    return "\n".join(lines)
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}秒"
+    minutes, sec = divmod(int(round(seconds)), 60)
+    if minutes < 60:
+        return f"{minutes}分{sec:02d}秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}時間{minutes:02d}分"
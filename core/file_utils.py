@@ -4,8 +4,12 @@
 import os
 from pathlib import Path
 import re # re モジュールをインポート
-from typing import Optional, Tuple # 追加
+import threading
+from typing import Dict, List, Optional, Tuple # 追加
 
+from .profiler import profiled
+
+@profiled("file_discovery")
 def get_java_files(directory_path: str):
     """
     指定されたディレクトリ内のすべての .java ファイルのリストを再帰的に取得します。
@@ -25,6 +29,7 @@ def get_java_files(directory_path: str):
         java_files.append(file_path)
     return java_files
 
+@profiled("directory_tree")
 def get_project_structure_text(root_dir_str: str, max_depth=5, indent_char='    ', max_items_per_dir=20, include_files: bool = True) -> str:
     """
     指定されたディレクトリの構造をテキストベースのツリー形式で取得します。
@@ -103,6 +108,40 @@ def sanitize_filename(filename: str) -> str:
     filename = re.sub(r'[\s/:*?"<>|]+', '_', filename)
     return filename
 
+def write_text_atomic(path: Path, content: str) -> None:
+    """
+    一時ファイルに書き込んでから置き換えることで、書き込み途中の内容が残らないようにファイルを保存します。
+    一時ファイル名にはプロセスIDとスレッドIDを含めるため、複数のスレッドから同時に呼び出せます。
+    置き換える前に一時ファイルを、置き換えた後にディレクトリを fsync するため、電源断などの後も
+    古い内容か新しい内容のどちらかが残ります。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(path.parent)
+
+
+def _fsync_directory(directory: Path) -> None:
+    """
+    ディレクトリのエントリ (置き換えたファイル名) をディスクに反映します。ディレクトリを開けない環境 (Windows) では何もしません。
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
 def save_markdown_to_file(content: str, directory: Path, filename: str) -> Tuple[bool, Optional[str]]:
     """
     指定されたディレクトリにMarkdownコンテンツをファイルとして保存します。
@@ -123,4 +162,84 @@ def save_markdown_to_file(content: str, directory: Path, filename: str) -> Tuple
             f.write(content)
         return True, None
     except Exception as e:
-        return False, str(e) 
\ No newline at end of file
+        return False, str(e) 
+def save_design_documents(project_overview: str, api_documents: Dict[str, str], db_document: str,
+                          output_base_path: Path, output_settings: Optional[Dict[str, str]] = None) -> Tuple[bool, List[str]]:
+    """
+    生成された設計書一式を、カテゴリ別のサブディレクトリに分けて保存します。
+    "⚠️" で始まる (生成に失敗した) ドキュメントは保存しません。
+
+    Args:
+        project_overview (str): プロジェクト概要のMarkdown。
+        api_documents (Dict[str, str]): API識別子 -> API設計書のMarkdown。
+        db_document (str): データベース設計書のMarkdown。
+        output_base_path (Path): 保存先のベースディレクトリ。
+        output_settings (Optional[Dict[str, str]]): app_config.yaml の output_settings (サブディレクトリ名)。
+
+    Returns:
+        Tuple[bool, List[str]]: (1件以上保存できたか, エラーメッセージのリスト)。
+    """
+    output_settings = output_settings or {}
+    project_overview_dir_name = output_settings.get('project_overview_subdir', "project_overview")
+    api_specs_dir_name = output_settings.get('api_spec_subdir', "api_specifications")
+    db_design_dir_name = output_settings.get('db_design_subdir', "database_design")
+
+    save_errors = []
+    saved_any = False
+
+    # プロジェクト概要の保存
+    if project_overview:
+        success, error_msg = save_markdown_to_file(project_overview, output_base_path / project_overview_dir_name, "project_overview.md")
+        if success:
+            saved_any = True
+        else:
+            save_errors.append(f"项目概览保存失败: {error_msg}")
+
+    # API仕様書の保存
+    if isinstance(api_documents, dict):
+        api_docs_dir = output_base_path / api_specs_dir_name
+        for api_name, doc_content in api_documents.items():
+            if isinstance(doc_content, str) and not doc_content.startswith("⚠️"):
+                safe_filename = sanitize_filename(api_name) + ".md"
+                success, error_msg = save_markdown_to_file(doc_content, api_docs_dir, safe_filename)
+                if success:
+                    saved_any = True
+                else:
+                    save_errors.append(f"API规范 '{api_name}' 保存失败: {error_msg}")
+
+    # データベース設計書の保存
+    if db_document and isinstance(db_document, str) and not db_document.startswith("⚠️"):
+        success, error_msg = save_markdown_to_file(db_document, output_base_path / db_design_dir_name, "database_design.md")
+        if success:
+            saved_any = True
+        else:
+            save_errors.append(f"数据库设计文档保存失败: {error_msg}")
+
+    return saved_any, save_errors
+
+
+def load_saved_documents(output_base_path: Path, output_settings: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, str], str]:
+    """
+    save_design_documents で保存した設計書一式を読み込みます。
+    API識別子はファイル名 (sanitize_filename 済み) から復元するため、元の識別子と一致しない場合があります。
+
+    Args:
+        output_base_path (Path): 保存先のベースディレクトリ。
+        output_settings (Optional[Dict[str, str]]): app_config.yaml の output_settings (サブディレクトリ名)。
+
+    Returns:
+        Tuple[str, Dict[str, str], str]: (プロジェクト概要, API識別子 -> API設計書, データベース設計書)。
+    """
+    output_settings = output_settings or {}
+    base = Path(output_base_path)
+    overview_path = base / output_settings.get('project_overview_subdir', "project_overview") / "project_overview.md"
+    db_path = base / output_settings.get('db_design_subdir', "database_design") / "database_design.md"
+    api_dir = base / output_settings.get('api_spec_subdir', "api_specifications")
+
+    project_overview = overview_path.read_text(encoding="utf-8") if overview_path.is_file() else ""
+    db_document = db_path.read_text(encoding="utf-8") if db_path.is_file() else ""
+    api_documents = {}
+    if api_dir.is_dir():
+        for doc_path in sorted(api_dir.glob("*.md")):
+            api_documents[doc_path.stem] = doc_path.read_text(encoding="utf-8")
+    return project_overview, api_documents, db_document
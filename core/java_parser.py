@@ -0,0 +1,638 @@
+# このファイルは java_parser モジュールです。
+# LLMを使わずに、Javaソースから Spring の REST エンドポイントと JPA エンティティを正規表現ベースで抽出します。
+# 完全なJavaパーサーではありませんが、一般的な Spring Boot / JPA のコードであれば
+# ドライラン見積もりや図の生成に十分な精度で、高速かつ決定的に情報を取り出せます。
+
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .profiler import profiled
+from .source_loader import get_source_loader
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_OR_STRING = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|(//[^\n]*|/\*.*?\*/)', re.DOTALL)
+_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.MULTILINE)
+_TYPE_DECLARATION = re.compile(r"\b(class|interface|enum|record)\s+(\w+)")
+_MODIFIERS = re.compile(r"^(?:(?:public|protected|private|static|final|abstract|synchronized|transient|volatile|default)\s+)*")
+
+MAPPING_ANNOTATIONS = {
+    "GetMapping": "GET",
+    "PostMapping": "POST",
+    "PutMapping": "PUT",
+    "DeleteMapping": "DELETE",
+    "PatchMapping": "PATCH",
+    "RequestMapping": None, # method 属性から決定 (省略時は ANY)
+}
+PARAMETER_KINDS = {
+    "PathVariable": "path",
+    "RequestParam": "query",
+    "RequestBody": "body",
+    "RequestHeader": "header",
+}
+RELATION_ANNOTATIONS = ("OneToMany", "ManyToOne", "OneToOne", "ManyToMany")
+
+
+def strip_comments(source: str) -> str:
+    """
+    コメントを空白に置き換えます (文字列リテラル内の // などは保持します)。
+    """
+    return _COMMENT_OR_STRING.sub(lambda m: m.group(1) or ("\n" * m.group(2).count("\n")) or " ", source)
+
+
+def _matching_close(text: str, open_index: int, open_char: str, close_char: str) -> int:
+    """
+    text[open_index] の開き括弧に対応する閉じ括弧の位置を返します。見つからない場合は len(text)。
+    """
+    depth = 0
+    in_string: Optional[str] = None
+    i = open_index
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == in_string:
+                in_string = None
+        elif ch in ('"', "'"):
+            in_string = ch
+        elif ch == open_char:
+            depth += 1
+        elif ch == close_char:
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(text)
+
+
+def parse_leading_annotations(text: str) -> Tuple[Dict[str, str], str]:
+    """
+    文字列の先頭に並ぶアノテーションを解析します。
+
+    Returns:
+        Tuple[Dict[str, str], str]: (アノテーション名 -> 括弧内の引数文字列, アノテーションを除いた残りの文字列)
+    """
+    annotations: Dict[str, str] = {}
+    rest = text.lstrip()
+    while rest.startswith("@"):
+        match = re.match(r"@([\w.]+)\s*", rest)
+        if not match or match.group(1) == "interface":
+            break
+        name = match.group(1).split(".")[-1]
+        rest = rest[match.end():]
+        args = ""
+        if rest.startswith("("):
+            close = _matching_close(rest, 0, "(", ")")
+            args = rest[1:close].strip()
+            rest = rest[close + 1:]
+        annotations[name] = args
+        rest = rest.lstrip()
+    return annotations, rest
+
+
+def annotation_value(args: str, *keys: str) -> Optional[str]:
+    """
+    アノテーション引数から値を取り出します。
+    keys に一致する名前付き引数 (例: name = "users") を優先し、なければ先頭の位置引数の文字列リテラルを返します。
+    """
+    if not args:
+        return None
+    for key in keys:
+        match = re.search(rf'\b{key}\s*=\s*(\{{[^}}]*\}}|"(?:\\.|[^"\\])*"|[\w.]+)', args)
+        if match:
+            value = match.group(1)
+            literal = re.search(r'"((?:\\.|[^"\\])*)"', value)
+            return literal.group(1) if literal else value
+    positional = re.match(r'\s*\{?\s*"((?:\\.|[^"\\])*)"', args)
+    if positional:
+        return positional.group(1)
+    return None
+
+
+def _split_top_level(text: str, separator: str = ",") -> List[str]:
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch in "(<[{":
+            depth += 1
+        elif ch in ")>]}":
+            depth -= 1
+        if ch == separator and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def split_members(class_body: str) -> List[Dict[str, Any]]:
+    """
+    クラス本体 (外側の波括弧を除く) をトップレベルのメンバー単位に分割します。
+
+    Returns:
+        List[Dict[str, Any]]: {"header": 宣言部分, "body": ブロック本体 (フィールドの場合は None)}
+    """
+    members = []
+    i, start = 0, 0
+    while i < len(class_body):
+        ch = class_body[i]
+        if ch in ('"', "'"):
+            i = _skip_string(class_body, i)
+            continue
+        if ch == "(":
+            i = _matching_close(class_body, i, "(", ")") + 1
+            continue
+        if ch == ";":
+            header = class_body[start:i].strip()
+            if header:
+                members.append({"header": header, "body": None})
+            start = i + 1
+        elif ch == "{":
+            close = _matching_close(class_body, i, "{", "}")
+            header = class_body[start:i].strip()
+            if "=" in header and "(" not in header.split("=")[0]:
+                # 配列初期化子などのフィールド初期値 ("= { ... };") はフィールドの一部として扱う
+                i = close + 1
+                continue
+            members.append({"header": header, "body": class_body[i + 1:close]})
+            i = close + 1
+            start = i
+            continue
+        i += 1
+    return members
+
+
+def _skip_string(text: str, index: int) -> int:
+    quote = text[index]
+    i = index + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def parse_java_types(source: str) -> List[Dict[str, Any]]:
+    """
+    Javaソースからトップレベルの型宣言 (クラス・インターフェースなど) を抽出します。
+
+    Returns:
+        List[Dict[str, Any]]: {"name", "qualified_name", "kind", "annotations", "header", "members"}
+    """
+    code = strip_comments(source)
+    package_match = _PACKAGE.search(code)
+    package = package_match.group(1) if package_match else ""
+    types = []
+    search_from = 0
+    while True:
+        match = _TYPE_DECLARATION.search(code, search_from)
+        if not match:
+            break
+        open_brace = code.find("{", match.end())
+        if open_brace == -1:
+            break
+        close_brace = _matching_close(code, open_brace, "{", "}")
+        # 宣言の直前にあるアノテーション群を取り出す (直前の ; や } 以降)
+        prefix_start = max(code.rfind(";", 0, match.start()), code.rfind("}", 0, match.start())) + 1
+        annotations, _ = parse_leading_annotations(code[prefix_start:match.start()])
+        name = match.group(2)
+        types.append({
+            "name": name,
+            "qualified_name": f"{package}.{name}" if package else name,
+            "kind": match.group(1),
+            "annotations": annotations,
+            "header": code[match.start():open_brace].strip(),
+            "members": split_members(code[open_brace + 1:close_brace]),
+        })
+        search_from = close_brace + 1
+    return types
+
+
+def _parse_field(header: str) -> Optional[Dict[str, Any]]:
+    annotations, rest = parse_leading_annotations(header)
+    declaration = rest.split("=", 1)[0].strip()
+    if "(" in declaration or not declaration:
+        return None
+    declaration = _MODIFIERS.sub("", declaration)
+    if re.match(r"^(class|interface|enum|record)\b", declaration):
+        return None
+    match = re.match(r"^([\w.<>\[\],?\s]+?)\s+(\w+)$", declaration)
+    if not match:
+        return None
+    return {
+        "name": match.group(2),
+        "type": re.sub(r"\s+", "", match.group(1)),
+        "annotations": annotations,
+        "static": bool(re.search(r"\bstatic\b", rest.split("=", 1)[0])),
+    }
+
+
+def _parse_method(header: str) -> Optional[Dict[str, Any]]:
+    annotations, rest = parse_leading_annotations(header)
+    paren = rest.find("(")
+    if paren == -1:
+        return None
+    signature = _MODIFIERS.sub("", rest[:paren].strip())
+    signature = re.sub(r"^<[^>]*>\s*", "", signature) # ジェネリックメソッドの型パラメータ
+    match = re.match(r"^([\w.<>\[\],?\s]+?)\s+(\w+)$", signature)
+    if not match:
+        return None # コンストラクタなど
+    close = _matching_close(rest, paren, "(", ")")
+    parameters = []
+    for raw_param in _split_top_level(rest[paren + 1:close]):
+        param_annotations, param_rest = parse_leading_annotations(raw_param)
+        param_rest = re.sub(r"^final\s+", "", param_rest.strip())
+        param_match = re.match(r"^([\w.<>\[\],?\s]+?)\s+(\w+)$", param_rest)
+        if not param_match:
+            continue
+        kind = next((PARAMETER_KINDS[a] for a in param_annotations if a in PARAMETER_KINDS), None)
+        parameters.append({
+            "name": param_match.group(2),
+            "type": re.sub(r"\s+", "", param_match.group(1)),
+            "kind": kind,
+            "annotations": param_annotations,
+        })
+    return {
+        "name": match.group(2),
+        "return_type": re.sub(r"\s+", "", match.group(1)),
+        "annotations": annotations,
+        "parameters": parameters,
+    }
+
+
+def _join_paths(prefix: Optional[str], path: Optional[str]) -> str:
+    joined = "/".join(part.strip("/") for part in (prefix or "", path or "") if part and part.strip("/"))
+    return "/" + joined
+
+
+def extract_endpoints(java_type: Dict[str, Any], file_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """
+    @RestController / @Controller クラスからエンドポイントを抽出します。
+
+    Returns:
+        List[Dict[str, Any]]: {"http_method", "path", "controller_class", "controller_simple_name", "method_name",
+                               "parameters", "return_type", "file", "body"}
+    """
+    if not any(a in java_type["annotations"] for a in ("RestController", "Controller")):
+        return []
+    class_prefix = annotation_value(java_type["annotations"].get("RequestMapping", ""), "value", "path")
+    endpoints = []
+    for member in java_type["members"]:
+        if member["body"] is None:
+            continue
+        method = _parse_method(member["header"])
+        if not method:
+            continue
+        for annotation, http_method in MAPPING_ANNOTATIONS.items():
+            if annotation not in method["annotations"]:
+                continue
+            args = method["annotations"][annotation]
+            if http_method is None:
+                method_attr = re.search(r"RequestMethod\.(\w+)", args or "")
+                http_method = method_attr.group(1) if method_attr else "ANY"
+            endpoints.append({
+                "http_method": http_method,
+                "path": _join_paths(class_prefix, annotation_value(args, "value", "path")),
+                "controller_class": java_type["qualified_name"],
+                "controller_simple_name": java_type["name"],
+                "method_name": method["name"],
+                "parameters": method["parameters"],
+                "return_type": method["return_type"],
+                "file": str(file_path) if file_path else None,
+                "body": member["body"],
+            })
+            break
+    return endpoints
+
+
+def _target_entity_type(field_type: str) -> str:
+    generic = re.search(r"<([\w.]+)>$", field_type)
+    if generic:
+        return generic.group(1).split(".")[-1]
+    return field_type.split(".")[-1].rstrip("[]")
+
+
+def extract_entity(java_type: Dict[str, Any], file_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    @Entity クラスからエンティティ情報を抽出します。@Entity でない場合は None を返します。
+
+    Returns:
+        Optional[Dict[str, Any]]: {"class_name", "qualified_name", "table_name", "fields", "relations", "file"}
+            fields: [{"name", "type", "column", "primary_key", "annotations"}]
+            relations: [{"field", "kind", "target", "mapped_by", "join_column"}]
+    """
+    if "Entity" not in java_type["annotations"]:
+        return None
+    table_name = annotation_value(java_type["annotations"].get("Table", ""), "name") or java_type["name"]
+    fields, relations = [], []
+    for member in java_type["members"]:
+        if member["body"] is not None:
+            continue
+        field = _parse_field(member["header"])
+        if not field or field["static"] or "Transient" in field["annotations"]:
+            continue
+        annotations = field["annotations"]
+        relation_kind = next((a for a in RELATION_ANNOTATIONS if a in annotations), None)
+        join_column = annotation_value(annotations.get("JoinColumn", ""), "name")
+        if relation_kind:
+            relations.append({
+                "field": field["name"],
+                "kind": relation_kind,
+                "target": _target_entity_type(field["type"]),
+                "mapped_by": annotation_value(annotations.get(relation_kind, ""), "mappedBy"),
+                "join_column": join_column,
+            })
+            if not join_column or relation_kind in ("OneToMany", "ManyToMany"):
+                continue
+        fields.append({
+            "name": field["name"],
+            "type": field["type"],
+            "column": join_column or annotation_value(annotations.get("Column", ""), "name") or field["name"],
+            "primary_key": "Id" in annotations or "EmbeddedId" in annotations,
+            "foreign_key": bool(relation_kind),
+            "annotations": annotations,
+        })
+    return {
+        "class_name": java_type["name"],
+        "qualified_name": java_type["qualified_name"],
+        "table_name": table_name,
+        "fields": fields,
+        "relations": relations,
+        "file": str(file_path) if file_path else None,
+    }
+
+
+def type_fields(java_type: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    型の (static でない) フィールドを宣言順に返します。DTO やエンティティの構造の比較に使います。
+
+    Returns:
+        List[Dict[str, str]]: [{"name", "type"}]
+    """
+    fields = []
+    for member in java_type["members"]:
+        if member["body"] is not None:
+            continue
+        field = _parse_field(member["header"])
+        if field and not field["static"]:
+            fields.append({"name": field["name"], "type": field["type"]})
+    return fields
+
+
+def _simple_type_name(java_type: str) -> str:
+    return re.sub(r"<.*", "", java_type).split(".")[-1].rstrip("[]")
+
+
+def injected_dependencies(java_type: Dict[str, Any]) -> Dict[str, str]:
+    """
+    インスタンスフィールド (コンストラクタ・@Autowired による注入を想定) の フィールド名 -> 型の単純名 を返します。
+    """
+    dependencies = {}
+    for member in java_type["members"]:
+        if member["body"] is not None:
+            continue
+        field = _parse_field(member["header"])
+        if field and not field["static"]:
+            dependencies[field["name"]] = _simple_type_name(field["type"])
+    return dependencies
+
+
+def supertypes(java_type: Dict[str, Any]) -> List[str]:
+    """
+    extends / implements に書かれた型の単純名のリストを返します。
+    """
+    match = re.search(r"\b(?:extends|implements)\b(.*)$", java_type["header"], re.DOTALL)
+    if not match:
+        return []
+    names = re.split(r"\b(?:extends|implements)\b|,", re.sub(r"<[^<>]*(<[^<>]*>[^<>]*)*>", "", match.group(1)))
+    return [name.strip().split(".")[-1] for name in names if name.strip()]
+
+
+def component_role(java_type: Dict[str, Any]) -> str:
+    """
+    Spring のステレオタイプから、型の役割 ("controller" / "service" / "repository" / "component") を判定します。
+    """
+    annotations = java_type["annotations"]
+    if "RestController" in annotations or "Controller" in annotations:
+        return "controller"
+    if "Repository" in annotations or java_type["name"].endswith("Repository") or any(
+            name.endswith("Repository") for name in supertypes(java_type)):
+        return "repository"
+    if "Service" in annotations or java_type["name"].endswith(("Service", "ServiceImpl")):
+        return "service"
+    return "component"
+
+
+_CALL = re.compile(r"(?<![\w.])(?:this\s*\.\s*)?(\w+)\s*\.\s*(\w+)\s*\(")
+
+
+def extract_calls(body: str, dependencies: Dict[str, str]) -> List[Dict[str, str]]:
+    """
+    メソッド本体から、注入されたフィールドに対するメソッド呼び出しを出現順に返します。
+
+    Returns:
+        List[Dict[str, str]]: [{"field", "type", "method"}]。連続する同じ呼び出しは1つにまとめます。
+    """
+    calls = []
+    for match in _CALL.finditer(body or ""):
+        field, method = match.group(1), match.group(2)
+        if field not in dependencies:
+            continue
+        call = {"field": field, "type": dependencies[field], "method": method}
+        if not calls or calls[-1] != call:
+            calls.append(call)
+    return calls
+
+
+def _find_method_body(java_type: Dict[str, Any], method_name: str) -> Optional[str]:
+    for member in java_type["members"]:
+        if member["body"] is None:
+            continue
+        method = _parse_method(member["header"])
+        if method and method["name"] == method_name:
+            return member["body"]
+    return None
+
+
+def _implementation_of(types: Dict[str, Dict[str, Any]], type_name: str) -> Optional[Dict[str, Any]]:
+    """
+    型の単純名から、メソッド本体を持つ実装クラスを返します。インターフェースの場合は実装クラスを探します。
+    """
+    java_type = types.get(type_name)
+    if java_type and java_type["kind"] != "interface":
+        return java_type
+    return next((t for t in types.values() if t["kind"] == "class" and type_name in supertypes(t)), None)
+
+
+@profiled("call_tree")
+def build_call_tree(types: Dict[str, Dict[str, Any]], class_name: str, body: str,
+                    max_depth: int = 3, max_calls: int = 40) -> List[Dict[str, Any]]:
+    """
+    メソッド本体から、注入された依存先 (サービス・リポジトリなど) への呼び出しを再帰的にたどった呼び出し木を返します。
+    呼び出し先がインターフェースの場合は実装クラスの本体をたどります (Spring Data のリポジトリのように
+    実装がない場合はそこで止まります)。
+
+    Args:
+        types (Dict[str, Dict[str, Any]]): discover_codebase の "types"。
+        class_name (str): 呼び出し元の型の単純名。
+        body (str): 呼び出し元のメソッド本体。
+        max_depth (int): たどる深さの上限。
+        max_calls (int): 木全体に含める呼び出し数の上限。
+
+    Returns:
+        List[Dict[str, Any]]: [{"caller", "callee", "method", "role", "calls": [...]}]
+    """
+    budget = [max_calls]
+
+    def walk(caller: str, method_body: str, depth: int, stack: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        caller_type = _implementation_of(types, caller) or types.get(caller)
+        if caller_type is None or depth > max_depth:
+            return []
+        nodes = []
+        for call in extract_calls(method_body, injected_dependencies(caller_type)):
+            if budget[0] <= 0:
+                break
+            callee_decl = types.get(call["type"])
+            if callee_decl is None:
+                continue # ライブラリのクラスなど、コードベース外の呼び出しは省略する
+            budget[0] -= 1
+            key = f"{call['type']}.{call['method']}"
+            implementation = _implementation_of(types, call["type"])
+            callee_body = _find_method_body(implementation, call["method"]) if implementation else None
+            nodes.append({
+                "caller": caller,
+                "callee": call["type"],
+                "method": call["method"],
+                "role": component_role(callee_decl),
+                "calls": walk(call["type"], callee_body, depth + 1, stack + (key,))
+                         if callee_body and key not in stack else [],
+            })
+        return nodes
+
+    return walk(class_name, body, 1, ())
+
+
+def _codebase_types_in(type_text: str, types: Dict[str, Dict[str, Any]]) -> Set[str]:
+    # 型の表記 (ジェネリクスの型引数を含む) に現れる、コードベース内の型の単純名
+    return {name.split(".")[-1] for name in re.findall(r"[A-Za-z_][\w.]*", type_text or "")} & set(types)
+
+
+def endpoint_dependencies(endpoint: Dict[str, Any], types: Dict[str, Dict[str, Any]]) -> Dict[str, Set[str]]:
+    """
+    エンドポイントの設計書の内容に関わる、コードベース内のクラスの単純名を返します。
+
+    Returns:
+        Dict[str, Set[str]]: {"signature": パラメータ・戻り値の型と、そのフィールドの型 (再帰的にたどる。DTO・エンティティ),
+                              "calls": コントローラ (と上位型) と、呼び出し木でたどれるサービス・リポジトリ
+                                       (インターフェースと実装クラス)}
+    """
+    pending = set()
+    for text in [p["type"] for p in endpoint["parameters"]] + [endpoint["return_type"]]:
+        pending |= _codebase_types_in(text, types)
+    signature: Set[str] = set()
+    while pending:
+        name = pending.pop()
+        if name in signature:
+            continue
+        signature.add(name)
+        for field in type_fields(types[name]):
+            pending |= _codebase_types_in(field["type"], types) - signature
+
+    controller = endpoint["controller_simple_name"]
+    calls = {controller}
+    if controller in types:
+        calls |= set(supertypes(types[controller])) & set(types)
+
+    def collect(nodes: List[Dict[str, Any]]) -> None:
+        for node in nodes:
+            calls.add(node["callee"])
+            implementation = _implementation_of(types, node["callee"])
+            if implementation:
+                calls.add(implementation["name"])
+            collect(node["calls"])
+
+    # 設計書の図より深い呼び出しの変更も影響ありとするため、上限を広げてたどる
+    collect(build_call_tree(types, controller, endpoint["body"], max_depth=8, max_calls=500))
+    return {"signature": signature, "calls": calls}
+
+
+@profiled("source_parsing")
+def discover_codebase(java_files: List[Path]) -> Dict[str, Any]:
+    """
+    Javaファイル群からエンドポイントとエンティティをローカルで抽出します。
+    読み込みや解析に失敗したファイルはスキップし、件数を "errors" に記録します。
+
+    Returns:
+        Dict[str, Any]: {"endpoints": [...], "entities": [...], "types": {単純名: 型情報}, "errors": int}
+    """
+    endpoints, entities, types = [], [], {}
+    errors = 0
+    # 読み込みは共有ローダーで並列に行い、解析は順番に行う
+    for file_path, loaded in zip(java_files, get_source_loader().read_many(java_files)):
+        try:
+            if loaded["error"]:
+                raise OSError(loaded["error"])
+            for java_type in parse_java_types(loaded["text"]):
+                java_type["file"] = str(file_path)
+                types.setdefault(java_type["name"], java_type)
+                endpoints.extend(extract_endpoints(java_type, file_path))
+                entity = extract_entity(java_type, file_path)
+                if entity:
+                    entities.append(entity)
+        except Exception as e:
+            errors += 1
+            logger.warning(f"Javaファイルの解析に失敗しました ({file_path}): {e}")
+    return {"endpoints": endpoints, "entities": entities, "types": types, "errors": errors}
+
+
+def _parameter_text(parameters: List[Dict[str, Any]], kind: str) -> str:
+    matched = [f"{p['name']} ({p['type']})" for p in parameters if p["kind"] == kind]
+    return ", ".join(matched) if matched else "なし"
+
+
+def format_local_analysis_report(endpoints: List[Dict[str, Any]], entities: List[Dict[str, Any]]) -> str:
+    """
+    ローカルで抽出したエンドポイントとエンティティを、CodebaseAnalyzerAgent の出力と同じ形式
+    (API_LIST_START / DB_ENTITY_LIST_START ブロック) のレポートに整形します。
+    """
+    lines = ["== APIエンドポイント分析結果 ==", "API_LIST_START"]
+    for i, endpoint in enumerate(endpoints, start=1):
+        param_sig = ", ".join(f"{p['type']} {p['name']}" for p in endpoint["parameters"])
+        lines.extend([
+            f"### API {i}:",
+            f"- HTTPメソッド: {endpoint['http_method']}",
+            f"- パス: {endpoint['path']}",
+            f"- コントローラクラス: {endpoint['controller_class']}",
+            f"- コントローラメソッド: {endpoint['method_name']}({param_sig})",
+            f"- パス変数: {_parameter_text(endpoint['parameters'], 'path')}",
+            f"- クエリパラメータ: {_parameter_text(endpoint['parameters'], 'query')}",
+            f"- リクエストボディ: {_parameter_text(endpoint['parameters'], 'body')}",
+            f"- レスポンスタイプ: {endpoint['return_type']}",
+            "",
+        ])
+    lines.extend(["API_LIST_END", "", "== データベースエンティティ分析結果 ==", "DB_ENTITY_LIST_START"])
+    for i, entity in enumerate(entities, start=1):
+        lines.extend([
+            f"### エンティティ {i}: {entity['class_name']}",
+            f"- クラス名: {entity['qualified_name']}",
+            f"- テーブル名: {entity['table_name']}",
+            "- フィールド:",
+        ])
+        for field in entity["fields"]:
+            annotation_text = ", ".join(f"@{name}({args})" if args else f"@{name}" for name, args in field["annotations"].items())
+            lines.append(f"    - {field['name']}: {field['type']}" + (f" ({annotation_text})" if annotation_text else ""))
+        if entity["relations"]:
+            lines.append("- 関連:")
+            for relation in entity["relations"]:
+                lines.append(f"    - {relation['field']}: {relation['target']} (@{relation['kind']})")
+        lines.append("")
+    lines.append("DB_ENTITY_LIST_END")
+    return "\n".join(lines)
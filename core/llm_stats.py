@@ -0,0 +1,185 @@
+# このファイルは llm_stats モジュールです。
+# LLM呼び出しごとのトークン数・所要時間をプロセス内に記録し、集計します。
+# 記録された実測値は、ドライラン見積もり (core.estimator) の「トークンあたりの処理時間」などに使われます。
+# 記録はプロセス全体で共有されるため、1回の実行の使用量は usage_scope で付けたスコープIDで絞り込みます
+# (同時に実行される他のセッションやウォッチモードの呼び出しを含めないため)。
+
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .model_router import responding_model
+
+MAX_RECORDS = 5000
+
+_RECORDS = deque(maxlen=MAX_RECORDS)
+_RECORDS_LOCK = threading.Lock()
+_SCOPE = threading.local()
+# 有効なスコープごとの記録 (プロセス全体の記録が MAX_RECORDS を超えて古いものが捨てられても、実行中の記録は失わない)
+_SCOPE_RECORDS: Dict[str, List[Dict[str, Any]]] = {}
+
+
+@contextmanager
+def usage_scope(scope_id: Optional[str] = None) -> Iterator[str]:
+    """
+    このスレッドで記録される呼び出しに付けるスコープIDを設定します。scope_id を省略すると新しいIDを作成します。
+    ワーカースレッドでは、呼び出し元のスコープID (current_usage_scope) を渡して同じスコープに記録します。
+    """
+    previous = getattr(_SCOPE, "scope_id", None)
+    owner = scope_id is None
+    _SCOPE.scope_id = scope_id or uuid.uuid4().hex
+    if owner:
+        with _RECORDS_LOCK:
+            _SCOPE_RECORDS[_SCOPE.scope_id] = []
+    try:
+        yield _SCOPE.scope_id
+    finally:
+        if owner:
+            with _RECORDS_LOCK:
+                _SCOPE_RECORDS.pop(_SCOPE.scope_id, None)
+        _SCOPE.scope_id = previous
+
+
+def current_usage_scope() -> Optional[str]:
+    return getattr(_SCOPE, "scope_id", None)
+
+
+def record_call(stage: str, model: Optional[str], prompt_tokens: int, completion_tokens: int,
+                seconds: float, cached_tokens: int = 0, **extra: Any) -> Dict[str, Any]:
+    """
+    LLM呼び出し1回分の実測値を記録します。
+
+    Args:
+        stage (str): パイプラインの段階 (例: "codebase_analyzer", "api_design", "db_design")。
+        model (Optional[str]): 応答したモデル名。
+        prompt_tokens (int): 入力トークン数。
+        completion_tokens (int): 出力トークン数。
+        seconds (float): 呼び出しにかかった時間 (秒)。
+        cached_tokens (int): 入力のうちプロバイダ側でキャッシュされたトークン数。
+        **extra: 記録に含めるその他の情報。
+
+    Returns:
+        Dict[str, Any]: 記録された内容。
+    """
+    record = {
+        "timestamp": time.time(),
+        "stage": stage,
+        "model": model,
+        "prompt_tokens": int(prompt_tokens or 0),
+        "completion_tokens": int(completion_tokens or 0),
+        "cached_tokens": int(cached_tokens or 0),
+        "seconds": float(seconds),
+        "scope": current_usage_scope(),
+    }
+    record.update(extra)
+    with _RECORDS_LOCK:
+        _RECORDS.append(record)
+        if record["scope"] in _SCOPE_RECORDS:
+            _SCOPE_RECORDS[record["scope"]].append(record)
+    return record
+
+
+def get_records(since: Optional[float] = None, scope: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    記録を古い順に返します。since (time.time() の値) を指定すると、それ以降の記録だけを返します。
+    scope を指定すると、そのスコープ (usage_scope) で記録されたものだけを返します。
+    """
+    with _RECORDS_LOCK:
+        records = list(_SCOPE_RECORDS[scope] if scope in _SCOPE_RECORDS else _RECORDS)
+    if since is not None:
+        records = [r for r in records if r["timestamp"] >= since]
+    if scope is not None:
+        records = [r for r in records if r.get("scope") == scope]
+    return records
+
+
+def summarize(records: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    記録を段階ごとに集計します。
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 段階 -> {calls, prompt_tokens, completion_tokens, cached_tokens, seconds}。
+                                   キー "total" に全体の合計を含みます。
+    """
+    records = get_records() if records is None else records
+    summary: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        for key in (record["stage"], "total"):
+            bucket = summary.setdefault(key, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                              "cached_tokens": 0, "seconds": 0.0})
+            bucket["calls"] += 1
+            bucket["prompt_tokens"] += record["prompt_tokens"]
+            bucket["completion_tokens"] += record["completion_tokens"]
+            bucket["cached_tokens"] += record["cached_tokens"]
+            bucket["seconds"] += record["seconds"]
+    return summary
+
+
+def observed_seconds_per_output_token(model: Optional[str] = None, min_samples: int = 3) -> Optional[float]:
+    """
+    記録から「出力1トークンあたりの所要時間 (秒)」の実測値を返します。
+    呼び出しごとの固定的な待ち時間も含んだ値です。サンプルが min_samples 未満の場合は None を返します。
+    model を指定すると、応答したモデル名の日付の接尾辞を除いて model と一致する記録だけを使います
+    ("gpt-4o" に "gpt-4o-mini" の記録を混ぜないため)。
+    """
+    samples = [r for r in get_records()
+               if r["completion_tokens"] > 0 and (model is None or responding_model(r["model"], [model]) == model)]
+    if len(samples) < min_samples:
+        return None
+    return sum(r["seconds"] for r in samples) / sum(r["completion_tokens"] for r in samples)
+
+
+def observed_average_completion_tokens(stage: str, min_samples: int = 3) -> Optional[float]:
+    """
+    指定した段階の、1呼び出しあたりの平均出力トークン数の実測値を返します。サンプル不足の場合は None。
+    """
+    samples = [r["completion_tokens"] for r in get_records() if r["stage"] == stage and r["completion_tokens"] > 0]
+    if len(samples) < min_samples:
+        return None
+    return sum(samples) / len(samples)
+
+
+def cache_hit_rate(bucket: Dict[str, Any]) -> float:
+    """
+    集計 (summarize の1段階分) の入力トークンのうち、プロバイダ側でキャッシュされた割合を返します。
+    """
+    return bucket["cached_tokens"] / bucket["prompt_tokens"] if bucket["prompt_tokens"] else 0.0
+
+
+def format_cache_summary(summary: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """
+    入力トークンのうちプロバイダ側のプレフィックスキャッシュから読み込まれた量を、1行のログ用メッセージにします。
+    入力トークンの記録がない場合は None を返します。
+    """
+    total = summary.get("total")
+    if not total or not total["prompt_tokens"]:
+        return None
+    stages = [
+        f"{stage} {cache_hit_rate(bucket):.0%}"
+        for stage, bucket in summary.items() if stage != "total" and bucket["prompt_tokens"]
+    ]
+    return (f"入力 {total['prompt_tokens']:,} トークンのうち {total['cached_tokens']:,} トークン "
+            f"({cache_hit_rate(total):.0%}) がプロンプトキャッシュから読み込まれました (段階別: {', '.join(stages)})")
+
+
+def format_usage_markdown(summary: Dict[str, Dict[str, Any]]) -> str:
+    """
+    段階ごとの呼び出し数・トークン数 (うちキャッシュ分)・所要時間を Markdown の表に整形します。
+    """
+    lines = [
+        "| 段階 | 呼び出し数 | 入力トークン | うちキャッシュ | 出力トークン | 所要時間 |",
+        "|------|-----------:|-------------:|---------------:|-------------:|---------:|",
+    ]
+    stages = [stage for stage in summary if stage != "total"] + (["total"] if "total" in summary else [])
+    for stage in stages:
+        bucket = summary[stage]
+        name = "**合計**" if stage == "total" else stage
+        lines.append(
+            f"| {name} | {bucket['calls']:,} | {bucket['prompt_tokens']:,} | "
+            f"{bucket['cached_tokens']:,} ({cache_hit_rate(bucket):.0%}) | {bucket['completion_tokens']:,} | "
+            f"{bucket['seconds']:.1f}秒 |"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,247 @@
+# このファイルは local_diagrams モジュールです。
+# core.java_parser がローカルで抽出した情報から、LLMを使わずに決定的な Mermaid 図を組み立てます。
+# 生成される図は core.mermaid_validator の検証を必ず通る形式で出力されます。
+
+import re
+from typing import Any, Dict, List, Optional
+
+from .java_parser import build_call_tree
+from .mermaid_validator import extract_mermaid_blocks
+
+ER_DIAGRAM_PLACEHOLDER = "<!-- ER_DIAGRAM -->"
+SEQUENCE_DIAGRAM_PLACEHOLDER = "<!-- SEQUENCE_DIAGRAM -->"
+
+DEFAULT_DIAGRAM_SETTINGS = {
+    "local_er_diagram": True,
+    "local_sequence_diagram": True,
+    "max_call_depth": 3,
+    "max_calls": 40,
+}
+
+# JPA の関連アノテーション -> Mermaid のカーディナリティ (左が所有側)
+# ManyToOne は「相手が1、自分が多」なので、相手を左に置いて ||--o{ で表す
+_ER_CARDINALITIES = {
+    "OneToMany": "||--o{",
+    "OneToOne": "||--o|",
+    "ManyToMany": "}o--o{",
+}
+
+
+def diagram_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_DIAGRAM_SETTINGS)
+    settings.update(app_config.get('diagram_settings', {}) or {})
+    return settings
+
+
+def er_entity_name(entity: Dict[str, Any]) -> str:
+    """
+    ER図で使うエンティティ名 (テーブル名を Mermaid の識別子として使える形にしたもの) を返します。
+    """
+    return re.sub(r"[^\w\-]", "_", entity["table_name"] or entity["class_name"])
+
+
+def _er_attribute_type(java_type: str) -> str:
+    # List<String> や Map<K, V> などのジェネリクスは外側の型名だけを使う
+    return re.sub(r"[^\w\[\]]", "_", _simple_name(java_type)) or "Object"
+
+
+def _simple_name(java_type: str) -> str:
+    return re.sub(r"<.*", "", java_type).split(".")[-1]
+
+
+def _primary_key_type(entity: Dict[str, Any]) -> Optional[str]:
+    return next((field["type"] for field in entity["fields"] if field["primary_key"]), None)
+
+
+def build_er_diagram(entities: List[Dict[str, Any]], include_external: bool = False) -> str:
+    """
+    エンティティ情報から Mermaid の erDiagram を組み立てます。
+
+    双方向の関連 (mappedBy を持つ側と所有側) は1本の線にまとめます。
+
+    Args:
+        entities (List[Dict[str, Any]]): core.java_parser.extract_entity の結果のリスト。
+        include_external (bool): 渡されたエンティティ以外を参照する関連も線として出力するかどうか。
+                                 参照先は関連の線からのみ定義されます (属性は出力しません)。
+
+    Returns:
+        str: erDiagram のコード (```mermaid の囲みは含みません)。
+    """
+    by_class = {entity["class_name"]: entity for entity in entities}
+    lines = ["erDiagram"]
+    for entity in entities:
+        lines.append(f"    {er_entity_name(entity)} {{")
+        for field in entity["fields"]:
+            keys = [key for key, flag in (("PK", field["primary_key"]), ("FK", field.get("foreign_key"))) if flag]
+            column = re.sub(r"[^\w]", "_", field["column"])
+            field_type = field["type"]
+            if field.get("foreign_key") and _simple_name(field_type) in by_class:
+                # 外部キーの型は、参照先エンティティの主キーの型で表す
+                field_type = _primary_key_type(by_class[_simple_name(field_type)]) or field_type
+            attribute = f"        {_er_attribute_type(field_type)} {column}"
+            lines.append(attribute + (f" {','.join(keys)}" if keys else ""))
+        lines.append("    }")
+
+    seen = set()
+    for entity in entities:
+        for relation in entity["relations"]:
+            target = by_class.get(relation["target"])
+            if target is None:
+                if not include_external:
+                    continue
+                target_name = re.sub(r"[^\w\-]", "_", relation["target"])
+            else:
+                target_name = er_entity_name(target)
+            source_name = er_entity_name(entity)
+            kind = relation["kind"]
+            if kind == "ManyToOne":
+                left, right, cardinality = target_name, source_name, _ER_CARDINALITIES["OneToMany"]
+            else:
+                left, right, cardinality = source_name, target_name, _ER_CARDINALITIES[kind]
+            # 双方向の関連は、どちらの側から見ても同じキーになるようにして重複を除く
+            pair_key = (left, right) if kind in ("ManyToOne", "OneToMany") else tuple(sorted((left, right)))
+            if (pair_key, cardinality) in seen:
+                continue
+            seen.add((pair_key, cardinality))
+            lines.append(f'    {left} {cardinality} {right} : "{relation["field"]}"')
+    return "\n".join(lines)
+
+
+def mermaid_block(code: str) -> str:
+    """
+    Mermaid のコードを Markdown のコードブロックで囲みます。
+    """
+    return f"```mermaid\n{code}\n```"
+
+
+
+def _normalize_api_path(path: str) -> str:
+    # パス変数の名前の違い ({id} と {userId} など) と末尾のスラッシュは区別しない
+    return re.sub(r"\{[^}]*\}", "{}", path.strip()).rstrip("/") or "/"
+
+
+def match_local_endpoint(identifier: str, endpoints: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    API識別子 (例: "GET /api/users/{id}") に対応する、ローカルで抽出したエンドポイントを返します。
+    """
+    match = re.match(r"^\s*([A-Za-z]+)\s+(\S+)", identifier or "")
+    if not match:
+        return None
+    http_method, path = match.group(1).upper(), _normalize_api_path(match.group(2))
+    for endpoint in endpoints:
+        if _normalize_api_path(endpoint["path"]) == path and endpoint["http_method"] in (http_method, "ANY"):
+            return endpoint
+    return None
+
+
+def build_sequence_diagram(endpoint: Dict[str, Any], types: Dict[str, Dict[str, Any]],
+                           max_depth: int = 3, max_calls: int = 40) -> str:
+    """
+    エンドポイントのメソッド本体から、コントローラ→サービス→リポジトリの呼び出しをたどった
+    Mermaid の sequenceDiagram (処理の骨格) を組み立てます。
+    条件分岐やループは表現せず、呼び出しの順序と戻りだけを示します。
+
+    Args:
+        endpoint (Dict[str, Any]): core.java_parser.extract_endpoints の結果の1件。
+        types (Dict[str, Dict[str, Any]]): core.java_parser.discover_codebase の "types"。
+
+    Returns:
+        str: sequenceDiagram のコード (```mermaid の囲みは含みません)。
+    """
+    controller = endpoint["controller_simple_name"]
+    tree = build_call_tree(types, controller, endpoint["body"], max_depth=max_depth, max_calls=max_calls)
+
+    participants = [controller]
+    uses_database = False
+
+    def collect(nodes: List[Dict[str, Any]]) -> None:
+        nonlocal uses_database
+        for node in nodes:
+            if node["callee"] not in participants:
+                participants.append(node["callee"])
+            if node["role"] == "repository" and not node["calls"]:
+                uses_database = True
+            collect(node["calls"])
+
+    collect(tree)
+
+    lines = ["sequenceDiagram", "    participant Client as クライアント"]
+    lines += [f"    participant {name}" for name in participants]
+    if uses_database:
+        lines.append("    participant DB as データベース")
+
+    lines.append(f"    Client->>{controller}: {endpoint['http_method']} {endpoint['path']}")
+
+    def emit(nodes: List[Dict[str, Any]]) -> None:
+        for node in nodes:
+            lines.append(f"    {node['caller']}->>{node['callee']}: {node['method']}()")
+            if node["calls"]:
+                emit(node["calls"])
+            elif node["role"] == "repository":
+                lines.append(f"    {node['callee']}->>DB: クエリ実行")
+                lines.append(f"    DB-->>{node['callee']}: 結果")
+            lines.append(f"    {node['callee']}-->>{node['caller']}: {node['method']} の結果")
+
+    emit(tree)
+    lines.append(f"    {controller}-->>Client: レスポンス ({_sequence_text(endpoint['return_type'])})")
+    return "\n".join(lines)
+
+
+def _sequence_text(text: str) -> str:
+    # シーケンス図のメッセージでは ; と # が特別な意味を持ち、< > はHTMLタグとして解釈されるため置き換える
+    return re.sub(r"[;#]", " ", text or "").replace("<", "＜").replace(">", "＞")
+
+
+def inject_diagram(document: str, diagram_code: str, diagram_type: str, placeholder: str,
+                   heading_keyword: str, fallback_heading: str) -> str:
+    """
+    ローカルで組み立てた図を設計書に差し込みます。
+
+    LLMが指示に反して同じ種類の図を書いていた場合はそれを取り除き、
+    プレースホルダーがあればその位置に、なければ heading_keyword を含む見出しの直後に、
+    それもなければ末尾に fallback_heading の見出しを付けて追加します。
+
+    Args:
+        document (str): 設計書。
+        diagram_code (str): 図のコード (```mermaid の囲みなし)。
+        diagram_type (str): 取り除く図の種類 (例: "erDiagram", "sequenceDiagram")。
+        placeholder (str): 差し込み位置を示すプレースホルダー。
+        heading_keyword (str): 差し込み先の見出しに含まれる文字列。
+        fallback_heading (str): 差し込み先が見つからない場合に追加する見出し行。
+    """
+    for block in reversed(extract_mermaid_blocks(document)):
+        if block["code"].lstrip().startswith(diagram_type):
+            document = document[:block["start"]] + document[block["end"]:]
+
+    block_markdown = mermaid_block(diagram_code)
+    if placeholder in document:
+        return document.replace(placeholder, block_markdown, 1)
+
+    heading = re.search(rf"^#+[^\n]*{re.escape(heading_keyword)}[^\n]*$", document, re.MULTILINE)
+    if heading:
+        return f"{document[:heading.end()]}\n\n{block_markdown}\n{document[heading.end():]}"
+    return f"{document.rstrip()}\n\n{fallback_heading}\n\n{block_markdown}\n"
+
+
+def sequence_diagram_for(app_config: Dict[str, Any], identifier: str, discovery: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    API識別子に対応するシーケンス図をローカルで組み立てます。
+    diagram_settings.local_sequence_diagram が無効な場合や、対応するエンドポイントが見つからない場合は None を返します。
+    """
+    settings = diagram_settings(app_config)
+    if not discovery or not settings["local_sequence_diagram"]:
+        return None
+    endpoint = match_local_endpoint(identifier, discovery["endpoints"])
+    if endpoint is None:
+        return None
+    return build_sequence_diagram(endpoint, discovery["types"], int(settings["max_call_depth"]), int(settings["max_calls"]))
+
+
+def er_diagram_for(app_config: Dict[str, Any], discovery: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    ローカルで抽出したエンティティからER図を組み立てます。
+    diagram_settings.local_er_diagram が無効な場合やエンティティがない場合は None を返します。
+    """
+    if not discovery or not discovery["entities"] or not diagram_settings(app_config)["local_er_diagram"]:
+        return None
+    return build_er_diagram(discovery["entities"])
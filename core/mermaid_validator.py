@@ -0,0 +1,240 @@
+# このファイルは mermaid_validator モジュールです。
+# 生成された設計書 (Markdown) に含まれる Mermaid 図と、テンプレートの必須セクションをローカルで検証します。
+# ブラウザで描画するまで分からなかった構文エラーを生成直後に検出し、壊れたブロックだけを修正に回すために使います。
+# Mermaid の完全な文法ではなく、sequenceDiagram / erDiagram / stateDiagram で LLM がよく崩す部分を検査します。
+
+import re
+from typing import Any, Dict, List, Optional
+
+from .profiler import profiled
+
+MERMAID_BLOCK_PATTERN = re.compile(r"```mermaid[ \t]*\n(.*?)\n?```", re.DOTALL)
+
+# --- sequenceDiagram ---
+_SEQ_ARROW = r"(?:-->>|->>|-->|->|--x|-x|--\)|-\))"
+_SEQ_MESSAGE = re.compile(rf"^[^\s:][^:]*?\s*{_SEQ_ARROW}\s*[+-]?\s*[^\s:][^:]*?\s*:.*$")
+_SEQ_PARTICIPANT = re.compile(r"^(participant|actor)\s+\S.*$")
+_SEQ_NOTE = re.compile(r"^note\s+(left of|right of|over)\s+[^:]+:.*$", re.IGNORECASE)
+_SEQ_SIMPLE = re.compile(r"^(autonumber|activate\s+\S.*|deactivate\s+\S.*|title\s*:?.*|create\s+(participant|actor)\s+\S.*|destroy\s+\S.*|links?\s+\S.*)$")
+_SEQ_BLOCK_OPENERS = ("alt", "opt", "loop", "par", "critical", "break", "rect", "box")
+_SEQ_BLOCK_CONTINUATIONS = {"else": ("alt",), "and": ("par",), "option": ("critical",)}
+
+# --- erDiagram ---
+_ER_ENTITY_OPEN = re.compile(r'^("[^"]+"|[\w\-]+)(\s*\[[^\]]*\])?\s*\{$')
+_ER_ATTRIBUTE = re.compile(r'^[\w\-\[\]\(\),]+\s+[\w\-\[\]\(\)]+(\s+(PK|FK|UK)(\s*,\s*(PK|FK|UK))*)?(\s+"[^"]*")?$')
+_ER_CARDINALITY_LEFT = r"(?:\|o|\|\||\}o|\}\|)"
+_ER_CARDINALITY_RIGHT = r"(?:o\||\|\||o\{|\|\{)"
+_ER_RELATIONSHIP = re.compile(
+    rf'^("[^"]+"|[\w\-]+)\s*{_ER_CARDINALITY_LEFT}(--|\.\.){_ER_CARDINALITY_RIGHT}\s*("[^"]+"|[\w\-]+)\s*:\s*("[^"]*"|\S.*)$'
+)
+
+# --- stateDiagram ---
+_STATE_ID = r'(?:\[\*\]|[\w\-\.]+)'
+_STATE_TRANSITION = re.compile(rf"^{_STATE_ID}\s*-->\s*{_STATE_ID}(\s*:.*)?$")
+_STATE_DESCRIPTION = re.compile(r"^[\w\-\.]+\s*:\s*\S.*$")
+_STATE_DECL = re.compile(r'^state\s+("[^"]*"\s+as\s+[\w\-\.]+|[\w\-\.]+)(\s*<<(fork|join|choice)>>)?(\s*\{)?$')
+_STATE_NOTE_SINGLE = re.compile(r"^note\s+(left|right)\s+of\s+[\w\-\.]+\s*:.*$")
+_STATE_NOTE_OPEN = re.compile(r"^note\s+(left|right)\s+of\s+[\w\-\.]+$")
+_STATE_SIMPLE = re.compile(r"^(direction\s+(TB|TD|BT|LR|RL)|--|classDef\s+.*|class\s+.*|hide empty description)$")
+
+
+def extract_mermaid_blocks(markdown_text: str) -> List[Dict[str, Any]]:
+    """
+    Markdownから ```mermaid コードブロックを抽出します。
+
+    Returns:
+        List[Dict[str, Any]]: 各ブロックの {"code", "start", "end"}。start/end はコードフェンスを含む範囲の文字位置です。
+    """
+    return [
+        {"code": match.group(1), "start": match.start(), "end": match.end()}
+        for match in MERMAID_BLOCK_PATTERN.finditer(markdown_text or "")
+    ]
+
+
+@profiled("mermaid_splitting")
+def split_mermaid_parts(markdown_text: str) -> List[Dict[str, str]]:
+    """
+    Markdownを、描画のために Mermaid ブロックとそれ以外の部分に元の順序のまま分割します。
+
+    Returns:
+        List[Dict[str, str]]: {"type": "markdown", "text"} または {"type": "mermaid", "code"} のリスト。
+    """
+    parts, position = [], 0
+    for block in extract_mermaid_blocks(markdown_text):
+        if block["start"] > position:
+            parts.append({"type": "markdown", "text": markdown_text[position:block["start"]]})
+        parts.append({"type": "mermaid", "code": block["code"].strip()})
+        position = block["end"]
+    if markdown_text and position < len(markdown_text):
+        parts.append({"type": "markdown", "text": markdown_text[position:]})
+    return parts
+
+
+def _content_lines(code: str) -> List[tuple]:
+    """コメント (%%) と空行を除いた (行番号, 行) のリストを返します。"""
+    lines = []
+    for line_no, raw_line in enumerate(code.splitlines(), start=1):
+        line = raw_line.strip()
+        if not line or line.startswith("%%"):
+            continue
+        lines.append((line_no, line))
+    return lines
+
+
+def _validate_sequence(lines: List[tuple]) -> List[str]:
+    errors = []
+    block_stack = []
+    for line_no, line in lines:
+        keyword = line.split()[0].lower()
+        if keyword in _SEQ_BLOCK_OPENERS:
+            block_stack.append((keyword, line_no))
+        elif keyword in _SEQ_BLOCK_CONTINUATIONS:
+            if not block_stack or block_stack[-1][0] not in _SEQ_BLOCK_CONTINUATIONS[keyword]:
+                errors.append(f"{line_no}行目: '{keyword}' に対応する '{'/'.join(_SEQ_BLOCK_CONTINUATIONS[keyword])}' ブロックがありません。")
+        elif keyword == "end":
+            if not block_stack:
+                errors.append(f"{line_no}行目: 対応するブロックのない 'end' があります。")
+            else:
+                block_stack.pop()
+        elif not (_SEQ_MESSAGE.match(line) or _SEQ_PARTICIPANT.match(line)
+                  or _SEQ_NOTE.match(line) or _SEQ_SIMPLE.match(line)):
+            errors.append(f"{line_no}行目: sequenceDiagram として解釈できない行です: {line}")
+    for keyword, line_no in block_stack:
+        errors.append(f"{line_no}行目: '{keyword}' ブロックが 'end' で閉じられていません。")
+    return errors
+
+
+def _validate_er(lines: List[tuple]) -> List[str]:
+    errors = []
+    open_entity: Optional[tuple] = None
+    for line_no, line in lines:
+        if open_entity:
+            if line == "}":
+                open_entity = None
+            elif not _ER_ATTRIBUTE.match(line):
+                errors.append(f"{line_no}行目: エンティティ '{open_entity[0]}' の属性定義として不正です (型 名前 [PK|FK|UK] [\"コメント\"]): {line}")
+            continue
+        entity_match = _ER_ENTITY_OPEN.match(line)
+        if entity_match:
+            open_entity = (entity_match.group(1), line_no)
+        elif line == "}":
+            errors.append(f"{line_no}行目: 対応する '{{' のない '}}' があります。")
+        elif line.startswith("direction ") or line.startswith("title"):
+            continue
+        elif not _ER_RELATIONSHIP.match(line):
+            errors.append(f"{line_no}行目: erDiagram のリレーションシップ (例: A ||--o{{ B : label) として不正です: {line}")
+    if open_entity:
+        errors.append(f"{open_entity[1]}行目: エンティティ '{open_entity[0]}' の '{{' が閉じられていません。")
+    return errors
+
+
+def _validate_state(lines: List[tuple]) -> List[str]:
+    errors = []
+    depth = 0
+    in_note = False
+    for line_no, line in lines:
+        if in_note:
+            if line.lower() == "end note":
+                in_note = False
+            continue
+        if line == "}":
+            if depth == 0:
+                errors.append(f"{line_no}行目: 対応する '{{' のない '}}' があります。")
+            else:
+                depth -= 1
+        elif _STATE_DECL.match(line):
+            if line.endswith("{"):
+                depth += 1
+        elif _STATE_NOTE_OPEN.match(line):
+            in_note = True
+        elif "->" in line and "-->" not in line:
+            errors.append(f"{line_no}行目: stateDiagram の遷移は '-->' で記述してください: {line}")
+        elif not (_STATE_TRANSITION.match(line) or _STATE_DESCRIPTION.match(line)
+                  or _STATE_NOTE_SINGLE.match(line) or _STATE_SIMPLE.match(line)):
+            errors.append(f"{line_no}行目: stateDiagram として解釈できない行です: {line}")
+    if depth:
+        errors.append(f"'state {{ ... }}' の閉じ括弧が {depth} 個不足しています。")
+    if in_note:
+        errors.append("'note' が 'end note' で閉じられていません。")
+    return errors
+
+
+_VALIDATORS = {
+    "sequenceDiagram": _validate_sequence,
+    "erDiagram": _validate_er,
+    "stateDiagram": _validate_state,
+    "stateDiagram-v2": _validate_state,
+}
+
+
+@profiled("mermaid_validation")
+def validate_mermaid(code: str) -> List[str]:
+    """
+    1つの Mermaid 図のコードを検証し、エラーメッセージのリストを返します (空ならOK)。
+    sequenceDiagram / erDiagram / stateDiagram(-v2) 以外の図は、図の種類の行があることだけを確認します。
+    """
+    lines = _content_lines(code or "")
+    if not lines:
+        return ["Mermaid図が空です。"]
+    diagram_type = lines[0][1].split()[0]
+    validator = _VALIDATORS.get(diagram_type)
+    if validator is None:
+        if re.match(r"^(flowchart|graph|classDiagram|gantt|pie|journey|mindmap|timeline|gitGraph)\b", diagram_type):
+            return []
+        return [f"1行目: 不明な図の種類です: {diagram_type}"]
+    return validator(lines[1:])
+
+
+def find_missing_sections(markdown_text: str, required_sections: List[str]) -> List[str]:
+    """
+    必須セクションのうち、見出しとして現れないものを返します。
+    見出しの判定は、見出し行 (#) に必須セクション名が含まれるかどうかで行います (番号の有無や表記ゆれは許容)。
+    """
+    headings = [line.strip() for line in (markdown_text or "").splitlines() if line.lstrip().startswith("#")]
+    missing = []
+    for section in required_sections or []:
+        if not any(section in heading for heading in headings):
+            missing.append(section)
+    return missing
+
+
+def validate_document(markdown_text: str, required_sections: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    設計書全体を検証します。
+
+    Returns:
+        Dict[str, Any]: {"valid": bool, "mermaid_errors": [{"index", "block", "errors"}], "missing_sections": [...]}
+    """
+    mermaid_errors = []
+    for index, block in enumerate(extract_mermaid_blocks(markdown_text)):
+        errors = validate_mermaid(block["code"])
+        if errors:
+            mermaid_errors.append({"index": index, "block": block, "errors": errors})
+    missing_sections = find_missing_sections(markdown_text, required_sections or [])
+    return {
+        "valid": not mermaid_errors and not missing_sections,
+        "mermaid_errors": mermaid_errors,
+        "missing_sections": missing_sections,
+    }
+
+
+def replace_mermaid_block(markdown_text: str, block: Dict[str, Any], new_code: str) -> str:
+    """
+    extract_mermaid_blocks が返したブロックを、新しい Mermaid コードで置き換えた文字列を返します。
+    """
+    replacement = f"```mermaid\n{new_code.strip()}\n```"
+    return markdown_text[:block["start"]] + replacement + markdown_text[block["end"]:]
+
+
+def insert_section(markdown_text: str, section_markdown: str, before_sections: List[str]) -> str:
+    """
+    セクションを、before_sections のうち最初に見つかった見出しの直前に挿入します。
+    見つからない場合は末尾に追加します。
+    """
+    lines = (markdown_text or "").splitlines(keepends=True)
+    offset = 0
+    for line in lines:
+        if line.lstrip().startswith("#") and any(section in line for section in before_sections):
+            return markdown_text[:offset] + section_markdown.rstrip() + "\n\n" + markdown_text[offset:]
+        offset += len(line)
+    return markdown_text.rstrip() + "\n\n" + section_markdown.strip() + "\n"
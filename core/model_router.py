@@ -0,0 +1,190 @@
+# このファイルは model_router モジュールです。
+# パイプラインの段階 (タスク) と Agent ごとに、どのモデル (ティア) を使うかを決めます。
+# - 既定のティアは model_routing.tasks (タスク別) → model_routing.agents (Agent別) → default_tier の順に決まります。
+# - ティアに "auto" を指定すると、プロンプトのトークン数やエンドポイントの複雑さ (呼び出しの数) で
+#   fast / strong を選びます。
+# - 各ティアの fallback_models は autogen の config_list の後続要素になるため、主モデルがタイムアウトや
+#   レート制限で失敗した場合は autogen が自動で次のモデルに切り替えます。
+# autogen に依存しないため、ドライラン見積もり (core.estimator) からも利用できます。
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from .java_parser import build_call_tree
+from .local_diagrams import match_local_endpoint
+
+logger = logging.getLogger(__name__)
+
+AUTO_TIER = "auto"
+
+DEFAULT_MODEL_ROUTING = {
+    "enabled": False,
+    "default_tier": "fast",
+    "tiers": {},
+    "agents": {},
+    "tasks": {},
+    "auto": {
+        "strong_tier": "strong",
+        "fast_tier": "fast",
+        "strong_min_prompt_tokens": 12000,
+        "strong_min_endpoint_calls": 6,
+    },
+    "timeout_seconds": None,
+}
+
+
+def model_routing_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_MODEL_ROUTING)
+    configured = app_config.get('model_routing', {}) or {}
+    settings.update(configured)
+    settings["auto"] = {**DEFAULT_MODEL_ROUTING["auto"], **(configured.get('auto') or {})}
+    return settings
+
+
+def _base_model(app_config: Dict[str, Any]) -> str:
+    return (app_config.get('llm_config', {}) or {}).get('model', "gpt-4o-mini")
+
+
+def tier_models(app_config: Dict[str, Any], tier: Optional[str]) -> List[str]:
+    """
+    ティアで使うモデルを、優先順 (主モデル → フォールバック) に返します。
+    ルーティングが無効な場合や、ティアが定義されていない場合は llm_config.model だけを返します。
+    """
+    settings = model_routing_settings(app_config)
+    tier_config = (settings["tiers"] or {}).get(tier) if settings["enabled"] and tier else None
+    if not tier_config:
+        return [_base_model(app_config)]
+    models = [tier_config.get('model') or _base_model(app_config)]
+    for model in tier_config.get('fallback_models') or []:
+        if model not in models:
+            models.append(model)
+    return models
+
+
+def build_llm_config(app_config: Dict[str, Any], tier: str) -> Dict[str, Any]:
+    """
+    ティアに対応する autogen の llm_config (config_list 形式) を組み立てます。
+    config_list の先頭が主モデル、以降がフォールバックです。
+    max_retries を小さくすると、レート制限時に同じモデルで待ち続けずに早くフォールバックへ切り替わります。
+    """
+    settings = model_routing_settings(app_config)
+    tier_config = (settings["tiers"] or {}).get(tier) or {}
+    base = app_config.get('llm_config', {}) or {}
+    entry = {"max_retries": tier_config['max_retries']} if tier_config.get('max_retries') is not None else {}
+    llm_config: Dict[str, Any] = {
+        "config_list": [{"model": model, **entry} for model in tier_models(app_config, tier)],
+        "temperature": tier_config.get('temperature', base.get("temperature", 0.7)),
+    }
+    timeout = tier_config.get('timeout_seconds', settings["timeout_seconds"])
+    if timeout:
+        llm_config["timeout"] = timeout
+    return llm_config
+
+
+def endpoint_complexity(identifier: str, discovery: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    エンドポイントの複雑さとして、ハンドラメソッドからたどれる呼び出しの数を返します。
+    ローカルで対応するエンドポイントが見つからない場合は None を返します。
+    """
+    if not discovery:
+        return None
+    endpoint = match_local_endpoint(identifier, discovery["endpoints"])
+    if endpoint is None:
+        return None
+
+    def count(nodes: List[Dict[str, Any]]) -> int:
+        return sum(1 + count(node["calls"]) for node in nodes)
+
+    return count(build_call_tree(discovery["types"], endpoint["controller_simple_name"], endpoint["body"]))
+
+
+def route_for(app_config: Dict[str, Any], task: str, agent_name: Optional[str] = None,
+              prompt: Optional[str] = None, complexity: Optional[int] = None) -> Dict[str, Any]:
+    """
+    1回のLLM呼び出しに使うティアとモデルを決めます。
+
+    Args:
+        task (str): パイプラインのタスク名 (例: "codebase_analyzer", "api_design", "db_design_cluster")。
+        agent_name (Optional[str]): 呼び出す Agent の名前。タスク別の指定がない場合に使います。
+        prompt (Optional[str]): 送信するプロンプト。"auto" の場合にトークン数で判定します。
+        complexity (Optional[int]): エンドポイントの複雑さ (endpoint_complexity の結果)。
+
+    Returns:
+        Dict[str, Any]: {"task", "tier", "models", "reason"}。ルーティングが無効な場合 tier は None。
+    """
+    settings = model_routing_settings(app_config)
+    if not settings["enabled"]:
+        return {"task": task, "tier": None, "models": tier_models(app_config, None), "reason": "ルーティング無効"}
+
+    tasks, agents = settings["tasks"] or {}, settings["agents"] or {}
+    if task in tasks:
+        tier, reason = tasks[task], f"タスク {task} の指定"
+    elif agent_name and agent_name in agents:
+        tier, reason = agents[agent_name], f"Agent {agent_name} の指定"
+    else:
+        tier, reason = settings["default_tier"], "既定"
+
+    if tier == AUTO_TIER:
+        auto = settings["auto"]
+        tier, reason = auto["fast_tier"], "自動: 小さなプロンプト・単純な処理"
+        if complexity is not None and complexity >= int(auto["strong_min_endpoint_calls"]):
+            tier, reason = auto["strong_tier"], f"自動: 呼び出し数 {complexity} ≥ {auto['strong_min_endpoint_calls']}"
+        elif prompt is not None:
+            from .estimator import count_tokens
+
+            prompt_tokens = count_tokens(prompt, _base_model(app_config))
+            if prompt_tokens >= int(auto["strong_min_prompt_tokens"]):
+                tier, reason = auto["strong_tier"], f"自動: プロンプト {prompt_tokens:,} トークン ≥ {auto['strong_min_prompt_tokens']:,}"
+
+    if tier not in (settings["tiers"] or {}):
+        logger.warning(f"model_routing.tiers に '{tier}' が定義されていないため、llm_config.model を使用します。")
+    return {"task": task, "tier": tier, "models": tier_models(app_config, tier), "reason": reason}
+
+
+def responding_model(response_model: Optional[str], models: List[str]) -> Optional[str]:
+    """
+    応答に含まれるモデル名 (例: "gpt-4o-mini-2024-07-18") が、models (主モデルとフォールバック) のどれに当たるかを返します。
+    日付の接尾辞 (-YYYY-MM-DD) を除いて完全一致を優先し、一致しなければ、残りがバージョン番号 ("-0613" など) だけの
+    モデル名のうち最も長いものを返します ("gpt-4o-mini-…" を "gpt-4o" と取り違えないため)。
+    どれにも当たらない場合は None を返します。
+    """
+    if not response_model:
+        return None
+    name = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", str(response_model))
+    if name in models:
+        return name
+    candidates = [model for model in models if name.startswith(model) and re.fullmatch(r"(-\d+)+", name[len(model):])]
+    return max(candidates, key=len) if candidates else None
+
+
+def summarize_routing(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    LLM呼び出しの記録 (core.llm_stats) を、ティアと実際に応答したモデルごとに集計します。
+    フォールバックが発生した呼び出しの数も数えます。
+    """
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        key = (record.get("tier") or "-", record.get("model") or "不明")
+        bucket = buckets.setdefault(key, {"tier": key[0], "model": key[1], "calls": 0, "fallbacks": 0, "seconds": 0.0})
+        bucket["calls"] += 1
+        bucket["fallbacks"] += 1 if record.get("fallback") else 0
+        bucket["seconds"] += record["seconds"]
+    for bucket in buckets.values():
+        bucket["average_seconds"] = bucket["seconds"] / bucket["calls"]
+    return sorted(buckets.values(), key=lambda b: (b["tier"], -b["calls"]))
+
+
+def format_routing_summary(records: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    ティア・モデル別の呼び出し数と平均所要時間を1行のログ用メッセージにします。記録がない場合は None。
+    """
+    summary = summarize_routing(records)
+    if not summary:
+        return None
+    parts = [
+        f"{b['tier']}/{b['model']}: {b['calls']}回 平均{b['average_seconds']:.1f}秒"
+        + (f" (フォールバック {b['fallbacks']}回)" if b["fallbacks"] else "")
+        for b in summary
+    ]
+    return "モデル別の呼び出し: " + ", ".join(parts)
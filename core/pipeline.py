@@ -0,0 +1,800 @@
+# このファイルは pipeline モジュールです。
+# コード分析から設計書生成までの一連のAgent対話 (パイプライン) を実行します。
+# Streamlit に依存しないため、UI・ヘッドレス実行・ウォッチモードのバックグラウンドスレッドから共通で利用できます。
+# autogen を読み込む Agent モジュールは、起動を軽くするため各関数内でインポートします。
+
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .checkpoint import STATUS_COMPLETED, STATUS_INCOMPLETE, PipelineCheckpoint
+from .db_sharding import cluster_label, format_cluster_context, merge_db_sections, plan_db_shards
+from .endpoint_families import (can_substitute_locally, derive_document_locally, describe_referenced_types,
+                                endpoint_family_settings, plan_endpoint_families)
+from .java_parser import component_role, discover_codebase, endpoint_dependencies
+from .llm_stats import (current_usage_scope, format_cache_summary, get_records, record_call, summarize,
+                        usage_scope)
+from .local_diagrams import (ER_DIAGRAM_PLACEHOLDER, SEQUENCE_DIAGRAM_PLACEHOLDER, er_diagram_for, inject_diagram,
+                             match_local_endpoint, sequence_diagram_for)
+from .model_router import (endpoint_complexity, format_routing_summary, model_routing_settings, responding_model,
+                           route_for)
+from .mermaid_validator import (extract_mermaid_blocks, insert_section, replace_mermaid_block,
+                                validate_document, validate_mermaid)
+from .report_parser import LogFunc, extract_entity_section, log_with_logger, parse_api_endpoints_from_report
+
+logger = logging.getLogger(__name__)
+
+
+def new_pipeline_results() -> Dict[str, Any]:
+    """
+    パイプライン結果の初期値を返します。
+    """
+    return {"status": "Error", "message": "パイプラインの開始に失敗しました。",
+            "project_overview": "", "initial_analysis": "", "api_docs": {}, "db_doc": "", "failed_items": []}
+
+
+def build_project_overview(codebase_path_str: str, java_files_list: List[Path], dir_tree_str: str,
+                           ui_texts: Optional[Dict[str, str]] = None) -> str:
+    """
+    ディレクトリ構造とJavaファイル一覧から「プロジェクト概要」のMarkdownを組み立てます。
+    """
+    ui_texts = ui_texts or {}
+    overview = f"### {ui_texts.get('directory_structure_title', 'ディレクトリ構造')}\n```\n{dir_tree_str}\n```\n\n"
+    overview += f"### {ui_texts.get('java_files_title', '検出されたJavaファイル')}\n"
+    overview += "\n".join([f"- {f.name} ({f.relative_to(Path(codebase_path_str))})" for f in java_files_list[:20]])
+    if len(java_files_list) > 20:
+        overview += f"\n...他{len(java_files_list) - 20}ファイル"
+    return overview
+
+
+def _ask(user_proxy, agent, message: str, stage: str, route: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Agentに1往復だけ問い合わせ、応答本文を返します。応答が空の場合は None を返します。
+    呼び出しの所要時間とトークン使用量は、stage ごとに core.llm_stats に記録されます。
+    route (core.model_router.route_for の結果) を渡すと、選ばれたティアとその理由、
+    主モデル以外 (フォールバック) が応答したかどうかも記録されます。
+    """
+    agent.last_usage = None
+    started = time.perf_counter()
+    user_proxy.initiate_chat(recipient=agent, message=message, max_turns=1, clear_history=True)
+    seconds = time.perf_counter() - started
+    usage = getattr(agent, "last_usage", None) or {}
+    route_info = {}
+    if route:
+        requested_model = route["models"][0]
+        # 応答のモデル名は "gpt-4o-mini-2024-07-18" のように日付が付くため、設定されたモデルのどれに当たるかを判定する
+        fallback = bool(usage.get("model")) and responding_model(usage["model"], route["models"]) != requested_model
+        route_info = {"tier": route["tier"], "requested_model": requested_model, "fallback": fallback,
+                      "route_reason": route["reason"]}
+        logger.info(f"[{stage}] ティア {route['tier']} ({route['reason']}) -> {usage.get('model') or requested_model}"
+                    f"{' (フォールバック)' if fallback else ''}: {seconds:.1f}秒")
+    record_call(stage, usage.get("model"), usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                seconds, cached_tokens=usage.get("cached_tokens", 0), **route_info)
+    response_message = user_proxy.last_message(agent=agent)
+    if response_message and response_message.get("content"):
+        return str(response_message["content"])
+    return None
+
+
+def _routed_agent(agents: Dict[Optional[str], Any], agent_class, app_config: Dict[str, Any], route: Dict[str, Any]):
+    """
+    ルーティング結果のティアに対応する Agent を返します。同じティアの Agent は agents に保持して使い回します。
+    """
+    if route["tier"] not in agents:
+        agents[route["tier"]] = agent_class(app_config=app_config, tier=route["tier"])
+    return agents[route["tier"]]
+
+
+def _in_usage_scope(func):
+    """
+    関数の中のLLM呼び出しを新しいスコープ (core.llm_stats.usage_scope) で記録し、
+    _log_routing_summary と _record_usage がその実行の呼び出しだけを集計できるようにします。
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with usage_scope():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _log_routing_summary(app_config: Dict[str, Any], log: LogFunc) -> None:
+    if not model_routing_settings(app_config)["enabled"]:
+        return
+    summary = format_routing_summary([r for r in get_records(scope=current_usage_scope()) if "tier" in r])
+    if summary:
+        log(summary, "info")
+
+
+def _record_usage(results: Dict[str, Any], log: LogFunc) -> None:
+    """
+    この実行のLLM呼び出し (現在のスコープで記録されたもの) の段階別の使用量 (キャッシュされた入力トークン数を含む) を
+    results["llm_usage"] に格納し、キャッシュの利用状況をログに出力します。
+    """
+    results["llm_usage"] = summarize(get_records(scope=current_usage_scope()))
+    cache_summary = format_cache_summary(results["llm_usage"])
+    if cache_summary:
+        log(cache_summary, "info")
+
+
+def _create_user_proxy():
+    from agents.user_proxy_agent import StreamlitUserProxyAgent
+
+    return StreamlitUserProxyAgent(
+        name="StreamlitUserProxy",
+        human_input_mode="NEVER",
+        code_execution_config=False,
+    )
+
+
+def _check_prerequisites(app_config: Dict[str, Any], results: Dict[str, Any], log: LogFunc) -> bool:
+    if not app_config:
+        results["message"] = "アプリケーション設定がロードされていません。処理を中止します。"
+        log(results["message"], "error")
+        return False
+
+    if not os.getenv("OPENAI_API_KEY"):
+        results["message"] = "OPENAI_API_KEYが設定されていません。.envファイルを確認してください。Agent処理をスキップします。"
+        log(results["message"], "error")
+        return False
+    return True
+
+
+def _run_initial_analysis(app_config, user_proxy, codebase_path_str: str, java_files_list: List[Path],
+                          dir_tree_str: str) -> Optional[str]:
+    from agents.codebase_analyzer_agent import CodebaseAnalyzerAgent
+
+    initial_analysis_prompt = CodebaseAnalyzerAgent.analyze_codebase(
+        codebase_path=codebase_path_str,
+        java_files=java_files_list,
+        project_structure=dir_tree_str
+    )
+    route = route_for(app_config, "codebase_analyzer", "JavaCodeAnalyzer", prompt=initial_analysis_prompt)
+    analyzer = CodebaseAnalyzerAgent(app_config=app_config, tier=route["tier"])
+    return _ask(user_proxy, analyzer, initial_analysis_prompt, "codebase_analyzer", route)
+
+
+def _extract_repaired_mermaid(response: Optional[str]) -> Optional[str]:
+    if not response:
+        return None
+    blocks = extract_mermaid_blocks(response)
+    if blocks:
+        return blocks[0]["code"]
+    stripped = response.strip().strip("`").strip()
+    return stripped or None
+
+
+def validate_and_repair_document(app_config: Dict[str, Any], user_proxy, document: str, doc_kind: str,
+                                 source_context: str, log: LogFunc) -> str:
+    """
+    生成された設計書をローカルで検証し、壊れた部分だけをLLMに修正させます。
+
+    構文エラーのあるMermaidブロックは、そのブロックとエラー内容だけを DocumentRepairAgent に送り、
+    修正結果がローカル検証を通るまで最大 validation_settings.max_repair_attempts 回再試行します。
+    欠落した必須セクションは、そのセクションだけを生成させて適切な位置に挿入します。
+    修正できなかったブロックは元のまま残します (画面表示時に警告とコードが表示されます)。
+
+    Args:
+        document (str): 検証対象の設計書。
+        doc_kind (str): validation_settings.required_sections のキー ("api_design" または "db_design")。
+        source_context (str): セクション補完時に渡す分析情報。
+
+    Returns:
+        str: 修正を反映した設計書。
+    """
+    settings = app_config.get('validation_settings', {}) or {}
+    if not settings.get('enabled', True):
+        return document
+    required_sections = (settings.get('required_sections') or {}).get(doc_kind, [])
+    report = validate_document(document, required_sections)
+    if report["valid"]:
+        return document
+
+    from agents.document_repair_agent import DocumentRepairAgent
+
+    max_attempts = max(1, int(settings.get('max_repair_attempts', 2)))
+    route = route_for(app_config, "document_repair", "DocumentRepairer")
+    repairer = DocumentRepairAgent(app_config=app_config, tier=route["tier"])
+
+    # 後ろのブロックから置き換えることで、前のブロックの文字位置を保つ
+    for item in reversed(report["mermaid_errors"]):
+        code, errors = item["block"]["code"], item["errors"]
+        log(f"  Mermaid図 {item['index'] + 1} に構文エラーを検出しました ({errors[0]})。このブロックだけを修正します...", "warning")
+        for _ in range(max_attempts):
+            candidate = _extract_repaired_mermaid(_ask(user_proxy, repairer, repairer.generate_mermaid_repair_prompt(code, errors), "document_repair", route))
+            if not candidate:
+                continue
+            code, errors = candidate, validate_mermaid(candidate)
+            if not errors:
+                break
+        if errors:
+            log(f"  Mermaid図 {item['index'] + 1} は {max_attempts} 回の修正で解消できませんでした。", "warning")
+        else:
+            document = replace_mermaid_block(document, item["block"], code)
+            log(f"  Mermaid図 {item['index'] + 1} を修正しました。", "info")
+
+    for section in report["missing_sections"]:
+        log(f"  必須セクション「{section}」が欠落しているため、このセクションだけを生成します...", "warning")
+        following = required_sections[required_sections.index(section) + 1:]
+        for _ in range(max_attempts):
+            section_markdown = _ask(user_proxy, repairer, repairer.generate_section_prompt(section, source_context), "document_repair", route)
+            if section_markdown and section in section_markdown:
+                document = insert_section(document, section_markdown, following)
+                break
+        else:
+            log(f"  必須セクション「{section}」を補完できませんでした。", "warning")
+
+    return document
+
+
+def _generate_api_documents(app_config, user_proxy, api_endpoints, analysis_report_text: str,
+                            results: Dict[str, Any], log: LogFunc, discovery: Optional[Dict[str, Any]] = None,
+                            checkpoint: Optional[PipelineCheckpoint] = None,
+                            reusable_docs: Optional[Dict[str, str]] = None) -> None:
+    """
+    APIごとに設計書を生成します。1件の生成で例外が発生しても残りのAPIの生成は続け、
+    失敗したAPIは results["failed_items"] (とチェックポイント) に記録します。
+
+    構造が同じAPIのファミリー (core.endpoint_families) は、代表の設計書だけを通常どおり生成し、
+    残りは代表の設計書からローカルの置換または差分プロンプトで導出します。
+    reusable_docs (チェックポイントから復元した設計書など、生成済みの設計書) も代表として使います。
+    """
+    api_designers: Dict[Optional[str], Any] = {}
+    reusable_docs = dict(reusable_docs or {})
+    families = plan_endpoint_families(app_config, list(reusable_docs) + [identifier for identifier, _ in api_endpoints],
+                                      discovery)
+    canonical_of = families["canonical_of"]
+    family_canonicals = {family[0] for family in families["families"]}
+    if families["families"]:
+        log(f"  構造が同じAPIのファミリーを{len(families['families'])}件検出しました。"
+            f"{len(canonical_of)}件の設計書は各ファミリーの代表の設計書から導出します。", "info")
+    derived = {"local": 0, "delta": 0}
+
+    for i, (api_identifier, api_info_block) in enumerate(api_endpoints):
+        log(f"  API設計書を生成中 ({i+1}/{len(api_endpoints)}): {api_identifier} ...", "info")
+        canonical = canonical_of.get(api_identifier)
+        try:
+            doc_content = None
+            if canonical and reusable_docs.get(canonical):
+                doc_content = _derive_api_document(app_config, user_proxy, api_designers, api_identifier, api_info_block,
+                                                   canonical, reusable_docs[canonical], log, discovery, derived)
+            if not doc_content:
+                # 代表の生成に失敗した場合や、導出できなかった場合は通常どおり生成する
+                doc_content = _generate_api_document(app_config, user_proxy, api_designers, api_identifier, api_info_block,
+                                                     analysis_report_text, log, discovery,
+                                                     family_template=api_identifier in family_canonicals)
+        except Exception as e:
+            doc_content, error = None, str(e)
+        else:
+            error = "応答が空でした。"
+        if doc_content:
+            results["api_docs"][api_identifier] = doc_content
+            reusable_docs[api_identifier] = doc_content
+            if checkpoint:
+                checkpoint.save_item("api_doc", api_identifier, doc_content)
+            log(f"  API「{api_identifier}」の設計書生成完了。", "info")
+        else:
+            error_msg = f"API「{api_identifier}」の設計書生成に失敗しました。"
+            log(f"{error_msg} ({error})", "warning")
+            results["api_docs"][api_identifier] = error_msg
+            results["failed_items"].append(api_identifier)
+            if checkpoint:
+                checkpoint.record_failure("api_doc", api_identifier, error)
+
+    if derived["local"] or derived["delta"]:
+        log(f"  ファミリーの代表から、{derived['local']}件をローカルの置換で、{derived['delta']}件を差分プロンプトで導出しました。", "info")
+
+
+def _generate_api_document(app_config, user_proxy, api_designers: Dict[Optional[str], Any], api_identifier: str,
+                           api_info_block: str, analysis_report_text: str, log: LogFunc,
+                           discovery: Optional[Dict[str, Any]], family_template: bool = False) -> Optional[str]:
+    from agents.api_design_generator_agent import APIDesignGeneratorAgent
+
+    # シーケンス図はソースコードからローカルで組み立て、LLMには説明文だけを書かせる
+    sequence_diagram = sequence_diagram_for(app_config, api_identifier, discovery)
+    api_doc_prompt = APIDesignGeneratorAgent.generate_api_document_prompt(
+        single_api_analysis=api_info_block,
+        full_analysis_report=analysis_report_text,
+        sequence_diagram=sequence_diagram,
+        family_template=family_template,
+    )
+    # 単純なCRUDは軽量モデル、呼び出しの多い複雑なエンドポイントは上位モデルに振り分ける (model_routing)
+    route = route_for(app_config, "api_design", "APIDesignGenerator", prompt=api_doc_prompt,
+                      complexity=endpoint_complexity(api_identifier, discovery))
+    api_designer = _routed_agent(api_designers, APIDesignGeneratorAgent, app_config, route)
+
+    doc_content = _ask(user_proxy, api_designer, api_doc_prompt, "api_design", route)
+    if not doc_content:
+        return None
+    if sequence_diagram:
+        doc_content = inject_diagram(doc_content, sequence_diagram, "sequenceDiagram", SEQUENCE_DIAGRAM_PLACEHOLDER,
+                                     "シーケンス図", "### シーケンス図 (Mermaid)")
+    return validate_and_repair_document(app_config, user_proxy, doc_content, "api_design", api_info_block, log)
+
+
+def _derive_api_document(app_config, user_proxy, api_designers: Dict[Optional[str], Any], api_identifier: str,
+                         api_info_block: str, canonical_identifier: str, canonical_doc: str, log: LogFunc,
+                         discovery: Dict[str, Any], derived: Dict[str, int]) -> Optional[str]:
+    """
+    ファミリーの代表の設計書から、メンバーのAPIの設計書を導出します。
+    参照するクラスの構成まで同じ場合はリソース名の置換だけで (LLMを呼ばずに)、異なる場合は差分プロンプトで生成します。
+    導出できなかった場合は None を返します (呼び出し元で通常の生成に切り替えます)。
+    """
+    from agents.api_design_generator_agent import APIDesignGeneratorAgent
+
+    canonical_endpoint = match_local_endpoint(canonical_identifier, discovery["endpoints"])
+    member_endpoint = match_local_endpoint(api_identifier, discovery["endpoints"])
+    if canonical_endpoint is None or member_endpoint is None:
+        return None
+    sequence_diagram = sequence_diagram_for(app_config, api_identifier, discovery)
+
+    doc_content = None
+    if can_substitute_locally(app_config, canonical_endpoint, member_endpoint, discovery):
+        doc_content = derive_document_locally(canonical_identifier, canonical_endpoint, member_endpoint, canonical_doc,
+                                              endpoint_family_settings(app_config)["subject_translations"])
+        if doc_content:
+            derived["local"] += 1
+            log(f"    「{canonical_identifier}」の設計書からローカルの置換で導出しました。", "info")
+        else:
+            log(f"    「{canonical_identifier}」の設計書はリソース名の置換だけでは導出できない (説明文でリソース名を日本語で記載しているなど) ため、差分プロンプトで生成します。", "info")
+    if not doc_content:
+        delta_prompt = APIDesignGeneratorAgent.generate_api_delta_prompt(
+            canonical_identifier=canonical_identifier,
+            canonical_document=canonical_doc,
+            single_api_analysis=api_info_block,
+            referenced_types=describe_referenced_types(member_endpoint, discovery),
+            sequence_diagram=sequence_diagram,
+        )
+        route = route_for(app_config, "api_design_delta", "APIDesignGenerator", prompt=delta_prompt)
+        api_designer = _routed_agent(api_designers, APIDesignGeneratorAgent, app_config, route)
+        doc_content = _ask(user_proxy, api_designer, delta_prompt, "api_design_delta", route)
+        if not doc_content:
+            return None
+        derived["delta"] += 1
+        log(f"    「{canonical_identifier}」の設計書を雛形に、差分プロンプトで生成しました。", "info")
+    if sequence_diagram:
+        # 置換で導出した設計書には代表のシーケンス図が残っているため、メンバー自身の図に差し替える
+        doc_content = inject_diagram(doc_content, sequence_diagram, "sequenceDiagram", SEQUENCE_DIAGRAM_PLACEHOLDER,
+                                     "シーケンス図", "### シーケンス図 (Mermaid)")
+    return validate_and_repair_document(app_config, user_proxy, doc_content, "api_design", api_info_block, log)
+
+
+def _generate_db_document(app_config, user_proxy, analysis_report_text: str, results: Dict[str, Any],
+                          log: LogFunc, discovery: Optional[Dict[str, Any]] = None,
+                          checkpoint: Optional[PipelineCheckpoint] = None) -> None:
+    """
+    DB設計書を生成します。例外が発生した場合や一部のクラスタの生成に失敗した場合は、
+    results["failed_items"] (とチェックポイント) に記録します。
+    """
+    failed_before = len(results["failed_items"])
+    try:
+        db_document = _build_db_document(app_config, user_proxy, analysis_report_text, log, discovery,
+                                         results["failed_items"], checkpoint)
+        error = "応答が空でした。"
+    except Exception as e:
+        db_document, error = None, str(e)
+
+    if db_document:
+        results["db_doc"] = db_document
+        # クラスタの一部が失敗した設計書は保存せず、再開時に失敗したクラスタだけを生成し直してまとめ直す
+        if checkpoint and len(results["failed_items"]) == failed_before:
+            checkpoint.save_stage("db_doc", db_document)
+        log("DBDesignGeneratorAgentによるDB設計書の生成が完了しました。", "info")
+    else:
+        error_msg = "DBDesignGeneratorAgentから有効なDB設計書を取得できませんでした。"
+        log(f"{error_msg} ({error})", "warning")
+        results["db_doc"] = error_msg
+        results["failed_items"].append("database_design")
+        if checkpoint:
+            checkpoint.record_failure("stage", "db_doc", error)
+
+
+def _build_db_document(app_config, user_proxy, analysis_report_text: str, log: LogFunc,
+                       discovery: Optional[Dict[str, Any]], failed_items: List[str],
+                       checkpoint: Optional[PipelineCheckpoint]) -> Optional[str]:
+    from agents.db_design_generator_agent import DBDesignGeneratorAgent
+
+    entity_section = extract_entity_section(analysis_report_text)
+    clusters = plan_db_shards(app_config, discovery["entities"]) if discovery else None
+
+    if clusters:
+        db_document = _generate_sharded_db_document(app_config, clusters, entity_section, log, failed_items, checkpoint)
+    else:
+        # ER図はJPAアノテーションからローカルで組み立て、LLMにはテーブル定義などの本文だけを書かせる
+        er_diagram = er_diagram_for(app_config, discovery)
+        db_doc_prompt = DBDesignGeneratorAgent.generate_db_document_prompt(analysis_report_text, er_diagram=er_diagram)
+        route = route_for(app_config, "db_design", "DBDesignGenerator", prompt=db_doc_prompt)
+        db_designer = DBDesignGeneratorAgent(app_config=app_config, tier=route["tier"])
+        db_document = _ask(user_proxy, db_designer, db_doc_prompt, "db_design", route)
+        if db_document and er_diagram:
+            db_document = inject_diagram(db_document, er_diagram, "erDiagram", ER_DIAGRAM_PLACEHOLDER,
+                                         "エンティティ関連図", "### 1. エンティティ関連図 (ER図 - Mermaid)")
+
+    if not db_document:
+        return None
+    return validate_and_repair_document(
+        app_config, user_proxy, db_document, "db_design",
+        entity_section or analysis_report_text, log,
+    )
+
+
+def _generate_db_cluster_section(app_config, cluster_context: str, cluster_index: int, cluster_count: int,
+                                 scope: Optional[str] = None) -> Optional[str]:
+    from agents.db_design_generator_agent import DBDesignGeneratorAgent
+
+    # autogen の Agent はスレッドセーフではないため、スレッドごとに Agent と UserProxy を作成する
+    prompt = DBDesignGeneratorAgent.generate_db_cluster_prompt(cluster_context, cluster_index, cluster_count)
+    route = route_for(app_config, "db_design_cluster", "DBDesignGenerator", prompt=prompt)
+    db_designer = DBDesignGeneratorAgent(app_config=app_config, tier=route["tier"])
+    # ワーカースレッドで実行されるため、呼び出し元の実行のスコープで記録する
+    with usage_scope(scope):
+        return _ask(_create_user_proxy(), db_designer, prompt, "db_design", route)
+
+
+def _cluster_key(cluster: List[Dict[str, Any]]) -> str:
+    # クラスタの番号は分割結果によって変わりうるため、含まれるエンティティでチェックポイントの項目を識別する
+    return ",".join(sorted(entity["qualified_name"] for entity in cluster))
+
+
+def _generate_sharded_db_document(app_config, clusters: List[List[Dict[str, Any]]], entity_section: str,
+                                  log: LogFunc, failed_items: Optional[List[str]] = None,
+                                  checkpoint: Optional[PipelineCheckpoint] = None) -> Optional[str]:
+    """
+    エンティティのクラスタごとにテーブル定義を並列に生成し、ローカルで組み立てたER図とともに1つの設計書にまとめます。
+    並列数は pipeline_settings.max_concurrency で指定します。全てのクラスタで生成に失敗した場合は None を返します。
+    チェックポイントに保存済みのクラスタは生成せずにそれを使い、失敗したクラスタは failed_items に追加します。
+    """
+    all_entities = [entity for cluster in clusters for entity in cluster]
+    pipeline_settings = app_config.get('pipeline_settings', {}) or {}
+    max_workers = max(1, int(pipeline_settings.get('max_concurrency', 1)))
+    sections: List[Optional[str]] = [checkpoint.get_item("db_cluster", _cluster_key(cluster)) if checkpoint else None
+                                     for cluster in clusters]
+    pending = [index for index, section in enumerate(sections) if not section]
+    restored = len(clusters) - len(pending)
+    log(f"  エンティティ {len(all_entities)} 件を関連に基づいて {len(clusters)} 個のクラスタに分割し、"
+        f"最大 {max_workers} 並列で生成します"
+        + (f" (うち {restored} 個はチェックポイントから復元)" if restored else "") + "...", "info")
+
+    scope = current_usage_scope()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(index: int):
+            return executor.submit(_generate_db_cluster_section, app_config,
+                                   format_cluster_context(clusters[index], all_entities, entity_section),
+                                   index + 1, len(clusters), scope)
+
+        futures = {}
+        if max_workers > 1 and len(pending) > 1 and pipeline_settings.get('warm_up_prompt_cache', True):
+            # 同時に送ったリクエストどうしはプレフィックスキャッシュを共有できないため、
+            # 先に1件だけ生成して共通部分 (システムプロンプトと指示文) をキャッシュさせてから残りを並列に送る
+            futures[submit(pending[0])] = pending[0]
+            wait(list(futures))
+        futures.update({submit(index): index for index in pending[len(futures):]})
+        # ログ出力先 (Streamlit など) はスレッドセーフとは限らないため、ログは呼び出し元のスレッドで出力する
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            label = cluster_label(clusters[index])
+            try:
+                sections[index] = future.result()
+                error = "生成結果が空でした。"
+            except Exception as e:
+                error = f"生成中にエラーが発生しました: {e}"
+            if sections[index]:
+                if checkpoint:
+                    checkpoint.save_item("db_cluster", _cluster_key(clusters[index]), sections[index])
+                log(f"  DB設計書のクラスタを生成しました ({done}/{len(pending)}): {label}", "info")
+            else:
+                log(f"  クラスタ {index + 1} ({label}) の{error}", "warning")
+                if failed_items is not None:
+                    failed_items.append(f"database_design: {label}")
+                if checkpoint:
+                    checkpoint.record_failure("db_cluster", _cluster_key(clusters[index]), error)
+
+    if not any(sections):
+        return None
+    return merge_db_sections(clusters, sections)
+
+
+@_in_usage_scope
+def run_analysis_pipeline(app_config: Dict[str, Any], codebase_path_str: str, java_files_list: List[Path],
+                          dir_tree_str: str, log: Optional[LogFunc] = None,
+                          ui_texts: Optional[Dict[str, str]] = None,
+                          checkpoint: Optional[PipelineCheckpoint] = None) -> Dict[str, Any]:
+    """
+    コード分析から設計書生成までの完全なパイプラインを実行します。
+
+    途中で失敗した場合も、それまでに生成された内容は結果辞書に残ります。
+    個々のAPI設計書・DB設計書の生成に失敗しても残りの生成は続け、失敗した項目は "failed_items" に記録します。
+    checkpoint を渡すと、完了した段階とドキュメントを完了した時点で保存し、保存済みのものは生成せずに復元します
+    (中断・一部失敗した実行の再開)。
+
+    Args:
+        app_config (Dict[str, Any]): アプリケーション設定。
+        codebase_path_str (str): 分析対象のコードベースのパス。
+        java_files_list (List[Path]): 検出されたJavaファイルのリスト。
+        dir_tree_str (str): ディレクトリ構造を表す文字列。
+        log (Optional[LogFunc]): 進捗メッセージの出力先 (message, level)。
+        ui_texts (Optional[Dict[str, str]]): プロジェクト概要の見出しに使うUIテキスト。
+        checkpoint (Optional[PipelineCheckpoint]): 実行のチェックポイント (core.checkpoint.open_checkpoint の結果)。
+
+    Returns:
+        Dict[str, Any]: status, message, project_overview, initial_analysis, api_docs, db_doc, failed_items,
+                        llm_usage (段階別のLLM使用量。core.llm_stats.summarize の形式)
+                        (チェックポイントがある場合は run_id も) を持つ結果辞書。
+    """
+    log = log or log_with_logger
+    results = new_pipeline_results()
+    if checkpoint:
+        results["run_id"] = checkpoint.run_id
+
+    if not _check_prerequisites(app_config, results, log):
+        if checkpoint:
+            checkpoint.finish(STATUS_INCOMPLETE, results["message"])
+        return results
+
+    try:
+        user_proxy = _create_user_proxy()
+        results["project_overview"] = build_project_overview(codebase_path_str, java_files_list, dir_tree_str, ui_texts)
+
+        analysis_report_text = checkpoint.get_stage("initial_analysis") if checkpoint else None
+        if analysis_report_text:
+            log(f"チェックポイント {checkpoint.run_id} から再開します。初期分析の結果を復元しました。", "info")
+        else:
+            log("ステップ3.1: CodebaseAnalyzerAgent との対話を開始します (コード分析中)...", "info")
+            analysis_report_text = _run_initial_analysis(app_config, user_proxy, codebase_path_str, java_files_list, dir_tree_str)
+
+            if not analysis_report_text:
+                results["message"] = "CodebaseAnalyzerAgentから有効な分析レポートを取得できませんでした。"
+                log(results["message"], "warning")
+                results["initial_analysis"] = results["message"]
+                if checkpoint:
+                    checkpoint.finish(STATUS_INCOMPLETE, results["message"])
+                return results
+            if checkpoint:
+                checkpoint.save_stage("initial_analysis", analysis_report_text)
+            log("CodebaseAnalyzerAgentによる初期分析が完了しました。", "info")
+
+        results["initial_analysis"] = analysis_report_text
+
+        api_endpoints = parse_api_endpoints_from_report(analysis_report_text, log)
+        # 図をローカルで組み立てるため、エンドポイント・エンティティ・呼び出し関係をソースから抽出しておく
+        discovery = discover_codebase(java_files_list)
+
+        if not api_endpoints:
+            log("CodebaseAnalyzerAgentの分析結果からAPIエンドポイントが見つかりませんでした。API設計書の生成はスキップされます。", "info")
+        else:
+            log(f"ステップ3.2: {len(api_endpoints)}件のAPIエンドポイントを検出。APIDesignGeneratorAgent との対話を開始します...", "info")
+            restored_docs = checkpoint.items("api_doc") if checkpoint else {}
+            pending_endpoints = []
+            for identifier, block in api_endpoints:
+                if identifier in restored_docs:
+                    results["api_docs"][identifier] = restored_docs[identifier]
+                else:
+                    pending_endpoints.append((identifier, block))
+            if len(pending_endpoints) < len(api_endpoints):
+                log(f"  {len(api_endpoints) - len(pending_endpoints)}件のAPI設計書をチェックポイントから復元しました。"
+                    f"残り{len(pending_endpoints)}件を生成します。", "info")
+            _generate_api_documents(app_config, user_proxy, pending_endpoints, analysis_report_text, results, log, discovery,
+                                    checkpoint, reusable_docs=restored_docs)
+            # 復元した設計書と生成した設計書を、レポートのエンドポイントの順に並べ直す
+            results["api_docs"] = {identifier: results["api_docs"][identifier] for identifier, _ in api_endpoints}
+
+            if results["api_docs"]:
+                log(f"全{len(results['api_docs'])}件のAPI設計書生成処理が完了しました。", "info")
+
+        restored_db_doc = checkpoint.get_stage("db_doc") if checkpoint else None
+        if restored_db_doc:
+            results["db_doc"] = restored_db_doc
+            log("ステップ3.3: DB設計書をチェックポイントから復元しました。", "info")
+        else:
+            log("ステップ3.3: DBDesignGeneratorAgent との対話を開始します (DB設計書生成中)...", "info")
+            _generate_db_document(app_config, user_proxy, analysis_report_text, results, log, discovery, checkpoint)
+        _log_routing_summary(app_config, log)
+        _record_usage(results, log)
+
+        # 一部の生成に失敗しても、生成できたドキュメントは成功として扱い、失敗分は再開時に生成し直す
+        results["status"] = "Success"
+        if results["failed_items"]:
+            results["message"] = (f"設計書生成パイプラインが完了しましたが、{len(results['failed_items'])}件の生成に失敗しました"
+                                  f" ({', '.join(results['failed_items'][:5])}{' ほか' if len(results['failed_items']) > 5 else ''})。"
+                                  + ("再開すると失敗した項目だけを生成し直します。" if checkpoint else ""))
+            log(results["message"], "warning")
+        else:
+            results["message"] = "設計書生成パイプラインが完了しました。"
+        if checkpoint:
+            checkpoint.finish(STATUS_INCOMPLETE if results["failed_items"] else STATUS_COMPLETED, results["message"])
+        return results
+
+    except Exception as e:
+        results["message"] = f"Agent対話パイプラインエラー: {str(e)}"
+        log(f"Agentの対話パイプライン中にエラーが発生しました: {e}", "error")
+        if checkpoint:
+            checkpoint.finish(STATUS_INCOMPLETE, results["message"])
+            log(f"完了した段階とドキュメントはチェックポイント {checkpoint.run_id} に保存されています。再開すると続きから生成します。", "info")
+        return results
+
+
+def class_names_from_paths(paths: Iterable[Path]) -> Set[str]:
+    """
+    Javaファイルのパスからクラス名 (ファイル名の拡張子なし部分) の集合を返します。
+    """
+    return {Path(p).stem for p in paths if Path(p).suffix == ".java"}
+
+
+def _mentions_any(text: str, class_names: Set[str]) -> bool:
+    # "User" が "UserController" に誤って一致しないよう、単語境界で判定する
+    return any(name and re.search(rf"\b{re.escape(name)}\b", text) for name in class_names)
+
+
+def find_affected_documents(analysis_report_text: str, changed_class_names: Set[str],
+                            discovery: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    変更されたクラス名から、再生成が必要なAPI設計書とDB設計書を判定します。
+
+    discovery (ローカル解析の結果) を渡すと、APIごとにソースコードから設計書に関わるクラス
+    (コントローラ、呼び出し木でたどれるサービス・リポジトリ、パラメータ・戻り値の DTO とそのフィールドの型) を求め、
+    変更クラスを含むAPIを影響ありとします。変更クラスがエンティティの場合はDB設計書を影響ありとします。
+    分析レポートのAPIブロック・DB_ENTITY_LIST にクラス名が現れるかどうかは、ローカルで対応するエンドポイントが
+    見つからないAPIと、ローカルで見つからないクラス (削除されたクラスなど) についてだけ判定に使います。
+
+    Returns:
+        Dict[str, Any]: {"api_identifiers": Set[str], "db": bool}
+    """
+    types = discovery["types"] if discovery else {}
+    known = {name for name in changed_class_names if name in types}
+    unknown = changed_class_names - known
+    affected_apis = set()
+    for identifier, block in parse_api_endpoints_from_report(analysis_report_text, lambda *_: None):
+        endpoint = match_local_endpoint(identifier, discovery["endpoints"]) if discovery else None
+        if endpoint is None:
+            if _mentions_any(block, changed_class_names):
+                affected_apis.add(identifier)
+            continue
+        dependencies = endpoint_dependencies(endpoint, types)
+        if known & (dependencies["signature"] | dependencies["calls"]) or _mentions_any(block, unknown):
+            affected_apis.add(identifier)
+    entity_names = {entity["class_name"] for entity in discovery["entities"]} if discovery else set()
+    affected_db = bool(known & entity_names) or _mentions_any(extract_entity_section(analysis_report_text),
+                                                              unknown if discovery else changed_class_names)
+    return {"api_identifiers": affected_apis, "db": affected_db}
+
+
+def _reanalysis_reason(app_config: Dict[str, Any], changed_paths: Set[Path], new_files: List[Path],
+                       changed_class_names: Set[str], discovery: Dict[str, Any]) -> Optional[str]:
+    """
+    変更を反映するために初期分析 (コードベース全体を送るLLM呼び出し) のやり直しが必要な理由を返します。
+    APIの一覧と、レポートに書かれたDTO・エンティティの内容が変わりえない変更 (サービス・リポジトリの本体だけの変更) では
+    None を返し、前回の初期分析を再利用します (watch_settings.reanalyze が "always" の場合は常にやり直します)。
+    """
+    if (app_config.get('watch_settings', {}) or {}).get('reanalyze', "auto") == "always":
+        return "watch_settings.reanalyze が always"
+    if new_files:
+        return "Javaファイルが追加された"
+    if any(Path(p).suffix == ".java" and not Path(p).exists() for p in changed_paths):
+        return "Javaファイルが削除された"
+    types = discovery["types"]
+    signature_types = set()
+    for endpoint in discovery["endpoints"]:
+        signature_types |= endpoint_dependencies(endpoint, types)["signature"]
+    entity_names = {entity["class_name"] for entity in discovery["entities"]}
+    for name in sorted(changed_class_names):
+        if name not in types:
+            return f"{name} をローカルで解析できなかった"
+        if component_role(types[name]) == "controller":
+            return f"コントローラ {name} が変更された"
+        if name in signature_types or name in entity_names:
+            return f"DTO・エンティティ {name} が変更された"
+    return None
+
+
+@_in_usage_scope
+def regenerate_for_changes(app_config: Dict[str, Any], codebase_path_str: str, java_files_list: List[Path],
+                           dir_tree_str: str, previous_results: Dict[str, Any], changed_paths: Set[Path],
+                           previous_java_files: Optional[Iterable[Path]] = None, log: Optional[LogFunc] = None,
+                           ui_texts: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    変更されたファイルに影響されるドキュメントだけを再生成します (ウォッチモード用)。
+
+    影響を受けるドキュメントはローカル解析で判定します (find_affected_documents)。変更されたクラスに依存するAPIと、
+    新たに現れたAPIの設計書だけを生成し直し、DB設計書は変更クラスがエンティティの場合のみ再生成します。
+    影響を受けるドキュメントがなく、新規ファイルもない場合は何も呼び出しません。
+
+    初期分析 (コードベース全体を送るLLM呼び出し) は、コントローラ・DTO・エンティティの変更やファイルの追加・削除で
+    APIの一覧やレポートの内容が変わりうる場合だけ、変更ファイルを先頭に並べてやり直します (理由をログに出力します)。
+    サービス・リポジトリの本体だけの変更では前回の初期分析を再利用します。
+
+    Args:
+        previous_results (Dict[str, Any]): 前回のパイプライン結果。
+        changed_paths (Set[Path]): 変更・作成・削除されたファイルのパス。
+        previous_java_files (Optional[Iterable[Path]]): 前回の実行時のJavaファイル一覧。新規ファイルの判定に使います。
+
+    Returns:
+        Dict[str, Any]: 前回の結果に再生成分を反映した結果辞書。"regenerated" に再生成したドキュメント名のリストを持ちます。
+    """
+    log = log or log_with_logger
+    results = new_pipeline_results()
+    results.update({
+        "project_overview": previous_results.get("project_overview", ""),
+        "initial_analysis": previous_results.get("initial_analysis", ""),
+        "api_docs": dict(previous_results.get("api_docs", {})),
+        "db_doc": previous_results.get("db_doc", ""),
+        "regenerated": [],
+    })
+
+    changed_class_names = class_names_from_paths(changed_paths)
+    previous_report = previous_results.get("initial_analysis", "")
+    known_files = {Path(p) for p in previous_java_files or []}
+    new_files = [p for p in changed_paths
+                 if Path(p).suffix == ".java" and Path(p).exists() and known_files and Path(p) not in known_files]
+
+    discovery = discover_codebase(java_files_list)
+    previously_affected = find_affected_documents(previous_report, changed_class_names, discovery)
+    if not previously_affected["api_identifiers"] and not previously_affected["db"] and not new_files:
+        results["status"] = "Success"
+        results["message"] = "変更されたファイルに関連するドキュメントはありませんでした。"
+        log(results["message"], "info")
+        return results
+
+    if not _check_prerequisites(app_config, results, log):
+        return results
+
+    try:
+        user_proxy = _create_user_proxy()
+        results["project_overview"] = build_project_overview(codebase_path_str, java_files_list, dir_tree_str, ui_texts)
+
+        # 変更されたファイルが分析対象ファイルの先頭に入るように並べ替える
+        changed_set = {Path(p) for p in changed_paths}
+        ordered_files = [p for p in java_files_list if p in changed_set] + [p for p in java_files_list if p not in changed_set]
+
+        reason = _reanalysis_reason(app_config, changed_paths, new_files, changed_class_names, discovery)
+        if reason or not previous_report:
+            log(f"初期分析を再実行します (コードベース全体を送るLLM呼び出し1回。理由: {reason or '前回のレポートがない'})...", "info")
+            analysis_report_text = _run_initial_analysis(app_config, user_proxy, codebase_path_str, ordered_files, dir_tree_str)
+            if not analysis_report_text:
+                results["message"] = "CodebaseAnalyzerAgentから有効な分析レポートを取得できませんでした。"
+                log(results["message"], "warning")
+                return results
+        else:
+            log("コントローラ・DTO・エンティティの変更やファイルの追加・削除がなく、APIの一覧は変わらないため、前回の初期分析を再利用します。", "info")
+            analysis_report_text = previous_report
+        results["initial_analysis"] = analysis_report_text
+
+        api_endpoints = parse_api_endpoints_from_report(analysis_report_text, log)
+        current_identifiers = {identifier for identifier, _ in api_endpoints}
+        currently_affected = find_affected_documents(analysis_report_text, changed_class_names, discovery)
+        targets = (previously_affected["api_identifiers"] | currently_affected["api_identifiers"]
+                   | (current_identifiers - set(results["api_docs"])))
+
+        # 削除されたAPIの設計書を取り除く
+        for identifier in list(results["api_docs"]):
+            if identifier not in current_identifiers:
+                del results["api_docs"][identifier]
+
+        endpoints_to_regenerate = [(identifier, block) for identifier, block in api_endpoints if identifier in targets]
+        if endpoints_to_regenerate:
+            log(f"{len(endpoints_to_regenerate)}件のAPI設計書を再生成します...", "info")
+            # 変更の影響を受けない前回の設計書は、ファミリーの代表として再利用できる
+            reusable_docs = {identifier: doc for identifier, doc in results["api_docs"].items()
+                             if identifier not in targets and identifier not in previous_results.get("failed_items", [])}
+            _generate_api_documents(app_config, user_proxy, endpoints_to_regenerate, analysis_report_text, results, log, discovery,
+                                    reusable_docs=reusable_docs)
+            results["regenerated"].extend(identifier for identifier, _ in endpoints_to_regenerate)
+
+        if previously_affected["db"] or currently_affected["db"]:
+            log("エンティティの変更を検出したため、DB設計書を再生成します...", "info")
+            _generate_db_document(app_config, user_proxy, analysis_report_text, results, log, discovery)
+            results["regenerated"].append("database_design")
+        _log_routing_summary(app_config, log)
+        _record_usage(results, log)
+
+        results["status"] = "Success"
+        results["message"] = f"{len(results['regenerated'])}件のドキュメントを更新しました。"
+        return results
+
+    except Exception as e:
+        results["message"] = f"Agent対話パイプラインエラー: {str(e)}"
+        log(f"ドキュメントの再生成中にエラーが発生しました: {e}", "error")
+        return results
@@ -0,0 +1,327 @@
+# このファイルは profiler モジュールです。
+# LLM呼び出し以外のローカル処理 (ディレクトリツリーの構築、ファイル探索、ソース解析、プロンプトの組み立て、
+# 分析レポートの正規表現による解析、描画時の Mermaid の分割) を段階ごとにプロファイルします。
+# - CPU: 段階ごとの cProfile を pstats 形式 (<段階>.prof) と、flamegraph.pl / speedscope などで読める
+#   collapsed stack 形式 (<段階>.collapsed、全段階をまとめた all.collapsed) で出力します。
+# - メモリ: 段階ごとのピーク増加を tracemalloc で計測します。スナップショットの取得は重いため、
+#   増加量の多い行は各段階の最初の数回の呼び出しだけ、前後のスナップショットを比べて集計します。
+# - summary.md: 段階ごとの呼び出し回数・所要時間・メモリと、累積時間の上位N関数。
+# 計測対象の関数には @profiled("段階名") を付けます。プロファイリングが無効なときはそのまま呼ばれます。
+# Streamlit に依存しないため、UI とヘッドレス実行の両方から利用できます。
+
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import shutil
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# file_utils・report_parser などの計測対象のモジュールから読み込まれるため、core 内の他のモジュールには依存しない
+LogFunc = Callable[[str, str], None]
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_PROFILING_SETTINGS = {
+    "enabled": False,
+    "directory": ".profiles",
+    "keep_sessions": 20,
+    "top_n": 25,
+    "memory": True,
+    "memory_frames": 1,
+    "memory_snapshots_per_stage": 5,
+}
+
+# collapsed stack で、これより短い (マイクロ秒) 経路は出力しない
+_MIN_STACK_MICROSECONDS = 1
+_MAX_STACK_DEPTH = 64
+
+_ACTIVE: Optional["Profiler"] = None
+_ACTIVE_LOCK = threading.Lock()
+# 段階の中で別の段階が呼ばれた場合は外側の段階の計測に含める (スレッドごとの入れ子の深さ)
+_LOCAL = threading.local()
+
+
+def profiling_settings(app_config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_PROFILING_SETTINGS)
+    settings.update(app_config.get('profiling_settings', {}) or {})
+    return settings
+
+
+def profiling_directory(app_config: Dict[str, Any]) -> Path:
+    """
+    プロファイルの出力先を返します。相対パスはアプリケーションのルートからのパスとみなします。
+    """
+    directory = Path(profiling_settings(app_config)["directory"]).expanduser()
+    return directory if directory.is_absolute() else PROJECT_ROOT / directory
+
+
+def _frame_name(func: Tuple[str, int, str]) -> str:
+    file_name, line, name = func
+    if file_name == "~":  # 組み込み関数
+        return name.replace(";", ",")
+    return f"{name} ({Path(file_name).name}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats, root: str) -> Dict[str, int]:
+    """
+    pstats の呼び出し元・呼び出し先の組から、collapsed stack 形式の {"root;呼び出し元;...;関数": マイクロ秒} を組み立てます。
+    cProfile は1段の呼び出し関係しか記録しないため、2段以上の経路の時間は呼び出し元ごとの累積時間の比で按分した近似値です。
+    """
+    entries = stats.stats
+    children: Dict[Tuple, List[Tuple[Tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, entry in entries.items() if not entry[4] and "_lsprof.Profiler" not in func[2]]
+
+    stacks: Dict[str, int] = {}
+
+    def walk(func: Tuple, seconds: float, path: List[str], visiting: set) -> None:
+        total = entries[func][3]
+        if seconds * 1e6 < _MIN_STACK_MICROSECONDS or total <= 0 or len(path) >= _MAX_STACK_DEPTH:
+            return
+        ratio = min(1.0, seconds / total)
+        path = path + [_frame_name(func)]
+        own = int(entries[func][2] * ratio * 1e6)
+        if own >= _MIN_STACK_MICROSECONDS:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + own
+        visiting = visiting | {func}
+        for child, child_seconds in children.get(func, []):
+            if child not in visiting and "_lsprof.Profiler" not in child[2]:
+                walk(child, child_seconds * ratio, path, visiting)
+
+    for func in roots:
+        walk(func, entries[func][3], [root], set())
+    return stacks
+
+
+class Profiler:
+    """
+    1回のプロファイリング (UIの再実行1回、CLIのコマンド1回) の計測結果。
+    段階ごとに cProfile を持ち、同じ段階の呼び出しは累積します。
+    cProfile は同時に1つしか有効にできないため、計測は同時に1つの段階だけで行い、
+    別のスレッドで同時に呼ばれた段階は計測せずに実行して件数だけ記録します。
+    """
+    def __init__(self, settings: Dict[str, Any], output_dir: Path):
+        self.settings = settings
+        self.output_dir = Path(output_dir)
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._measure_lock = threading.Lock()
+        self._stages_lock = threading.Lock()
+        self._memory = bool(settings["memory"])
+        self._started_tracemalloc = False
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, int(settings["memory_frames"])))
+            self._started_tracemalloc = True
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        return self.stages.setdefault(name, {
+            "profile": cProfile.Profile(), "calls": 0, "unmeasured": 0, "seconds": 0.0,
+            "max_seconds": 0.0, "peak_bytes": 0, "snapshots": 0, "allocated": {},
+        })
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    def measure(self, stage_name: str, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if getattr(_LOCAL, "depth", 0) > 0:
+            return func(*args, **kwargs)
+        if not self._measure_lock.acquire(blocking=False):
+            with self._stages_lock:
+                self._stage(stage_name)["unmeasured"] += 1
+            return func(*args, **kwargs)
+        _LOCAL.depth = 1
+        try:
+            with self._stages_lock:
+                stage = self._stage(stage_name)
+            memory = self._memory and tracemalloc.is_tracing()
+            before = None
+            if memory and stage["snapshots"] < int(self.settings["memory_snapshots_per_stage"]):
+                before = self._snapshot()
+            if memory:
+                current_before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            started = time.perf_counter()
+            try:
+                stage["profile"].enable()
+            except ValueError:  # 他のプロファイラが有効な場合
+                with self._stages_lock:
+                    stage["unmeasured"] += 1
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage["profile"].disable()
+                elapsed = time.perf_counter() - started
+                stage["calls"] += 1
+                stage["seconds"] += elapsed
+                stage["max_seconds"] = max(stage["max_seconds"], elapsed)
+                if memory and tracemalloc.is_tracing():
+                    stage["peak_bytes"] = max(stage["peak_bytes"], tracemalloc.get_traced_memory()[1] - current_before)
+                if before is not None and tracemalloc.is_tracing():
+                    stage["snapshots"] += 1
+                    for diff in self._snapshot().compare_to(before, "lineno"):
+                        if diff.size_diff:
+                            frame = diff.traceback[0]
+                            key = f"{frame.filename}:{frame.lineno}"
+                            total = stage["allocated"].setdefault(key, [0, 0])
+                            total[0] += diff.size_diff
+                            total[1] += diff.count_diff
+        finally:
+            _LOCAL.depth = 0
+            self._measure_lock.release()
+
+    def close(self) -> None:
+        # 別のスレッドで計測中の段階があれば、その終了を待ってから tracemalloc を止める
+        with self._measure_lock:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    # --- 出力 ---
+    def _stage_stats(self, stage: Dict[str, Any], stream: io.StringIO) -> Optional[pstats.Stats]:
+        try:
+            return pstats.Stats(stage["profile"], stream=stream)
+        except TypeError:  # 一度も計測されていない (統計が空)
+            return None
+
+    def _format_summary(self, label: str) -> str:
+        top_n = max(1, int(self.settings["top_n"]))
+        lines = [
+            f"# プロファイル: {label}",
+            "",
+            f"- 出力日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"- 計測期間: {time.perf_counter() - self.started_at:.2f} 秒",
+            "- CPU: `<段階>.prof` (pstats / snakeviz)、`<段階>.collapsed` と `all.collapsed` "
+            "(flamegraph.pl / speedscope。値はマイクロ秒、2段以上の経路は按分による近似値)",
+            "",
+            "| 段階 | 計測した呼び出し | 計測しなかった呼び出し | 合計 (秒) | 最大 (秒) | メモリのピーク増加 (KiB) |",
+            "|---|---:|---:|---:|---:|---:|",
+        ]
+        ordered = sorted(self.stages.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        for name, stage in ordered:
+            lines.append(f"| {name} | {stage['calls']} | {stage['unmeasured']} | {stage['seconds']:.3f} | "
+                         f"{stage['max_seconds']:.3f} | {stage['peak_bytes'] / 1024:.1f} |")
+        for name, stage in ordered:
+            if not stage["calls"]:
+                continue
+            lines += ["", f"## {name}", "", f"### 累積時間の上位 {top_n} 関数", "", "```"]
+            stream = io.StringIO()
+            stats = self._stage_stats(stage, stream)
+            if stats is not None:
+                stats.sort_stats("cumulative").print_stats(top_n)
+            lines += [stream.getvalue().strip(), "```"]
+            if stage["allocated"]:
+                lines += ["", f"### メモリ増加の上位 {top_n} 行 (最初の {stage['snapshots']} 回の呼び出しの合計)", "",
+                          "| 行 | 増加 (KiB) | ブロック数 |", "|---|---:|---:|"]
+                top = sorted(stage["allocated"].items(), key=lambda item: item[1][0], reverse=True)[:top_n]
+                lines += [f"| `{key}` | {size / 1024:.1f} | {count} |" for key, (size, count) in top]
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, label: str) -> Path:
+        """
+        段階ごとのプロファイル (.prof / .collapsed) と summary.md を output_dir に書き出し、summary.md のパスを返します。
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        all_stacks: List[str] = []
+        for name, stage in self.stages.items():
+            stats = self._stage_stats(stage, io.StringIO())
+            if stats is None:
+                continue
+            stats.dump_stats(str(self.output_dir / f"{name}.prof"))
+            stacks = [f"{stack} {value}" for stack, value in sorted(collapsed_stacks(stats, name).items())]
+            (self.output_dir / f"{name}.collapsed").write_text("\n".join(stacks) + "\n", encoding="utf-8")
+            all_stacks += stacks
+        (self.output_dir / "all.collapsed").write_text("\n".join(all_stacks) + "\n", encoding="utf-8")
+        summary_path = self.output_dir / "summary.md"
+        summary_path.write_text(self._format_summary(label), encoding="utf-8")
+        return summary_path
+
+
+def profiled(stage_name: str) -> Callable:
+    """
+    関数を段階 stage_name として計測するデコレータです。プロファイリング中でなければ何もせずに呼び出します。
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _ACTIVE
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler.measure(stage_name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _prune_sessions(base_dir: Path, keep: int) -> None:
+    sessions = sorted((path for path in base_dir.glob("*") if path.is_dir()), reverse=True)
+    for path in sessions[max(1, keep) - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def start_profiling(app_config: Dict[str, Any], label: str) -> Optional[Profiler]:
+    """
+    プロファイリングを開始します。他のプロファイリングが実行中の場合は None を返します。
+    プロファイルの出力先は profiling_settings.directory / <日時>-<label> です。
+    """
+    global _ACTIVE
+    settings = profiling_settings(app_config)
+    base_dir = profiling_directory(app_config)
+    with _ACTIVE_LOCK:
+        if _ACTIVE is not None:
+            return None
+        output_dir = base_dir / f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label}"
+        _ACTIVE = Profiler(settings, output_dir)
+        return _ACTIVE
+
+
+def stop_profiling(profiler: Optional[Profiler], label: str, app_config: Dict[str, Any]) -> Optional[Path]:
+    """
+    プロファイリングを終了して結果を書き出し、summary.md のパスを返します。
+    何も計測されなかった場合や書き出しに失敗した場合は None を返します。
+    """
+    global _ACTIVE
+    if profiler is None:
+        return None
+    with _ACTIVE_LOCK:
+        if _ACTIVE is profiler:
+            _ACTIVE = None
+    profiler.close()
+    if not profiler.stages:
+        return None
+    try:
+        _prune_sessions(profiling_directory(app_config), int(profiling_settings(app_config)["keep_sessions"]))
+        return profiler.write_report(label)
+    except OSError as e:
+        logger.warning(f"プロファイルを書き出せませんでした: {e}")
+        return None
+
+
+@contextmanager
+def profiling_session(app_config: Dict[str, Any], label: str, log: Optional[LogFunc] = None) -> Iterator[Optional[Profiler]]:
+    """
+    with ブロックの間プロファイリングし、終了時に結果を書き出します。
+    """
+    profiler = start_profiling(app_config, label)
+    if profiler is None and log:
+        log("他のプロファイリングが実行中のため、今回はプロファイリングしません。", "warning")
+    try:
+        yield profiler
+    finally:
+        summary_path = stop_profiling(profiler, label, app_config)
+        if summary_path and log:
+            log(f"プロファイルを {summary_path.parent} に出力しました (概要: {summary_path.name})。", "info")
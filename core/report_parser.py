@@ -0,0 +1,84 @@
+# このファイルは report_parser モジュールです。
+# CodebaseAnalyzerAgent が出力する分析レポートを解析するための関数をここに配置します。
+# Streamlit に依存しないため、UI とヘッドレス実行の両方から利用できます。
+
+import logging
+import re
+from typing import Callable, List, Optional, Tuple
+
+from .profiler import profiled
+
+logger = logging.getLogger(__name__)
+
+LogFunc = Callable[[str, str], None]
+
+
+def log_with_logger(message: str, level: str = "info") -> None:
+    """
+    LogFunc のデフォルト実装です。レベルに応じて logging に出力します。
+    """
+    if level == "error":
+        logger.error(message)
+    elif level == "warning":
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+
+@profiled("report_parsing")
+def parse_api_endpoints_from_report(analysis_report_text: str, log: Optional[LogFunc] = None) -> List[Tuple[str, str]]:
+    """
+    CodebaseAnalyzerAgentの分析レポートからAPIエンドポイントのリストを抽出します。
+    各APIの識別子 (例: "GET /api/users/{id}") と詳細情報ブロックをタプルで返します。
+
+    Args:
+        analysis_report_text (str): 分析レポート。
+        log (Optional[LogFunc]): メッセージ出力先 (message, level)。省略時は logging に出力します。
+
+    Returns:
+        List[Tuple[str, str]]: (API識別子, APIブロック) のリスト。
+    """
+    log = log or log_with_logger
+    api_endpoints = []
+    try:
+        api_list_match = re.search(r"API_LIST_START(.*?)API_LIST_END", analysis_report_text, re.DOTALL)
+        if api_list_match:
+            api_content = api_list_match.group(1).strip()
+            # "### API X:" または "### API X (追加情報):" のようなパターンで分割
+            # 各APIブロックは "### API" で始まる想定
+            raw_apis = re.split(r"(?=### API\s*\d*[:\s])", api_content)
+            for api_block in raw_apis:
+                api_block = api_block.strip()
+                if not api_block.startswith("### API"):
+                    continue
+
+                title_match = re.search(r"###\s*(API\s*\d*[:\s]*.*?)\n", api_block, re.IGNORECASE)
+                api_title = title_match.group(1).strip() if title_match else f"API Endpoint {len(api_endpoints) + 1}"
+
+                http_method_match = re.search(r"-\s*HTTPメソッド\s*:\s*(.+)", api_block, re.IGNORECASE)
+                path_match = re.search(r"-\s*パス\s*:\s*(.+)", api_block, re.IGNORECASE)
+
+                identifier = api_title # デフォルト
+                if http_method_match and path_match:
+                    identifier = f"{http_method_match.group(1).strip()} {path_match.group(1).strip()}"
+
+                api_endpoints.append((identifier, api_block))
+
+        if not api_endpoints and "API_LIST_START" in analysis_report_text:
+            log("API_LIST_START/ENDブロックは検出されましたが、個別のAPI情報を抽出できませんでした。CodebaseAnalyzerAgentの出力形式を確認してください。", "warning")
+        elif not api_endpoints:
+            log("分析レポート内にAPI_LIST_START/ENDブロックが見つかりませんでした。APIは検出されなかった可能性があります。", "info")
+
+    except Exception as e:
+        log(f"APIエンドポイントの解析中にエラーが発生しました: {e}", "error")
+    return api_endpoints
+
+
+@profiled("report_parsing")
+def extract_entity_section(analysis_report_text: str) -> str:
+    """
+    分析レポートから DB_ENTITY_LIST_START ～ DB_ENTITY_LIST_END の範囲を抽出します。
+    見つからない場合は空文字列を返します。
+    """
+    match = re.search(r"DB_ENTITY_LIST_START(.*?)DB_ENTITY_LIST_END", analysis_report_text or "", re.DOTALL)
+    return match.group(1).strip() if match else ""
@@ -0,0 +1,140 @@
+# このファイルは single_flight モジュールです。
+# 同じコードベース・同じ設定に対する分析が複数のセッションから同時に要求された場合に、
+# 実際のパイプライン実行を1回にまとめる (single-flight) ための仕組みを提供します。
+# Streamlit サーバーは全セッションで1つのプロセスを共有するため、モジュールレベルのコーディネータが
+# プロセス全体で共有されます。
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .source_loader import get_source_loader
+
+DEFAULT_RESULT_TTL_SECONDS = 900
+
+
+def fingerprint_codebase(codebase_path: str, java_files: List[Path]) -> str:
+    """
+    コードベースの内容に基づくフィンガープリントを返します。
+    ルートからの相対パスとファイル内容のハッシュから計算するため、別の場所にチェックアウトされた
+    同じコミットでも同じ値になります。内容のハッシュは共有ソースローダーが並列に計算し、
+    (パス, 更新時刻, サイズ) ごとにキャッシュします。
+    """
+    root = Path(codebase_path)
+    digest = hashlib.sha256()
+    sorted_files = sorted(java_files, key=lambda p: str(p))
+    content_hashes = get_source_loader().content_hashes(sorted_files)
+    for file_path, content_hash in zip(sorted_files, content_hashes):
+        try:
+            relative = file_path.relative_to(root).as_posix()
+        except ValueError:
+            relative = file_path.as_posix()
+        digest.update(f"{relative}\0{content_hash}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def fingerprint_config(app_config: Dict[str, Any]) -> str:
+    """
+    設定 (モデル設定・プロンプトを含む) 全体のハッシュを返します。
+    """
+    serialized = json.dumps(app_config or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    キーごとに処理の実行を1回にまとめるコーディネータ。
+
+    - 同じキーの処理が実行中であれば、新しい呼び出しはその完了を待って同じ結果を受け取ります。
+    - 完了済みで有効期限内の結果があれば、処理を実行せずにその結果を返します。
+    - 結果をキャッシュするかどうかは cache_if で判定します (失敗した結果は再利用しない、など)。
+    """
+    def __init__(self, result_ttl_seconds: float = DEFAULT_RESULT_TTL_SECONDS):
+        self.result_ttl_seconds = result_ttl_seconds
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._completed: Dict[str, Tuple[float, Any]] = {}
+
+    def run(self, key: str, func: Callable[[], Any],
+            cache_if: Optional[Callable[[Any], bool]] = None,
+            on_join: Optional[Callable[[str], None]] = None) -> Tuple[Any, str]:
+        """
+        キーに対応する処理を実行するか、実行中・完了済みの結果を再利用します。
+
+        Args:
+            key (str): 重複判定に使うキー。
+            func (Callable[[], Any]): 実際の処理。
+            cache_if (Optional[Callable[[Any], bool]]): 結果を完了済みとして保持するかを判定する関数。省略時は常に保持します。
+            on_join (Optional[Callable[[str], None]]): 既存の処理・結果を再利用する場合に、役割 ("joined" / "cached") を引数に呼ばれます。
+
+        Returns:
+            Tuple[Any, str]: (結果, 役割)。役割は "leader" (自分で実行)、"joined" (実行中の処理に合流)、"cached" (完了済み結果を再利用)。
+                             leader 以外にはそれぞれ独立したコピーが返されます。
+        """
+        with self._lock:
+            self._evict_expired()
+            if key in self._completed:
+                if on_join:
+                    on_join("cached")
+                return deepcopy(self._completed[key][1]), "cached"
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            if on_join:
+                on_join("joined")
+            return deepcopy(future.result()), "joined"
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if cache_if is None or cache_if(result):
+                self._completed[key] = (time.monotonic(), deepcopy(result))
+        future.set_result(result)
+        return result, "leader"
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, (finished_at, _) in self._completed.items() if now - finished_at > self.result_ttl_seconds]
+        for k in expired:
+            del self._completed[k]
+
+
+_COORDINATOR: Optional[SingleFlight] = None
+_COORDINATOR_LOCK = threading.Lock()
+
+
+def get_coordinator(result_ttl_seconds: Optional[float] = None) -> SingleFlight:
+    """
+    プロセス全体で共有される SingleFlight を返します。
+    result_ttl_seconds が指定された場合は、共有インスタンスの有効期限を更新します。
+    """
+    global _COORDINATOR
+    with _COORDINATOR_LOCK:
+        if _COORDINATOR is None:
+            _COORDINATOR = SingleFlight(result_ttl_seconds or DEFAULT_RESULT_TTL_SECONDS)
+        elif result_ttl_seconds is not None:
+            _COORDINATOR.result_ttl_seconds = result_ttl_seconds
+        return _COORDINATOR
+
+
+def analysis_request_key(codebase_path: str, java_files: List[Path], app_config: Dict[str, Any]) -> str:
+    """
+    分析リクエストの重複判定キー (コードベースのフィンガープリント + 設定・プロンプトのハッシュ) を返します。
+    """
+    return f"{fingerprint_codebase(codebase_path, java_files)}:{fingerprint_config(app_config)}"
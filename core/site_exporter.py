@@ -0,0 +1,598 @@
+# このファイルは site_exporter モジュールです。
+# 生成された設計書 (プロジェクト概要・API設計書・DB設計書) から、サーバー不要で閲覧できる静的HTMLサイトを出力します。
+# - Markdown は外部ライブラリを使わない最小限のレンダラーでHTMLに変換します (Mermaid はブラウザ側で描画)。
+# - 全文検索用の転置インデックスを JavaScript ファイルとして事前に生成します (日本語は文字 bi-gram)。
+#   file:// で開いても読み込めるよう、JSON ではなく <script> で読み込む形式にしています。
+# - APIとエンティティの間に相互リンクを張ります。
+# - ページごとの内容ハッシュをマニフェストに記録し、変更されたページだけを書き直します。
+
+import hashlib
+import html
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from .file_utils import sanitize_filename, write_text_atomic
+from .report_parser import LogFunc, log_with_logger
+
+logger = logging.getLogger(__name__)
+
+# レンダラーやテンプレートを変更した場合は上げる (全ページが再生成されます)
+RENDERER_VERSION = "1"
+MANIFEST_FILE_NAME = ".site_manifest.json"
+
+DEFAULT_SITE_SETTINGS = {
+    "site_title": "設計書",
+    "output_subdir": "site",
+    "mermaid_script_url": "https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.esm.min.mjs",
+    "snippet_chars": 160,
+}
+
+# --- 検索用のトークン化 (assets/search.js の tokenize と同じ規則) ---
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_WORD_PART = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+_CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]+")
+
+
+def tokenize_for_search(text: str) -> List[str]:
+    """
+    検索インデックス用にテキストをトークンに分割します。
+    英数字は単語 (2文字以上) と、キャメルケースを分割した部分を、日本語 (かな・漢字) は文字 bi-gram をトークンとします。
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        if len(lowered) >= 2:
+            tokens.append(lowered)
+        for part in _WORD_PART.findall(word):
+            part = part.lower()
+            if len(part) >= 2 and part != lowered:
+                tokens.append(part)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+# --- Markdown レンダラー ---
+_FENCE = re.compile(r"^\s*```\s*([\w+-]*)\s*$")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_HR = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_TABLE_HEADING = re.compile(r"テーブル名\s*[:：]\s*`?([\w\-]+)")
+_CODE_SPAN = re.compile(r"(`+)(.+?)\1")
+# リンク先は括弧を1段まで含められる (例: https://example.com/a_(b))
+_LINK = re.compile(r"\[([^\]]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)")
+_URL_SCHEME = re.compile(r"^([A-Za-z][A-Za-z0-9+.\-]*):")
+# 設計書はLLMが分析対象のソースコードから生成したもの (信頼できない入力) のため、
+# javascript: などのスキームのリンクは出力しない
+_SAFE_URL_SCHEMES = ("http", "https", "mailto")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ITALIC = re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])")
+
+
+def table_anchor(name: str) -> str:
+    return "table-" + re.sub(r"[^\w\-]", "_", name.lower())
+
+
+def _safe_href(url: str) -> Optional[str]:
+    """
+    リンク先が相対パス・ページ内アンカー (#) ・http(s)・mailto の場合は href 属性の値を、それ以外は None を返します。
+    """
+    scheme = _URL_SCHEME.match(url)
+    if scheme and scheme.group(1).lower() not in _SAFE_URL_SCHEMES:
+        return None
+    return url.replace('"', "&quot;")
+
+
+def _render_link(match: re.Match, protect: Callable) -> str:
+    href = _safe_href(match.group(2))
+    if href is None:
+        return match.group(0)  # 許可しないスキームのリンクは地の文として表示する
+    return protect(f'<a href="{href}">{match.group(1)}</a>')
+
+
+def _render_inline(text: str, linker: Optional[Callable] = None) -> str:
+    """
+    インライン要素 (コード・リンク・強調) をHTMLに変換します。linker はコードとリンク以外の地の文に適用されます。
+    """
+    protected: List[str] = []
+
+    def protect(fragment: str) -> str:
+        protected.append(fragment)
+        return f"\x00{len(protected) - 1}\x00"
+
+    def render_plain(segment: str) -> str:
+        segment = html.escape(segment, quote=False)
+        segment = _LINK.sub(lambda m: _render_link(m, protect), segment)
+        if linker:
+            segment = linker(segment, protect)
+        segment = _BOLD.sub(r"<strong>\1</strong>", segment)
+        return _ITALIC.sub(r"<em>\1</em>", segment)
+
+    parts, last = [], 0
+    for match in _CODE_SPAN.finditer(text):
+        parts.append(render_plain(text[last:match.start()]))
+        parts.append(protect(f"<code>{html.escape(match.group(2).strip())}</code>"))
+        last = match.end()
+    parts.append(render_plain(text[last:]))
+    rendered = "".join(parts)
+    return re.sub(r"\x00(\d+)\x00", lambda m: protected[int(m.group(1))], rendered)
+
+
+def _split_table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r"(?<!\\)\|", line)]
+
+
+def render_markdown(markdown_text: str, linker: Optional[Callable] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Markdown をHTMLに変換します。設計書で使われる範囲 (見出し・段落・リスト・表・引用・コードブロック・Mermaid) に対応します。
+
+    Args:
+        markdown_text (str): 変換するMarkdown。
+        linker (Optional[Callable]): 地の文に相互リンクを挿入する関数 (text, protect) -> text。
+
+    Returns:
+        Tuple[str, List[Dict[str, Any]]]: (HTML, 見出しのリスト [{"level", "text", "id"}])。
+    """
+    lines = (markdown_text or "").splitlines()
+    out: List[str] = []
+    headings: List[Dict[str, Any]] = []
+    paragraph: List[str] = []
+    used_ids: Dict[str, int] = {}
+    i = 0
+
+    def flush_paragraph() -> None:
+        if paragraph:
+            out.append("<p>" + "<br>\n".join(_render_inline(line.strip(), linker) for line in paragraph) + "</p>")
+            paragraph.clear()
+
+    def unique_id(base: str) -> str:
+        count = used_ids.get(base, 0)
+        used_ids[base] = count + 1
+        return base if count == 0 else f"{base}-{count}"
+
+    while i < len(lines):
+        line = lines[i]
+        fence = _FENCE.match(line)
+        if fence:
+            flush_paragraph()
+            language = fence.group(1).lower()
+            code_lines = []
+            i += 1
+            while i < len(lines) and not _FENCE.match(lines[i]):
+                code_lines.append(lines[i])
+                i += 1
+            i += 1 # 閉じフェンス
+            code = html.escape("\n".join(code_lines))
+            if language == "mermaid":
+                out.append(f'<pre class="mermaid">{code}</pre>')
+            else:
+                css_class = f' class="language-{language}"' if language else ""
+                out.append(f"<pre><code{css_class}>{code}</code></pre>")
+            continue
+
+        if not line.strip():
+            flush_paragraph()
+            i += 1
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            flush_paragraph()
+            level, text = len(heading.group(1)), heading.group(2)
+            table = _TABLE_HEADING.search(text)
+            anchor = unique_id(table_anchor(table.group(1)) if table else f"sec-{len(headings) + 1}")
+            headings.append({"level": level, "text": text, "id": anchor})
+            out.append(f'<h{level} id="{anchor}">{_render_inline(text)}</h{level}>')
+            i += 1
+            continue
+
+        if _HR.match(line):
+            flush_paragraph()
+            out.append("<hr>")
+            i += 1
+            continue
+
+        if line.lstrip().startswith("|") and i + 1 < len(lines) and _TABLE_SEPARATOR.match(lines[i + 1]):
+            flush_paragraph()
+            header = _split_table_row(line)
+            rows = []
+            i += 2
+            while i < len(lines) and lines[i].lstrip().startswith("|"):
+                rows.append(_split_table_row(lines[i]))
+                i += 1
+            out.append("<table><thead><tr>" + "".join(f"<th>{_render_inline(c, linker)}</th>" for c in header) + "</tr></thead><tbody>")
+            for row in rows:
+                out.append("<tr>" + "".join(f"<td>{_render_inline(c, linker)}</td>" for c in row) + "</tr>")
+            out.append("</tbody></table>")
+            continue
+
+        if line.lstrip().startswith(">"):
+            flush_paragraph()
+            quoted = []
+            while i < len(lines) and lines[i].lstrip().startswith(">"):
+                quoted.append(re.sub(r"^\s*>\s?", "", lines[i]))
+                i += 1
+            inner, _ = render_markdown("\n".join(quoted), linker)
+            out.append(f"<blockquote>{inner}</blockquote>")
+            continue
+
+        if _LIST_ITEM.match(line):
+            flush_paragraph()
+            stack: List[Tuple[int, str]] = [] # (インデント幅, "ul" / "ol")
+            while i < len(lines):
+                item = _LIST_ITEM.match(lines[i])
+                if not item:
+                    # リスト項目の続きの行 (インデントされた行) は直前の項目に含める
+                    if lines[i].strip() and lines[i].startswith((" ", "\t")) and stack:
+                        out[-1] = out[-1][:-len("</li>")] + "<br>" + _render_inline(lines[i].strip(), linker) + "</li>"
+                        i += 1
+                        continue
+                    break
+                indent = len(item.group(1).expandtabs(4))
+                tag = "ol" if item.group(2)[0].isdigit() else "ul"
+                while stack and (indent < stack[-1][0] or (indent == stack[-1][0] and tag != stack[-1][1])):
+                    closed = stack.pop()[1]
+                    out.append(f"</{closed}>" + ("</li>" if stack else ""))
+                if not stack or indent > stack[-1][0]:
+                    if stack:
+                        out[-1] = out[-1][:-len("</li>")] # 入れ子のリストは親の項目の中に入れる
+                    stack.append((indent, tag))
+                    out.append(f"<{tag}>")
+                out.append(f"<li>{_render_inline(item.group(3), linker)}</li>")
+                i += 1
+            while stack:
+                closed = stack.pop()[1]
+                out.append(f"</{closed}>" + ("</li>" if stack else ""))
+            continue
+
+        paragraph.append(line)
+        i += 1
+
+    flush_paragraph()
+    return "\n".join(out), headings
+
+
+def _plain_text(markdown_text: str) -> str:
+    text = re.sub(r"```.*?```", " ", markdown_text or "", flags=re.DOTALL)
+    text = re.sub(r"[#>*`|\-]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# --- 相互リンク ---
+def extract_entity_names(db_document: str) -> Dict[str, str]:
+    """
+    DB設計書から、エンティティ名 (テーブル名・クラス名) -> テーブル定義の見出しのアンカー を返します。
+    """
+    names: Dict[str, str] = {}
+    current_anchor = None
+    for line in (db_document or "").splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            table = _TABLE_HEADING.search(heading.group(2))
+            current_anchor = table_anchor(table.group(1)) if table else None
+            if table:
+                names.setdefault(table.group(1), current_anchor)
+            continue
+        class_match = re.search(r"クラス名\**\s*[:：]\s*`?([\w.]+)", line)
+        if class_match and current_anchor:
+            names.setdefault(class_match.group(1).split(".")[-1], current_anchor)
+    return {name: anchor for name, anchor in names.items() if re.match(r"^[A-Za-z_][\w\-]*$", name)}
+
+
+def _entity_pattern(names: List[str]) -> Optional["re.Pattern"]:
+    if not names:
+        return None
+    # 日本語の文字は \w に含まれるため、境界は英数字だけで判定する ("Userテーブル" の User にもリンクする)
+    alternation = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(rf"(?<![A-Za-z0-9_])({alternation})(?![A-Za-z0-9_])")
+
+
+def _make_entity_linker(pattern: Optional["re.Pattern"], entity_anchors: Dict[str, str], db_href: str):
+    if pattern is None:
+        return None
+
+    def linker(text: str, protect: Callable[[str], str]) -> str:
+        return pattern.sub(lambda m: protect(f'<a class="xref" href="{db_href}#{entity_anchors[m.group(1)]}">{m.group(1)}</a>'), text)
+
+    return linker
+
+
+# --- ページとアセット ---
+_STYLE_CSS = """body{font-family:-apple-system,"Hiragino Sans","Noto Sans JP",sans-serif;margin:0;color:#222;line-height:1.6}
+header{position:sticky;top:0;background:#1f2937;color:#fff;padding:.5rem 1rem;display:flex;gap:1rem;align-items:center;flex-wrap:wrap}
+header a{color:#fff;text-decoration:none;font-weight:600}
+#search{margin-left:auto;padding:.3rem .5rem;width:18rem;max-width:100%}
+#search-results{position:absolute;right:1rem;top:2.8rem;background:#fff;color:#222;width:28rem;max-width:95vw;max-height:70vh;overflow:auto;box-shadow:0 4px 16px rgba(0,0,0,.2)}
+#search-results a{display:block;padding:.4rem .6rem;border-bottom:1px solid #eee;color:#1d4ed8;font-weight:400}
+#search-results small{display:block;color:#555}
+main{max-width:60rem;margin:0 auto;padding:1rem 1.5rem 4rem}
+table{border-collapse:collapse;margin:.5rem 0}th,td{border:1px solid #ccc;padding:.25rem .5rem;vertical-align:top}
+pre{background:#f5f5f5;padding:.75rem;overflow:auto}pre.mermaid{background:#fff}
+code{background:#f2f2f2;padding:0 .2rem}a.xref{color:#047857}
+blockquote{border-left:4px solid #ddd;margin:0;padding:0 1rem;color:#555}
+"""
+
+_SEARCH_JS = r"""(function () {
+  var WORD = /[A-Za-z0-9_]+/g, PART = /[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+/g;
+  var CJK = /[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]+/g;
+  function tokenize(text) {
+    var out = [];
+    (text.match(WORD) || []).forEach(function (word) {
+      var lowered = word.toLowerCase();
+      if (lowered.length >= 2) out.push(lowered);
+      (word.match(PART) || []).forEach(function (part) {
+        part = part.toLowerCase();
+        if (part.length >= 2 && part !== lowered) out.push(part);
+      });
+    });
+    (text.match(CJK) || []).forEach(function (run) {
+      if (run.length === 1) out.push(run);
+      for (var i = 0; i + 1 < run.length; i++) out.push(run.substr(i, 2));
+    });
+    return out;
+  }
+  function lowerBound(keys, prefix) {
+    var lo = 0, hi = keys.length;
+    while (lo < hi) { var mid = (lo + hi) >> 1; if (keys[mid] < prefix) lo = mid + 1; else hi = mid; }
+    return lo;
+  }
+  function docsFor(index, token) {
+    var found = {}, ascii = /^[a-z0-9_]+$/.test(token);
+    for (var i = lowerBound(index.keys, token); i < index.keys.length; i++) {
+      var key = index.keys[i];
+      if (key === token || (ascii && key.lastIndexOf(token, 0) === 0)) {
+        index.postings[i].forEach(function (id) { found[id] = true; });
+      } else break;
+    }
+    return found;
+  }
+  function search(query) {
+    var index = window.SEARCH_INDEX, tokens = tokenize(query), result = null;
+    if (!index || !tokens.length) return [];
+    tokens.forEach(function (token) {
+      var docs = docsFor(index, token);
+      if (result === null) { result = docs; return; }
+      Object.keys(result).forEach(function (id) { if (!docs[id]) delete result[id]; });
+    });
+    var q = query.toLowerCase();
+    return Object.keys(result || {}).map(Number).sort(function (a, b) {
+      var ta = index.docs[a][0].toLowerCase().indexOf(q) >= 0 ? 0 : 1;
+      var tb = index.docs[b][0].toLowerCase().indexOf(q) >= 0 ? 0 : 1;
+      return ta - tb || a - b;
+    }).slice(0, 30);
+  }
+  function escape(text) {
+    return text.replace(/[&<>"]/g, function (c) { return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c]; });
+  }
+  document.addEventListener("DOMContentLoaded", function () {
+    var input = document.getElementById("search"), box = document.getElementById("search-results");
+    if (!input || !box) return;
+    var root = input.getAttribute("data-root") || "";
+    input.addEventListener("input", function () {
+      var ids = search(input.value.trim());
+      box.innerHTML = ids.map(function (id) {
+        var doc = window.SEARCH_INDEX.docs[id];
+        return '<a href="' + root + doc[1] + '">' + escape(doc[0]) + "<small>" + escape(doc[2]) + "</small></a>";
+      }).join("");
+    });
+  });
+})();
+"""
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} - {site_title}</title>
+<link rel="stylesheet" href="{root}assets/style.css">
+</head>
+<body>
+<header>
+<a href="{root}index.html">{site_title}</a>
+<a href="{root}database.html">DB設計書</a>
+<input id="search" type="search" placeholder="検索 (API・エンティティ・本文)" data-root="{root}" autocomplete="off">
+<div id="search-results"></div>
+</header>
+<main>
+{body}
+</main>
+<script src="{root}assets/search_index.js"></script>
+<script src="{root}assets/search.js"></script>
+{mermaid_script}
+</body>
+</html>
+"""
+
+
+def _page_html(title: str, body: str, root: str, settings: Dict[str, Any]) -> str:
+    mermaid_script = ""
+    if settings.get("mermaid_script_url") and '<pre class="mermaid">' in body:
+        mermaid_script = (f'<script type="module">import mermaid from "{settings["mermaid_script_url"]}";'
+                          'mermaid.initialize({startOnLoad: true});</script>')
+    return _PAGE_TEMPLATE.format(title=html.escape(title), site_title=html.escape(settings["site_title"]),
+                                 root=root, body=body, mermaid_script=mermaid_script)
+
+
+def api_page_path(identifier: str) -> str:
+    """
+    API設計書のページのパス (サイトのルートからの相対パス) を返します。
+    ファイル名の衝突を避けるため、識別子のハッシュを付けます。
+    """
+    digest = hashlib.sha1(identifier.encode("utf-8")).hexdigest()[:8]
+    return f"api/{sanitize_filename(identifier)[:80]}-{digest}.html"
+
+
+def _href(path: str) -> str:
+    return quote(path, safe="/#")
+
+
+def _content_hash(*parts: str) -> str:
+    digest = hashlib.sha256(RENDERER_VERSION.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0")
+        digest.update((part or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_manifest(output_dir: Path) -> Dict[str, Any]:
+    try:
+        manifest = json.loads((output_dir / MANIFEST_FILE_NAME).read_text(encoding="utf-8"))
+        return manifest if manifest.get("version") == RENDERER_VERSION else {"pages": {}}
+    except (OSError, ValueError):
+        return {"pages": {}}
+
+
+def export_static_site(project_overview: str, api_documents: Dict[str, str], db_document: str,
+                       output_dir: Path, site_settings: Optional[Dict[str, Any]] = None,
+                       log: Optional[LogFunc] = None) -> Dict[str, Any]:
+    """
+    設計書一式を静的HTMLサイトとして出力します。前回の出力から内容が変わったページだけを書き直します。
+
+    Args:
+        project_overview (str): プロジェクト概要のMarkdown。
+        api_documents (Dict[str, str]): API識別子 -> API設計書のMarkdown。"⚠️" で始まる (生成に失敗した) ものは除きます。
+        db_document (str): データベース設計書のMarkdown。
+        output_dir (Path): 出力先ディレクトリ。
+        site_settings (Optional[Dict[str, Any]]): app_config.yaml の site_settings。
+        log (Optional[LogFunc]): 進捗メッセージの出力先 (message, level)。
+
+    Returns:
+        Dict[str, Any]: {"pages", "written", "unchanged", "removed", "seconds", "index_path"}
+    """
+    log = log or log_with_logger
+    started = time.perf_counter()
+    settings = dict(DEFAULT_SITE_SETTINGS)
+    settings.update(site_settings or {})
+    output_dir = Path(output_dir)
+
+    api_documents = {identifier: doc for identifier, doc in (api_documents or {}).items()
+                     if isinstance(doc, str) and doc and not doc.startswith("⚠️")}
+    has_db = bool(db_document) and isinstance(db_document, str) and not db_document.startswith("⚠️")
+    db_document = db_document if has_db else ""
+
+    entity_anchors = extract_entity_names(db_document)
+    entity_pattern = _entity_pattern(list(entity_anchors))
+    # 相互リンクの対象が変わった場合は、リンクを含む全ページを書き直す必要がある
+    link_key = json.dumps(entity_anchors, sort_keys=True, ensure_ascii=False)
+
+    # テーブル名とクラス名は同じアンカーを指すため、一覧ではアンカーごとに1件 (最初に見つかった名前) で表示する
+    anchor_labels: Dict[str, str] = {}
+    for name, anchor in entity_anchors.items():
+        anchor_labels.setdefault(anchor, name)
+    # アンカー -> そのエンティティに言及しているAPI
+    apis_by_anchor: Dict[str, List[str]] = {anchor: [] for anchor in anchor_labels}
+    if entity_pattern:
+        for identifier, doc in api_documents.items():
+            for anchor in sorted({entity_anchors[name] for name in entity_pattern.findall(doc)}):
+                apis_by_anchor[anchor].append(identifier)
+
+    pages: List[Dict[str, Any]] = []
+
+    # トップページ (プロジェクト概要 + API一覧)
+    api_list = "\n".join(f"- [{identifier}]({_href(api_page_path(identifier))})" for identifier in sorted(api_documents))
+    index_markdown = (project_overview or "") + f"\n\n## API設計書 ({len(api_documents)}件)\n\n" + (api_list or "APIは検出されませんでした。")
+    if has_db:
+        index_markdown += "\n\n## データベース設計書\n\n- [データベース設計書](database.html)"
+    pages.append({"path": "index.html", "title": "プロジェクト概要", "markdown": index_markdown,
+                  "search_text": project_overview or "", "root": "", "linked": False})
+
+    for identifier, doc in api_documents.items():
+        markdown = doc
+        mentioned = [anchor for anchor, identifiers in apis_by_anchor.items() if identifier in identifiers]
+        if mentioned:
+            markdown += "\n\n## 関連エンティティ\n\n" + "\n".join(
+                f"- [{anchor_labels[anchor]}](../database.html#{anchor})" for anchor in mentioned)
+        pages.append({"path": api_page_path(identifier), "title": identifier, "markdown": markdown,
+                      "search_text": doc, "root": "../", "linked": True})
+
+    if has_db:
+        markdown = db_document
+        rows = [f"| [{anchor_labels[anchor]}](#{anchor}) | " + ", ".join(
+                    f"[{identifier}]({_href(api_page_path(identifier))})" for identifier in identifiers) + " |"
+                for anchor, identifiers in apis_by_anchor.items() if identifiers]
+        if rows:
+            markdown += "\n\n## エンティティとAPIの対応\n\n| エンティティ | 参照しているAPI |\n|---|---|\n" + "\n".join(rows)
+        pages.append({"path": "database.html", "title": "データベース設計書", "markdown": markdown,
+                      "search_text": db_document, "root": "", "linked": False})
+
+    manifest = _load_manifest(output_dir)
+    previous_pages: Dict[str, str] = manifest.get("pages", {})
+    new_pages: Dict[str, str] = {}
+    written = 0
+    for page in pages:
+        page_hash = _content_hash(page["title"], page["markdown"], settings["site_title"],
+                                  str(settings["mermaid_script_url"]), link_key if page["linked"] else "")
+        new_pages[page["path"]] = page_hash
+        target = output_dir / page["path"]
+        if previous_pages.get(page["path"]) == page_hash and target.exists():
+            continue
+        linker = _make_entity_linker(entity_pattern, entity_anchors, "../database.html") if page["linked"] else None
+        body, _ = render_markdown(page["markdown"], linker)
+        write_text_atomic(target, _page_html(page["title"], body, page["root"], settings))
+        written += 1
+
+    removed = 0
+    for stale in set(previous_pages) - set(new_pages):
+        try:
+            (output_dir / stale).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    # 検索インデックスとアセットは、ページに変更があった場合 (または存在しない場合) だけ作り直す
+    assets_dir = output_dir / "assets"
+    index_path = assets_dir / "search_index.js"
+    if written or removed or not index_path.exists():
+        write_text_atomic(index_path, build_search_index_js(pages, int(settings["snippet_chars"])))
+    for name, content in (("style.css", _STYLE_CSS), ("search.js", _SEARCH_JS)):
+        if not (assets_dir / name).exists() or manifest.get("assets") != _content_hash(_STYLE_CSS, _SEARCH_JS):
+            write_text_atomic(assets_dir / name, content)
+
+    write_text_atomic(output_dir / MANIFEST_FILE_NAME, json.dumps(
+        {"version": RENDERER_VERSION, "pages": new_pages, "assets": _content_hash(_STYLE_CSS, _SEARCH_JS)},
+        ensure_ascii=False, indent=1, sort_keys=True))
+
+    stats = {
+        "pages": len(pages),
+        "written": written,
+        "unchanged": len(pages) - written,
+        "removed": removed,
+        "seconds": time.perf_counter() - started,
+        "index_path": output_dir / "index.html",
+    }
+    log(f"静的サイトを出力しました: {stats['pages']}ページ (更新 {written} / 変更なし {stats['unchanged']} / 削除 {removed})、"
+        f"{stats['seconds']:.2f}秒", "info")
+    return stats
+
+
+def build_search_index_js(pages: List[Dict[str, Any]], snippet_chars: int = 160) -> str:
+    """
+    ページ一覧から全文検索用の転置インデックスを組み立て、window.SEARCH_INDEX に代入する JavaScript を返します。
+
+    形式: {"docs": [[タイトル, URL, 抜粋], ...], "keys": [ソート済みトークン], "postings": [[文書番号, ...], ...]}
+    keys はソート済みのため、ブラウザ側では二分探索で前方一致検索ができます。
+    """
+    postings: Dict[str, List[int]] = {}
+    docs = []
+    for doc_id, page in enumerate(pages):
+        plain = _plain_text(page["search_text"])
+        docs.append([page["title"], page["path"], plain[:snippet_chars]])
+        for token in set(tokenize_for_search(page["title"] + " " + page["search_text"])):
+            postings.setdefault(token, []).append(doc_id)
+    keys = sorted(postings)
+    index = {"docs": docs, "keys": keys, "postings": [postings[key] for key in keys]}
+    return "window.SEARCH_INDEX = " + json.dumps(index, ensure_ascii=False, separators=(",", ":")) + ";\n"
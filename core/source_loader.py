@@ -0,0 +1,260 @@
+# このファイルは source_loader モジュールです。
+# ソースファイルの読み込みを一元化する共有ローダーを提供します。
+# - スレッド数を制限したプールで複数ファイルを並列に読み込みます。
+# - UTF-8 以外 (Shift_JIS / EUC-JP など、古い日本語コードベースに多い) の文字コードを判定し、
+#   判定できない場合も置換文字で読み込むため、文字コードが原因で処理が中断することはありません。
+# - サイズ上限を超えるファイルは先頭だけを読み込み、巨大な自動生成ファイルはメモリマップで読み込みます。
+# - 読み込み結果は (パス, 更新時刻, サイズ) をキーにメモリ上でキャッシュします (件数とバイト数の上限あり)。
+
+import codecs
+import hashlib
+import logging
+import mmap
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_LOADER_SETTINGS = {
+    "max_workers": 8,
+    "max_file_bytes": 2 * 1024 * 1024,
+    "mmap_threshold_bytes": 1024 * 1024,
+    "encodings": ["utf-8", "cp932", "euc_jp", "iso2022_jp"],
+    "cache_max_entries": 20000,
+    "cache_max_bytes": 256 * 1024 * 1024,
+}
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_ISO2022_JP_ESCAPE = re.compile(rb"\x1b\$[@B]")
+
+
+def _japanese_score(text: str) -> int:
+    """
+    デコード結果の「日本語らしさ」を返します。誤ったコーデックで読んだ場合に多く現れる
+    半角カナや私用領域の文字は減点します。
+    """
+    score = 0
+    for ch in text:
+        code = ord(ch)
+        if code < 0x80:
+            continue
+        if 0x3040 <= code <= 0x30FF or 0x4E00 <= code <= 0x9FFF or 0x3000 <= code <= 0x303F or 0xFF01 <= code <= 0xFF5E:
+            score += 2
+        elif 0xFF61 <= code <= 0xFF9F or 0xE000 <= code <= 0xF8FF:
+            score -= 3
+        else:
+            score -= 1
+    return score
+
+
+def decode_source_bytes(data: bytes, encodings: Iterable[str], truncated: bool = False) -> Tuple[str, str]:
+    """
+    バイト列を文字列にデコードし、(テキスト, 使用した文字コード) を返します。
+
+    BOM があればそれに従い、ISO-2022-JP のエスケープシーケンスがあればそれを、なければ UTF-8 を試します。UTF-8 として不正な場合は、候補の文字コードのうち
+    厳密にデコードできたものから最も日本語として自然なものを選びます。
+    どれでもデコードできない場合は UTF-8 で不正なバイトを置換文字にして返します (例外は送出しません)。
+    truncated が True の場合は、末尾で切れたマルチバイト文字を許容します。
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding, errors="replace"), encoding
+
+    def try_decode(encoding: str) -> Optional[str]:
+        # 途中で切り詰めたデータは、末尾のマルチバイト文字が欠けている可能性がある
+        for cut in (range(0, 4) if truncated else (0,)):
+            try:
+                return (data[:len(data) - cut] if cut else data).decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                continue
+        return None
+
+    encodings = list(encodings)
+    # ISO-2022-JP は7ビットのため UTF-8 としてもデコードできてしまう。エスケープシーケンスで先に判定する
+    if "iso2022_jp" in encodings and _ISO2022_JP_ESCAPE.search(data):
+        text = try_decode("iso2022_jp")
+        if text is not None:
+            return text, "iso2022_jp"
+
+    if "utf-8" in encodings or not encodings:
+        text = try_decode("utf-8")
+        if text is not None:
+            return text, "utf-8"
+
+    candidates = []
+    for encoding in encodings:
+        if encoding == "utf-8":
+            continue
+        text = try_decode(encoding)
+        if text is not None:
+            candidates.append((_japanese_score(text), -len(candidates), text, encoding))
+    if candidates:
+        _, _, text, encoding = max(candidates)
+        return text, encoding
+    return data.decode("utf-8", errors="replace"), "utf-8 (置換あり)"
+
+
+class SourceLoader:
+    """
+    ソースファイルを読み込む共有ローダー。スレッドセーフです。
+    """
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        """
+        コンストラクタ。
+
+        Args:
+            settings (Optional[Dict[str, Any]]): app_config.yaml の source_loader 設定。省略した項目は既定値を使います。
+        """
+        self.settings = dict(DEFAULT_SOURCE_LOADER_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if v is not None})
+        # キー -> (値, おおよそのバイト数)
+        self._cache: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=int(self.settings["max_workers"]), thread_name_prefix="source-loader")
+
+    # --- キャッシュ ---
+    def _cache_get(self, key: tuple):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key][0]
+        return None
+
+    def _cache_put(self, key: tuple, value: Any, size: int) -> None:
+        """
+        値をキャッシュします。件数が cache_max_entries、合計が cache_max_bytes を超えた場合は古いものから削除します。
+        """
+        max_bytes = int(self.settings["cache_max_bytes"])
+        if size > max_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                self._cache_bytes -= self._cache.pop(key)[1]
+            self._cache[key] = (value, size)
+            self._cache_bytes += size
+            while len(self._cache) > int(self.settings["cache_max_entries"]) or self._cache_bytes > max_bytes:
+                self._cache_bytes -= self._cache.popitem(last=False)[1][1]
+
+    # --- 読み込み ---
+    def _read_bytes(self, path: Path, size: int, limit: Optional[int]) -> bytes:
+        length = size if limit is None else min(size, limit)
+        if length == 0:
+            return b""
+        with open(path, 'rb') as f:
+            if size >= int(self.settings["mmap_threshold_bytes"]):
+                # 巨大なファイルはメモリマップして必要な範囲だけをコピーする
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[:length]
+            return f.read(length)
+
+    def read_text(self, file_path: Path, max_chars: Optional[int] = None) -> Dict[str, Any]:
+        """
+        ファイルをテキストとして読み込みます。例外は送出せず、失敗した場合は "error" に理由を入れて返します。
+
+        Args:
+            file_path (Path): 読み込むファイル。
+            max_chars (Optional[int]): 返すテキストの最大文字数。
+
+        Returns:
+            Dict[str, Any]: {"path", "text", "encoding", "size", "truncated", "error"}
+                truncated は、サイズ上限または max_chars によって内容の一部だけを返した場合に True。
+        """
+        path = Path(file_path)
+        try:
+            stat = path.stat()
+        except OSError as e:
+            return {"path": path, "text": "", "encoding": None, "size": 0, "truncated": False, "error": str(e)}
+
+        max_bytes = int(self.settings["max_file_bytes"])
+        cache_key = ("text", str(path), stat.st_mtime_ns, stat.st_size, max_bytes)
+        loaded = self._cache_get(cache_key)
+        if loaded is None:
+            try:
+                data = self._read_bytes(path, stat.st_size, max_bytes)
+                size_capped = stat.st_size > max_bytes
+                text, encoding = decode_source_bytes(data, self.settings["encodings"], truncated=size_capped)
+                if encoding not in ("utf-8", "utf-8-sig"):
+                    logger.info(f"{path} を {encoding} として読み込みました。")
+                loaded = {"text": text, "encoding": encoding, "size_capped": size_capped, "error": None}
+            except (OSError, ValueError) as e:
+                loaded = {"text": "", "encoding": None, "size_capped": False, "error": str(e)}
+            self._cache_put(cache_key, loaded, sys.getsizeof(loaded["text"]))
+
+        text = loaded["text"]
+        truncated = loaded["size_capped"]
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars]
+            truncated = True
+        return {"path": path, "text": text, "encoding": loaded["encoding"], "size": stat.st_size,
+                "truncated": truncated, "error": loaded["error"]}
+
+    def read_many(self, file_paths: Iterable[Path], max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        複数のファイルを並列に読み込み、入力と同じ順序で read_text の結果を返します。
+        """
+        return list(self._executor.map(lambda p: self.read_text(p, max_chars=max_chars), list(file_paths)))
+
+    def content_hash(self, file_path: Path) -> str:
+        """
+        ファイル内容全体 (サイズ上限を適用しない) の SHA-256 を返します。(パス, 更新時刻, サイズ) ごとにキャッシュされます。
+        読み込めない場合は "unreadable" を返します。
+        """
+        path = Path(file_path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return "unreadable"
+        cache_key = ("sha256", str(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._cache_get(cache_key)
+        if digest is None:
+            try:
+                digest = hashlib.sha256(self._read_bytes(path, stat.st_size, None)).hexdigest()
+            except (OSError, ValueError):
+                return "unreadable"
+            self._cache_put(cache_key, digest, sys.getsizeof(digest))
+        return digest
+
+    def content_hashes(self, file_paths: Iterable[Path]) -> List[str]:
+        """
+        複数のファイルの content_hash を並列に計算し、入力と同じ順序で返します。
+        """
+        return list(self._executor.map(self.content_hash, list(file_paths)))
+
+
+_LOADER: Optional[SourceLoader] = None
+_LOADER_SETTINGS: Optional[Dict[str, Any]] = None
+_LOADER_LOCK = threading.Lock()
+
+
+def configure_source_loader(settings: Optional[Dict[str, Any]]) -> SourceLoader:
+    """
+    共有ローダーを設定します。設定が前回と同じ場合は既存のローダー (とそのキャッシュ) をそのまま使います。
+    設定が変わった場合は新しいローダーに差し替えます。古いローダーは、他のセッションで実行中のパイプラインが
+    使い続けられるよう停止せず、参照がなくなった時点でスレッドプールごと破棄されます。
+    """
+    global _LOADER, _LOADER_SETTINGS
+    settings = dict(settings or {})
+    with _LOADER_LOCK:
+        if _LOADER is None or settings != _LOADER_SETTINGS:
+            _LOADER = SourceLoader(settings)
+            _LOADER_SETTINGS = settings
+        return _LOADER
+
+
+def get_source_loader() -> SourceLoader:
+    """
+    プロセス全体で共有されるローダーを返します。未設定の場合は既定の設定で作成します。
+    """
+    with _LOADER_LOCK:
+        loader = _LOADER
+    return loader if loader is not None else configure_source_loader(None)
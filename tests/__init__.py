@@ -0,0 +1,2 @@
+# このファイルは tests パッケージの初期化ファイルです。
+# リポジトリのルートから `python -m pytest` で実行します。
@@ -0,0 +1,110 @@
+# テスト共通のフィクスチャです。
+# 小さな Spring Boot 風のコードベースを一時ディレクトリに書き出し、core.java_parser.discover_codebase で解析した結果を返します。
+
+from pathlib import Path
+
+import pytest
+
+from core.java_parser import discover_codebase
+
+SAMPLE_SOURCES = {
+    "User.java": """package com.example;
+@Entity
+@Table(name = "users")
+public class User {
+    @Id private Long id;
+    private String name;
+}
+""",
+    "Order.java": """package com.example;
+@Entity
+@Table(name = "orders")
+public class Order {
+    @Id private Long id;
+    private String name;
+}
+""",
+    "Product.java": """package com.example;
+@Entity
+@Table(name = "products")
+public class Product {
+    @Id private Long id;
+    private java.math.BigDecimal price;
+}
+""",
+    "OrderLine.java": """package com.example;
+@Entity
+@Table(name = "order_lines")
+public class OrderLine {
+    @Id private Long id;
+    private Integer quantity;
+    @ManyToOne private Order order;
+    @ManyToOne private Product product;
+}
+""",
+    "UserController.java": """package com.example;
+@RestController
+@RequestMapping("/api/users")
+public class UserController {
+    @Autowired private UserService userService;
+    @GetMapping("/{id}")
+    public User getUser(@PathVariable Long id) { return userService.findUser(id); }
+    @GetMapping("/search")
+    public List<User> search(@RequestParam String keyword) { return userService.search(keyword); }
+}
+""",
+    "OrderController.java": """package com.example;
+@RestController
+@RequestMapping("/api/orders")
+public class OrderController {
+    @Autowired private OrderService orderService;
+    @GetMapping("/{id}")
+    public Order getOrder(@PathVariable Long id) { return orderService.findOrder(id); }
+}
+""",
+    "ProductController.java": """package com.example;
+@RestController
+@RequestMapping("/api/products")
+public class ProductController {
+    @Autowired private ProductService productService;
+    @GetMapping("/{id}")
+    public Product getProduct(@PathVariable Long id) { return productService.findProduct(id); }
+}
+""",
+    "UserService.java": """package com.example;
+@Service
+public class UserService {
+    @Autowired private UserRepository userRepository;
+    public User findUser(Long id) { return userRepository.findById(id); }
+    public List<User> search(String keyword) { return userRepository.findByNameContaining(keyword); }
+}
+""",
+    "OrderService.java": """package com.example;
+@Service
+public class OrderService {
+    @Autowired private OrderRepository orderRepository;
+    public Order findOrder(Long id) { return orderRepository.findById(id); }
+}
+""",
+    "ProductService.java": """package com.example;
+@Service
+public class ProductService {
+    @Autowired private ProductRepository productRepository;
+    public Product findProduct(Long id) { return productRepository.findById(id); }
+}
+""",
+    "UserRepository.java": "package com.example;\npublic interface UserRepository extends JpaRepository<User, Long> {}\n",
+    "OrderRepository.java": "package com.example;\npublic interface OrderRepository extends JpaRepository<Order, Long> {}\n",
+    "ProductRepository.java": "package com.example;\npublic interface ProductRepository extends JpaRepository<Product, Long> {}\n",
+}
+
+
+@pytest.fixture(scope="session")
+def discovery(tmp_path_factory):
+    source_dir = tmp_path_factory.mktemp("sample_project")
+    java_files = []
+    for name, source in SAMPLE_SOURCES.items():
+        path = Path(source_dir) / name
+        path.write_text(source, encoding="utf-8")
+        java_files.append(path)
+    return discover_codebase(java_files)
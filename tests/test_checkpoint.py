@@ -0,0 +1,99 @@
+# core.checkpoint のテストです。
+
+import json
+
+import pytest
+
+from core.checkpoint import (
+    STATUS_COMPLETED, STATUS_INCOMPLETE, PipelineCheckpoint, checkpoint_directory,
+    find_resumable_run, open_checkpoint,
+)
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {"checkpoint_settings": {"directory": str(tmp_path / "checkpoints")}}
+
+
+def _interrupt(checkpoint):
+    # 強制終了された実行と同じく、別のホストで最後の更新から時間が経った状態にする
+    state_path = checkpoint.run_dir / "state.json"
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    state.update(status="running", owner={"host": "other-host", "pid": 1}, updated_at="2000-01-01T00:00:00")
+    state_path.write_text(json.dumps(state), encoding="utf-8")
+
+
+def test_saved_results_are_restored_on_resume(app_config):
+    checkpoint = open_checkpoint(app_config, "/src/app", "key-1")
+    checkpoint.save_stage("initial_analysis", "分析結果")
+    checkpoint.save_item("api_doc", "GET /api/users", "ユーザー一覧API")
+    checkpoint.record_failure("api_doc", "GET /api/orders", "timeout")
+    checkpoint.finish(STATUS_INCOMPLETE, "一部失敗")
+
+    run = find_resumable_run(app_config, "/src/app")
+    assert run["run_id"] == checkpoint.run_id
+    resumed = open_checkpoint(app_config, "/src/app", "key-1", resume_run_id=run["run_id"])
+    assert resumed.run_id == checkpoint.run_id
+    assert resumed.get_stage("initial_analysis") == "分析結果"
+    assert resumed.items("api_doc") == {"GET /api/users": "ユーザー一覧API"}
+    assert [f["key"] for f in resumed.failures()] == ["GET /api/orders"]
+
+    # 失敗した項目を生成し直すと失敗の記録が消える
+    resumed.save_item("api_doc", "GET /api/orders", "注文一覧API")
+    resumed.finish(STATUS_COMPLETED)
+    assert resumed.failures() == []
+    assert find_resumable_run(app_config, "/src/app") is None
+
+
+def test_request_key_mismatch_discards_stale_results(app_config):
+    checkpoint = open_checkpoint(app_config, "/src/app", "key-1")
+    checkpoint.save_stage("initial_analysis", "古い分析結果")
+    checkpoint.save_item("api_doc", "GET /api/users", "古いAPI設計書")
+    checkpoint.record_failure("api_doc", "GET /api/orders", "timeout")
+    checkpoint.finish(STATUS_INCOMPLETE)
+
+    logs = []
+    resumed = open_checkpoint(app_config, "/src/app", "key-2", resume_run_id=checkpoint.run_id,
+                              log=lambda message, level: logs.append(level))
+    assert logs == ["warning"]
+    assert resumed.get_stage("initial_analysis") is None
+    assert resumed.items("api_doc") == {}
+    assert resumed.failures() == []
+    assert PipelineCheckpoint.load(checkpoint_directory(app_config), checkpoint.run_id).state["request_key"] == "key-2"
+
+
+def test_runs_in_progress_are_not_resumed(app_config):
+    running = open_checkpoint(app_config, "/src/app", "key-1")
+    assert find_resumable_run(app_config, "/src/app") is None
+
+    # 実行中の実行を指定しても、同じディレクトリに書き込まず新しい実行を作成する
+    logs = []
+    other = open_checkpoint(app_config, "/src/app", "key-1", resume_run_id=running.run_id,
+                            log=lambda message, level: logs.append(level))
+    assert other.run_id != running.run_id
+    assert logs == ["warning"]
+
+
+def test_abandoned_runs_on_other_hosts_become_resumable(app_config):
+    checkpoint = open_checkpoint(app_config, "/src/app", "key-1")
+    checkpoint.save_stage("initial_analysis", "分析結果")
+    _interrupt(checkpoint)
+    assert find_resumable_run(app_config, "/src/app")["run_id"] == checkpoint.run_id
+    assert find_resumable_run(app_config, "/src/other") is None
+
+
+def test_legacy_stage_format_is_migrated(app_config):
+    checkpoint = open_checkpoint(app_config, "/src/app", "key-1")
+    state_path = checkpoint.run_dir / "state.json"
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    state["stages"] = {"initial_analysis": "以前の形式の分析結果"}
+    state_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+
+    loaded = PipelineCheckpoint.load(checkpoint_directory(app_config), checkpoint.run_id)
+    assert loaded.get_stage("initial_analysis") == "以前の形式の分析結果"
+    assert json.loads(state_path.read_text(encoding="utf-8"))["stages"] == ["initial_analysis"]
+
+
+def test_disabled_checkpoints_return_none(app_config):
+    app_config["checkpoint_settings"]["enabled"] = False
+    assert open_checkpoint(app_config, "/src/app", "key-1") is None
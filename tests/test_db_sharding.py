@@ -0,0 +1,83 @@
+# core.db_sharding のテストです。サンプルのコードベースは tests/conftest.py の discovery フィクスチャを使います。
+
+from core.db_sharding import cluster_entities, merge_db_sections, plan_db_shards
+from core.mermaid_validator import extract_mermaid_blocks, validate_mermaid
+
+
+def _names(clusters):
+    return [[entity["class_name"] for entity in cluster] for cluster in clusters]
+
+
+def _settings(shard_min_entities, max_entities_per_cluster):
+    return {"db_design_settings": {"shard_min_entities": shard_min_entities,
+                                   "max_entities_per_cluster": max_entities_per_cluster}}
+
+
+def test_small_codebases_are_not_sharded(discovery):
+    assert plan_db_shards({}, discovery["entities"]) is None
+    # クラスタが1つにまとまる場合も分割しない
+    assert plan_db_shards(_settings(3, 4), discovery["entities"]) is None
+
+
+def test_related_entities_share_a_cluster(discovery):
+    clusters = plan_db_shards(_settings(3, 3), discovery["entities"])
+    assert _names(clusters) == [["Order", "Product", "OrderLine"], ["User"]]
+
+
+def test_large_components_are_split_along_relations(discovery):
+    clusters = plan_db_shards(_settings(3, 2), discovery["entities"])
+    # 関連の多い OrderLine から幅優先でたどるため、隣接する Order と同じクラスタに入る
+    assert _names(clusters) == [["OrderLine", "Order"], ["Product"], ["User"]]
+
+
+def test_unrelated_entities_are_packed_together():
+    entities = [{"class_name": name, "relations": []} for name in ("A", "B", "C", "D", "E")]
+    assert _names(cluster_entities(entities, 2)) == [["A", "B"], ["C", "D"], ["E"]]
+
+
+CLUSTER_SECTION = """# データベース設計書
+
+### 1. ER図
+```mermaid
+erDiagram
+    orders ||--o{ order_lines : "order"
+```
+
+### 2. テーブル定義
+#### テーブル名: orders
+| カラム | 型 |
+|---|---|
+| id | Long |
+
+### 3. 状態遷移図
+```mermaid
+stateDiagram-v2
+    [*] --> Ordered
+```
+"""
+
+
+def test_merge_db_sections_builds_one_document(discovery):
+    clusters = plan_db_shards(_settings(3, 3), discovery["entities"])
+    document = merge_db_sections(clusters, [CLUSTER_SECTION, "#### テーブル名: users\n| id | Long |"])
+
+    assert document.startswith("# データベース設計書\n\nエンティティ 4 件を、関連に基づく 2 個のクラスタに分けて生成しました。")
+    assert document.count("# データベース設計書") == 1
+    blocks = [block["code"] for block in extract_mermaid_blocks(document)]
+    # LLMが出力したER図は取り除かれ、全エンティティのER図がローカルで組み立てられる
+    assert len(blocks) == 2
+    assert blocks[0].startswith("erDiagram") and "users {" in blocks[0] and "products ||--o{ order_lines" in blocks[0]
+    assert validate_mermaid(blocks[0]) == []
+    assert blocks[1].startswith("stateDiagram-v2")
+
+    tables = document.index("### 2. テーブル定義")
+    states = document.index("### 3. 状態遷移図")
+    assert tables < document.index("#### テーブル名: orders") < document.index("#### テーブル名: users") < states
+
+
+def test_merge_db_sections_reports_failed_clusters(discovery):
+    clusters = plan_db_shards(_settings(3, 3), discovery["entities"])
+    document = merge_db_sections(clusters, [None, "#### テーブル名: users"])
+    assert "> ⚠️ クラスタ 1 (Order, Product, OrderLine) のテーブル定義の生成に失敗しました。" in document
+    assert "#### テーブル名: users" in document
+    assert "### 3. 状態遷移図" not in document
@@ -0,0 +1,130 @@
+# core.endpoint_families のテストです。サンプルのコードベースは tests/conftest.py の discovery フィクスチャを使います。
+
+import pytest
+
+from core.endpoint_families import (can_substitute_locally, derive_document_locally, plan_endpoint_families,
+                                    subject_translations, substitute_subject)
+from core.local_diagrams import match_local_endpoint
+
+USER_GET = "GET /api/users/{id}"
+USER_SEARCH = "GET /api/users/search"
+ORDER_GET = "GET /api/orders/{id}"
+PRODUCT_GET = "GET /api/products/{id}"
+
+
+def _endpoint(discovery, identifier):
+    return match_local_endpoint(identifier, discovery["endpoints"])
+
+
+# --- plan_endpoint_families ---
+
+def test_endpoints_with_the_same_structure_form_a_family(discovery):
+    plan = plan_endpoint_families({}, [USER_GET, USER_SEARCH, ORDER_GET, PRODUCT_GET], discovery)
+    assert plan["families"] == [[USER_GET, ORDER_GET, PRODUCT_GET]]
+    assert plan["canonical_of"] == {ORDER_GET: USER_GET, PRODUCT_GET: USER_GET}
+
+
+def test_first_identifier_becomes_the_canonical(discovery):
+    plan = plan_endpoint_families({}, [ORDER_GET, USER_GET], discovery)
+    assert plan["canonical_of"] == {USER_GET: ORDER_GET}
+
+
+def test_unknown_endpoints_are_not_grouped(discovery):
+    plan = plan_endpoint_families({}, ["GET /api/unknown/{id}", "GET /api/others/{id}", ORDER_GET], discovery)
+    assert plan == {"families": [], "canonical_of": {}}
+
+
+@pytest.mark.parametrize("app_config", [
+    {"endpoint_family_settings": {"enabled": False}},
+    {"endpoint_family_settings": {"min_family_size": 4}},
+])
+def test_families_can_be_disabled_or_limited(discovery, app_config):
+    plan = plan_endpoint_families(app_config, [USER_GET, ORDER_GET, PRODUCT_GET], discovery)
+    assert plan == {"families": [], "canonical_of": {}}
+
+
+def test_families_require_discovery():
+    assert plan_endpoint_families({}, [USER_GET, ORDER_GET], None) == {"families": [], "canonical_of": {}}
+
+
+def test_local_substitution_requires_the_same_field_layout(discovery):
+    user, order, product = (_endpoint(discovery, identifier) for identifier in (USER_GET, ORDER_GET, PRODUCT_GET))
+    assert can_substitute_locally({}, user, order, discovery)
+    # Product は name ではなく price を持つため、置換だけでは導出できない
+    assert not can_substitute_locally({}, user, product, discovery)
+    assert not can_substitute_locally({"endpoint_family_settings": {"local_substitution": False}}, user, order, discovery)
+
+
+# --- substitute_subject ---
+
+@pytest.mark.parametrize("text, expected", [
+    ("User", "Order"),
+    ("UserController#getUser", "OrderController#getOrder"),
+    ("userService.findUser(id)", "orderService.findOrder(id)"),
+    ("GET /api/users/{id}", "GET /api/orders/{id}"),
+    ("user_id と USER_STATUS", "order_id と ORDER_STATUS"),
+    ("List<UserDto>", "List<OrderDto>"),
+    # 単語の途中の一致は置き換えない
+    ("superuser と username", "superuser と username"),
+])
+def test_substitute_subject_replaces_each_notation(text, expected):
+    assert substitute_subject(text, "User", "Order") == expected
+
+
+def test_substitute_subject_with_multi_word_subjects():
+    text = "OrderItemController GET /api/order-items/{id} order_item_id orderItems"
+    assert substitute_subject(text, "OrderItem", "CartEntry") == \
+        "CartEntryController GET /api/cart-entries/{id} cart_entry_id cartEntries"
+
+
+def test_substitute_subject_masks_when_target_is_none():
+    assert substitute_subject("UserService.findUser", "User", None) == "§Service.find§"
+
+
+def test_subject_translations_include_configured_terms():
+    assert "ユーザー" in subject_translations("User")
+    assert subject_translations("OrderItem", {"item": ["明細行"]})[:1] == ["注文"]
+    assert "明細行" in subject_translations("OrderItem", {"item": ["明細行"]})
+    assert subject_translations("Widget") == []
+
+
+# --- derive_document_locally ---
+
+CANONICAL_DOCUMENT = """# GET /api/users/{id}
+
+## 1. API概要
+`UserController#getUser` は `User` を返します。
+
+## 2. リクエスト仕様
+| パラメータ | 型 |
+|---|---|
+| id | Long |
+"""
+
+
+def test_derive_document_locally_replaces_the_subject(discovery):
+    derived = derive_document_locally(USER_GET, _endpoint(discovery, USER_GET), _endpoint(discovery, ORDER_GET),
+                                      CANONICAL_DOCUMENT)
+    assert derived.startswith("# GET /api/orders/{id}\n\n> この設計書は `GET /api/users/{id}` の設計書から自動生成されました。\n")
+    assert "`OrderController#getOrder` は `Order` を返します。" in derived
+    assert "User" not in derived.split("\n", 3)[3]
+
+
+def test_derive_document_locally_rejects_japanese_prose(discovery):
+    # 「ユーザー」は置換できないため、そのまま導出すると注文のAPIの設計書にユーザーの説明が残ってしまう
+    document = CANONICAL_DOCUMENT.replace("は `User` を返します。", "はユーザー情報を取得します。")
+    assert derive_document_locally(USER_GET, _endpoint(discovery, USER_GET), _endpoint(discovery, ORDER_GET),
+                                   document) is None
+
+
+def test_derive_document_locally_uses_configured_translations(discovery):
+    document = CANONICAL_DOCUMENT.replace("は `User` を返します。", "はアカウント所有者を返します。")
+    user, order = _endpoint(discovery, USER_GET), _endpoint(discovery, ORDER_GET)
+    assert derive_document_locally(USER_GET, user, order, document) is not None
+    assert derive_document_locally(USER_GET, user, order, document, {"user": ["アカウント所有者"]}) is None
+
+
+def test_derive_document_locally_requires_the_path(discovery):
+    document = CANONICAL_DOCUMENT.replace("# GET /api/users/{id}", "# User取得API")
+    assert derive_document_locally(USER_GET, _endpoint(discovery, USER_GET), _endpoint(discovery, ORDER_GET),
+                                   document) is None
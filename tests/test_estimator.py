@@ -0,0 +1,108 @@
+# core.estimator のテストです (見積もりの集計部分。エージェントを読み込む estimate_pipeline は対象外)。
+
+import uuid
+
+import pytest
+
+from core.estimator import DEFAULT_ESTIMATOR_SETTINGS, _apply_prefix_cache, _stage_estimate, format_estimate_markdown
+from core.llm_stats import record_call
+
+SETTINGS = dict(DEFAULT_ESTIMATOR_SETTINGS, seconds_per_output_token=0.01, seconds_per_call_overhead=2.0)
+
+
+def _unobserved_model():
+    # 実測値はプロセス全体で共有されるため、他のテストの記録と混ざらないモデル名を使う
+    return f"estimator-test-{uuid.uuid4().hex[:8]}"
+
+
+def _prompts(model, output_tokens):
+    return [{"label": f"API {i}", "input_tokens": 1000, "output_tokens": tokens, "model": model}
+            for i, tokens in enumerate(output_tokens)]
+
+
+def test_sequential_stage_takes_the_sum_of_all_calls():
+    model = _unobserved_model()
+    stage = _stage_estimate("api_design", model, _prompts(model, [1000, 2000, 3000]), {}, SETTINGS, 1, [])
+    # 1呼び出しあたり 2秒 + 出力トークン × 0.01秒
+    assert stage["wall_seconds"] == pytest.approx(12 + 22 + 32)
+    assert stage["calls"] == 3
+    assert stage["output_tokens"] == 6000
+
+
+@pytest.mark.parametrize("concurrency, expected", [
+    (2, (12 + 12 + 12 + 12) / 2),
+    (4, 12),
+    # 並列数が呼び出し数より多くても、最も長い1呼び出しより短くはならない
+    (10, 12),
+])
+def test_parallel_stage_divides_the_total_by_the_lanes(concurrency, expected):
+    model = _unobserved_model()
+    stage = _stage_estimate("db_design", model, _prompts(model, [1000] * 4), {}, SETTINGS, concurrency, [])
+    assert stage["wall_seconds"] == pytest.approx(expected)
+
+
+def test_parallel_stage_is_bounded_by_the_longest_call():
+    model = _unobserved_model()
+    stage = _stage_estimate("db_design", model, _prompts(model, [10000, 100, 100]), {}, SETTINGS, 3, [])
+    assert stage["wall_seconds"] == pytest.approx(102)
+
+
+def test_observed_latency_replaces_the_defaults_without_overhead():
+    model = _unobserved_model()
+    for _ in range(3):
+        record_call("api_design", model, 1000, 500, 2.5)
+    stage = _stage_estimate("api_design", model, _prompts(model, [1000, 1000]), {}, SETTINGS, 1, [])
+    # 実測値 (0.005秒/トークン) は待ち時間を含むため、呼び出しごとの固定時間は加えない
+    assert stage["seconds_per_output_token"] == pytest.approx(0.005)
+    assert stage["wall_seconds"] == pytest.approx(10)
+
+
+def test_cost_uses_the_routed_model_and_cached_input_price():
+    cheap, strong = _unobserved_model(), _unobserved_model()
+    app_config = {"model_pricing": {
+        cheap: {"input_per_1m_tokens": 1.0, "cached_input_per_1m_tokens": 0.5, "output_per_1m_tokens": 2.0},
+        strong: {"input_per_1m_tokens": 10.0, "output_per_1m_tokens": 20.0},
+    }}
+    prompts = [
+        {"label": "A", "input_tokens": 1_000_000, "cached_tokens": 500_000, "output_tokens": 1_000_000, "model": cheap},
+        {"label": "B", "input_tokens": 1_000_000, "cached_tokens": 500_000, "output_tokens": 0, "model": strong},
+    ]
+    stage = _stage_estimate("api_design", cheap, prompts, app_config, SETTINGS, 1, [])
+    # キャッシュ入力の料金がないモデルは通常の入力料金で計算する
+    assert stage["cost"] == pytest.approx((0.5 + 0.25 + 2.0) + 10.0)
+    assert stage["model"] == ", ".join(sorted([cheap, strong]))
+
+
+def test_context_window_overflow_is_reported():
+    model = _unobserved_model()
+    warnings = []
+    _stage_estimate("api_design", model, _prompts(model, [5000]), {"model_context_windows": {model: {"context": 4000, "max_output": 8000}}},
+                    SETTINGS, 1, warnings)
+    assert len(warnings) == 1 and "コンテキストウィンドウ" in warnings[0]
+
+
+def test_prefix_cache_applies_only_above_the_minimum():
+    shared = "共通の指示" * 300
+    texts = [shared + "A", shared + "B", "別の内容"]
+    prompts = [{"label": str(i), "input_tokens": 2000, "output_tokens": 0} for i in range(3)]
+    _apply_prefix_cache(prompts, texts, 100, len, SETTINGS)
+    assert "cached_tokens" not in prompts[0]
+    # 100 + 1500 = 1600 トークンの一致部分は、1024 から 128 単位で切り捨てる
+    assert prompts[1]["cached_tokens"] == 1024 + 128 * 4
+    assert "cached_tokens" not in prompts[2]
+
+
+def test_markdown_total_row_sums_the_stages():
+    model = _unobserved_model()
+    stages = [_stage_estimate("api_design", model, _prompts(model, [1000, 1000]), {}, SETTINGS, 1, []),
+              _stage_estimate("db_design", model, _prompts(model, [1000, 1000]), {}, SETTINGS, 2, [])]
+    estimate = {
+        "model": model, "concurrency": 2, "token_counter": "approx",
+        "discovery": {"java_files": 3, "endpoints": 2, "entities": 2},
+        "stages": stages,
+        "total": {key: sum(s[key] for s in stages) for key in ("calls", "input_tokens", "cached_tokens", "output_tokens", "cost", "wall_seconds")},
+        "warnings": [],
+    }
+    markdown = format_estimate_markdown(estimate)
+    assert "| API設計書 |" in markdown and "| DB設計書 |" in markdown
+    assert "**36秒**" in markdown
@@ -0,0 +1,49 @@
+# core.llm_stats のテストです。
+
+import threading
+
+from core.llm_stats import (current_usage_scope, get_records, observed_seconds_per_output_token, record_call, summarize,
+                             usage_scope)
+
+
+def test_usage_scope_excludes_calls_from_other_threads():
+    with usage_scope() as scope:
+        record_call("api_design", "gpt-4o-mini", 100, 10, 1.0)
+        # 同時に実行される他のセッション (別スレッド) の呼び出しは含めない
+        other = threading.Thread(target=record_call, args=("api_design", "gpt-4o", 500, 50, 2.0))
+        other.start()
+        other.join()
+        # ワーカースレッドは呼び出し元のスコープIDを引き継いで記録する
+        worker = threading.Thread(target=lambda: _record_in(scope))
+        worker.start()
+        worker.join()
+        summary = summarize(get_records(scope=scope))
+    assert summary["total"]["calls"] == 2
+    assert summary["api_design"]["prompt_tokens"] == 100
+    assert summary["db_design"]["prompt_tokens"] == 200
+    assert current_usage_scope() is None
+
+
+def _record_in(scope):
+    with usage_scope(scope):
+        record_call("db_design", "gpt-4o-mini", 200, 20, 1.0)
+
+
+def test_nested_scopes_restore_the_outer_scope():
+    with usage_scope() as outer:
+        with usage_scope() as inner:
+            record_call("document_repair", None, 1, 1, 0.1)
+        assert current_usage_scope() == outer
+        assert get_records(scope=outer) == []
+        assert len(get_records(scope=inner)) == 1
+
+
+def test_observed_latency_does_not_mix_model_families():
+    # 記録はプロセス全体で共有されるため、他のテストと重ならないモデル名を使う
+    for _ in range(3):
+        record_call("api_design", "test-model-mini-2024-07-18", 100, 100, 10.0)
+    assert observed_seconds_per_output_token("test-model") is None
+    assert observed_seconds_per_output_token("test-model-mini") == 0.1
+    for _ in range(3):
+        record_call("api_design", "test-model-2024-08-06", 100, 100, 1.0)
+    assert observed_seconds_per_output_token("test-model") == 0.01
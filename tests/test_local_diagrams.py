@@ -0,0 +1,101 @@
+# core.local_diagrams のテストです。サンプルのコードベースは tests/conftest.py の discovery フィクスチャを使います。
+
+from core.local_diagrams import (SEQUENCE_DIAGRAM_PLACEHOLDER, build_er_diagram, er_diagram_for, inject_diagram,
+                                 sequence_diagram_for)
+from core.mermaid_validator import extract_mermaid_blocks, validate_mermaid
+
+
+def test_er_diagram_lists_tables_and_relations(discovery):
+    diagram = er_diagram_for({}, discovery)
+    assert diagram.splitlines()[:5] == ["erDiagram", "    users {", "        Long id PK", "        String name", "    }"]
+    # ManyToOne は参照先 (1) を左に置く
+    assert '    orders ||--o{ order_lines : "order"' in diagram
+    assert '    products ||--o{ order_lines : "product"' in diagram
+    assert "        BigDecimal price" in diagram
+    assert validate_mermaid(diagram) == []
+
+
+def _entity(class_name, table_name, fields, relations):
+    return {"class_name": class_name, "table_name": table_name, "fields": fields, "relations": relations}
+
+
+def _field(column, java_type, primary_key=False, foreign_key=False):
+    return {"column": column, "type": java_type, "primary_key": primary_key, "foreign_key": foreign_key}
+
+
+def _relation(field, kind, target, mapped_by=None):
+    return {"field": field, "kind": kind, "target": target, "mapped_by": mapped_by, "join_column": None}
+
+
+def test_er_diagram_merges_bidirectional_relations_and_uses_key_types():
+    entities = [
+        _entity("Author", "authors", [_field("id", "UUID", primary_key=True)],
+                [_relation("books", "OneToMany", "Book", mapped_by="author")]),
+        _entity("Book", "books", [_field("id", "Long", primary_key=True), _field("author_id", "Author", foreign_key=True),
+                                  _field("tags", "List<String>")],
+                [_relation("author", "ManyToOne", "Author"), _relation("publisher", "ManyToOne", "Publisher")]),
+    ]
+    diagram = build_er_diagram(entities)
+    assert diagram.count("authors ||--o{ books") == 1
+    # 外部キーの型は参照先の主キーの型、ジェネリクスは外側の型名で表す
+    assert "        UUID author_id FK" in diagram
+    assert "        List tags" in diagram
+    assert "Publisher" not in diagram
+    assert '    Publisher ||--o{ books : "publisher"' in build_er_diagram(entities, include_external=True)
+    assert validate_mermaid(diagram) == []
+
+
+def test_er_diagram_can_be_disabled(discovery):
+    assert er_diagram_for({"diagram_settings": {"local_er_diagram": False}}, discovery) is None
+    assert er_diagram_for({}, {"entities": []}) is None
+
+
+def test_sequence_diagram_follows_the_call_chain(discovery):
+    diagram = sequence_diagram_for({}, "GET /api/users/{userId}", discovery)
+    assert diagram.splitlines() == [
+        "sequenceDiagram",
+        "    participant Client as クライアント",
+        "    participant UserController",
+        "    participant UserService",
+        "    participant UserRepository",
+        "    participant DB as データベース",
+        "    Client->>UserController: GET /api/users/{id}",
+        "    UserController->>UserService: findUser()",
+        "    UserService->>UserRepository: findById()",
+        "    UserRepository->>DB: クエリ実行",
+        "    DB-->>UserRepository: 結果",
+        "    UserRepository-->>UserService: findById の結果",
+        "    UserService-->>UserController: findUser の結果",
+        "    UserController-->>Client: レスポンス (User)",
+    ]
+    assert validate_mermaid(diagram) == []
+
+
+def test_sequence_diagram_escapes_generic_return_types(discovery):
+    diagram = sequence_diagram_for({}, "GET /api/users/search", discovery)
+    assert diagram.endswith("UserController-->>Client: レスポンス (List＜User＞)")
+    assert validate_mermaid(diagram) == []
+
+
+def test_sequence_diagram_requires_a_local_endpoint(discovery):
+    assert sequence_diagram_for({}, "GET /api/unknown", discovery) is None
+    assert sequence_diagram_for({"diagram_settings": {"local_sequence_diagram": False}}, "GET /api/users/{id}",
+                                discovery) is None
+
+
+def test_inject_diagram_replaces_llm_diagrams_and_placeholders():
+    document = (f"## 5. シーケンス図\n{SEQUENCE_DIAGRAM_PLACEHOLDER}\n\n"
+                "```mermaid\nsequenceDiagram\n    A->>B: LLMが書いた図\n```\n## 6. 依存関係\n")
+    injected = inject_diagram(document, "sequenceDiagram\n    A->>B: x", "sequenceDiagram",
+                              SEQUENCE_DIAGRAM_PLACEHOLDER, "シーケンス図", "### シーケンス図")
+    assert [block["code"] for block in extract_mermaid_blocks(injected)] == ["sequenceDiagram\n    A->>B: x"]
+    assert injected.startswith("## 5. シーケンス図\n```mermaid\n")
+
+
+def test_inject_diagram_falls_back_to_the_heading_or_the_end():
+    after_heading = inject_diagram("## 5. シーケンス図\n本文\n", "sequenceDiagram", "sequenceDiagram",
+                                   SEQUENCE_DIAGRAM_PLACEHOLDER, "シーケンス図", "### シーケンス図")
+    assert after_heading == "## 5. シーケンス図\n\n```mermaid\nsequenceDiagram\n```\n\n本文\n"
+    at_end = inject_diagram("## 1. API概要\n", "sequenceDiagram", "sequenceDiagram",
+                            SEQUENCE_DIAGRAM_PLACEHOLDER, "シーケンス図", "### シーケンス図")
+    assert at_end == "## 1. API概要\n\n### シーケンス図\n\n```mermaid\nsequenceDiagram\n```\n"
@@ -0,0 +1,184 @@
+# core.mermaid_validator と、それを使う core.pipeline.validate_and_repair_document のテストです。
+# LLM は呼び出さず、DocumentRepairAgent とユーザープロキシはスタブに置き換えます。
+
+import sys
+import types
+
+import pytest
+
+from core import pipeline
+from core.mermaid_validator import split_mermaid_parts, validate_document, validate_mermaid
+
+VALID_SEQUENCE = """sequenceDiagram
+    participant C as Client
+    participant S as UserController
+    %% コメント行は無視される
+    C->>S: GET /users/{id}
+    alt 見つかった場合
+        S-->>C: 200 OK
+    else 見つからない場合
+        S-->>C: 404 Not Found
+    end
+    Note over C,S: 認証済み
+"""
+
+VALID_ER = """erDiagram
+    USERS ||--o{ ORDERS : places
+    USERS {
+        bigint id PK
+        varchar name "氏名"
+    }
+    ORDERS {
+        bigint id PK
+        bigint user_id FK
+    }
+"""
+
+VALID_STATE = """stateDiagram-v2
+    [*] --> Draft
+    Draft --> Published : publish
+    state Published {
+        [*] --> Visible
+    }
+    Published --> [*]
+"""
+
+
+@pytest.mark.parametrize("code", [VALID_SEQUENCE, VALID_ER, VALID_STATE, "flowchart TD\n    A --> B"])
+def test_valid_diagrams_have_no_errors(code):
+    assert validate_mermaid(code) == []
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("sequenceDiagram\n    C->>S: GET\n    alt ok\n        S-->>C: 200", "'alt' ブロックが 'end' で閉じられていません"),
+    ("sequenceDiagram\n    C->>S: GET\n    end", "対応するブロックのない 'end'"),
+    ("sequenceDiagram\n    else だけ", "'else' に対応する 'alt' ブロックがありません"),
+    ("sequenceDiagram\n    C => S GET", "sequenceDiagram として解釈できない行です"),
+    ("erDiagram\n    USERS {\n        bigint id PK", "'{' が閉じられていません"),
+    ("erDiagram\n    USERS {\n        id\n    }", "属性定義として不正です"),
+    ("erDiagram\n    USERS -- ORDERS", "リレーションシップ"),
+    ("stateDiagram-v2\n    Draft -> Published", "'-->' で記述してください"),
+    ("stateDiagram\n    state Published {\n        [*] --> Visible", "閉じ括弧が 1 個不足しています"),
+    ("stateDiagram\n    }", "対応する '{' のない '}'"),
+    ("sequenceDiagramm\n    C->>S: GET", "不明な図の種類です"),
+    ("%% コメントだけ\n", "Mermaid図が空です"),
+])
+def test_invalid_diagrams_report_errors(code, expected):
+    errors = validate_mermaid(code)
+    assert any(expected in error for error in errors), errors
+
+
+def test_error_messages_include_line_numbers():
+    errors = validate_mermaid("sequenceDiagram\n    C->>S: GET\n    C => S GET")
+    assert errors == ["3行目: sequenceDiagram として解釈できない行です: C => S GET"]
+
+
+def test_split_mermaid_parts_keeps_order():
+    markdown = "# 見出し\n\n```mermaid\nsequenceDiagram\n  A->>B: x\n```\n\n本文\n```mermaid\nerDiagram\n```"
+    parts = split_mermaid_parts(markdown)
+    assert [part["type"] for part in parts] == ["markdown", "mermaid", "markdown", "mermaid"]
+    assert parts[0]["text"] == "# 見出し\n\n"
+    assert parts[1]["code"] == "sequenceDiagram\n  A->>B: x"
+    assert parts[2]["text"] == "\n\n本文\n"
+    assert parts[3]["code"] == "erDiagram"
+
+
+def test_split_mermaid_parts_without_blocks():
+    assert split_mermaid_parts("本文だけ") == [{"type": "markdown", "text": "本文だけ"}]
+    assert split_mermaid_parts("") == []
+
+
+def test_validate_document_reports_missing_sections():
+    report = validate_document("## 1. API概要\n本文\n", ["API概要", "認証・認可"])
+    assert not report["valid"]
+    assert report["missing_sections"] == ["認証・認可"]
+    assert report["mermaid_errors"] == []
+
+
+# --- validate_and_repair_document ---
+
+class StubRepairAgent:
+    """DocumentRepairAgent の代わりに、用意した応答を順に返すスタブです。"""
+    responses = []
+    prompts = []
+
+    def __init__(self, app_config, tier=None):
+        self.last_usage = None
+
+    def generate_mermaid_repair_prompt(self, code, errors):
+        return f"repair:{code}"
+
+    def generate_section_prompt(self, section_title, source_context):
+        return f"section:{section_title}"
+
+
+class StubUserProxy:
+    """initiate_chat で受け取ったメッセージを記録し、StubRepairAgent.responses を順に応答として返します。"""
+    def __init__(self):
+        self._last = None
+
+    def initiate_chat(self, recipient, message, max_turns, clear_history):
+        StubRepairAgent.prompts.append(message)
+        self._last = StubRepairAgent.responses.pop(0) if StubRepairAgent.responses else None
+
+    def last_message(self, agent):
+        return {"content": self._last}
+
+
+@pytest.fixture
+def repair_agent(monkeypatch):
+    module = types.ModuleType("agents.document_repair_agent")
+    module.DocumentRepairAgent = StubRepairAgent
+    monkeypatch.setitem(sys.modules, "agents.document_repair_agent", module)
+    StubRepairAgent.responses, StubRepairAgent.prompts = [], []
+    return StubRepairAgent
+
+
+APP_CONFIG = {"validation_settings": {"enabled": True, "max_repair_attempts": 2,
+                                      "required_sections": {"api_design": ["API概要", "シーケンス図", "依存関係"]}}}
+BROKEN_BLOCK = "```mermaid\nsequenceDiagram\n    C->>S: GET\n    alt ok\n        S-->>C: 200\n```"
+FIXED_BLOCK = "```mermaid\nsequenceDiagram\n    C->>S: GET\n    alt ok\n        S-->>C: 200\n    end\n```"
+
+
+def _repair(document):
+    logs = []
+    repaired = pipeline.validate_and_repair_document(APP_CONFIG, StubUserProxy(), document, "api_design", "分析情報",
+                                                     lambda message, level: logs.append((level, message)))
+    return repaired, logs
+
+
+def test_valid_document_is_returned_without_calling_the_agent(repair_agent):
+    document = f"## API概要\n## シーケンス図\n{FIXED_BLOCK}\n## 依存関係\n"
+    assert _repair(document)[0] == document
+    assert repair_agent.prompts == []
+
+
+def test_broken_mermaid_block_is_replaced_after_a_failed_attempt(repair_agent):
+    document = f"## API概要\n## シーケンス図\n{BROKEN_BLOCK}\n## 依存関係\n"
+    repair_agent.responses = ["```mermaid\nsequenceDiagram\n    C => S\n```", FIXED_BLOCK]
+    repaired, logs = _repair(document)
+    assert repaired == f"## API概要\n## シーケンス図\n{FIXED_BLOCK}\n## 依存関係\n"
+    # 2回目はローカル検証に失敗した1回目の修正結果を修正させる
+    assert repair_agent.prompts[1] == "repair:sequenceDiagram\n    C => S"
+    assert ("info", "  Mermaid図 1 を修正しました。") in logs
+
+
+def test_unrepairable_block_is_kept(repair_agent):
+    document = f"## API概要\n## シーケンス図\n{BROKEN_BLOCK}\n## 依存関係\n"
+    repair_agent.responses = ["", "```mermaid\nsequenceDiagram\n    C => S\n```"]
+    repaired, logs = _repair(document)
+    assert repaired == document
+    assert any("2 回の修正で解消できませんでした" in message for _, message in logs)
+
+
+def test_missing_section_is_inserted_before_the_following_section(repair_agent):
+    repair_agent.responses = ["### シーケンス図\n本文"]
+    repaired, _ = _repair("## API概要\n概要\n## 依存関係\nなし\n")
+    assert repaired == "## API概要\n概要\n### シーケンス図\n本文\n\n## 依存関係\nなし\n"
+    assert repair_agent.prompts == ["section:シーケンス図"]
+
+
+def test_validation_can_be_disabled(repair_agent):
+    config = {"validation_settings": {"enabled": False}}
+    assert pipeline.validate_and_repair_document(config, StubUserProxy(), BROKEN_BLOCK, "api_design", "",
+                                                 lambda message, level: None) == BROKEN_BLOCK
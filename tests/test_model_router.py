@@ -0,0 +1,90 @@
+# core.model_router のテストです。
+
+import pytest
+
+from core.model_router import build_llm_config, endpoint_complexity, responding_model, route_for, tier_models
+
+
+def _config(**routing):
+    return {
+        "llm_config": {"model": "base-model", "temperature": 0.3},
+        "model_routing": {
+            "enabled": True,
+            "default_tier": "fast",
+            "tiers": {
+                "fast": {"model": "fast-model", "fallback_models": ["fast-backup", "fast-model", "shared-backup"]},
+                "strong": {"model": "strong-model", "fallback_models": ["shared-backup"], "timeout_seconds": 180, "max_retries": 1},
+            },
+            "tasks": {"db_design": "strong"},
+            "agents": {"DBDesignGenerator": "fast", "JavaCodeAnalyzer": "strong"},
+            **routing,
+        },
+    }
+
+
+@pytest.mark.parametrize("task, agent_name, expected_tier", [
+    # タスク別の指定は Agent 別の指定より優先される
+    ("db_design", "DBDesignGenerator", "strong"),
+    ("codebase_analyzer", "JavaCodeAnalyzer", "strong"),
+    # どちらにも指定がなければ既定のティア
+    ("api_design", "APIDesignGenerator", "fast"),
+    ("api_design", None, "fast"),
+])
+def test_tier_resolution_order(task, agent_name, expected_tier):
+    assert route_for(_config(), task, agent_name)["tier"] == expected_tier
+
+
+def test_models_are_returned_in_fallback_order_without_duplicates():
+    assert route_for(_config(), "api_design")["models"] == ["fast-model", "fast-backup", "shared-backup"]
+    assert route_for(_config(), "db_design")["models"] == ["strong-model", "shared-backup"]
+
+
+def test_disabled_routing_uses_llm_config_model():
+    config = _config(enabled=False)
+    route = route_for(config, "db_design", "DBDesignGenerator")
+    assert (route["tier"], route["models"]) == (None, ["base-model"])
+
+
+def test_undefined_tier_falls_back_to_llm_config_model():
+    route = route_for(_config(tasks={"api_design": "missing"}), "api_design")
+    assert (route["tier"], route["models"]) == ("missing", ["base-model"])
+
+
+def test_tier_without_model_uses_llm_config_model_first():
+    config = _config(tiers={"fast": {"fallback_models": ["fast-backup"]}})
+    assert tier_models(config, "fast") == ["base-model", "fast-backup"]
+
+
+def test_llm_config_lists_the_models_in_fallback_order():
+    llm_config = build_llm_config(_config(timeout_seconds=120), "strong")
+    assert llm_config["config_list"] == [{"model": "strong-model", "max_retries": 1}, {"model": "shared-backup", "max_retries": 1}]
+    assert llm_config["timeout"] == 180
+    assert llm_config["temperature"] == 0.3
+    assert build_llm_config(_config(timeout_seconds=120), "fast")["timeout"] == 120
+
+
+def test_auto_tier_uses_prompt_size_and_endpoint_complexity():
+    config = _config(tasks={"api_design": "auto"}, auto={"strong_min_prompt_tokens": 100, "strong_min_endpoint_calls": 3})
+    assert route_for(config, "api_design", prompt="短い")["tier"] == "fast"
+    assert route_for(config, "api_design", prompt="長い" * 1000)["tier"] == "strong"
+    assert route_for(config, "api_design", complexity=3)["tier"] == "strong"
+    assert route_for(config, "api_design", complexity=2)["tier"] == "fast"
+
+
+def test_endpoint_complexity_counts_reachable_calls(discovery):
+    # UserController.getUser → UserService.findUser → UserRepository.findById
+    assert endpoint_complexity("GET /api/users/{userId}", discovery) == 2
+    assert endpoint_complexity("DELETE /api/unknown", discovery) is None
+    assert endpoint_complexity("GET /api/users/{userId}", None) is None
+
+
+@pytest.mark.parametrize("response_model, expected", [
+    ("gpt-4o-mini-2024-07-18", "gpt-4o-mini"),
+    ("gpt-4o-2024-08-06", "gpt-4o"),
+    ("gpt-4o", "gpt-4o"),
+    ("gpt-4-0613", "gpt-4"),
+    ("gpt-4.1-mini", None),
+    (None, None),
+])
+def test_responding_model_matches_the_exact_model(response_model, expected):
+    assert responding_model(response_model, ["gpt-4o", "gpt-4o-mini", "gpt-4"]) == expected
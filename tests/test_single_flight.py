@@ -0,0 +1,106 @@
+# core.single_flight のテストです。
+
+import threading
+import types
+
+import pytest
+
+from core import single_flight
+from core.single_flight import SingleFlight, analysis_request_key
+
+
+def test_joiner_receives_the_leaders_result():
+    coordinator = SingleFlight()
+    started, release, joined = threading.Event(), threading.Event(), threading.Event()
+    calls, outcomes = [], {}
+
+    def pipeline():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"status": "Success", "api_docs": {"GET /api/users": "doc"}}
+
+    def call(name, on_join=None):
+        outcomes[name] = coordinator.run("key", pipeline, on_join=on_join)
+
+    leader = threading.Thread(target=call, args=("leader",))
+    leader.start()
+    started.wait(5)
+    joiner = threading.Thread(target=call, args=("joiner", lambda role: joined.set()))
+    joiner.start()
+    assert joined.wait(5)
+    release.set()
+    leader.join(5)
+    joiner.join(5)
+
+    assert calls == [1]
+    assert outcomes["leader"][1] == "leader"
+    assert outcomes["joiner"][1] == "joined"
+    assert outcomes["joiner"][0] == outcomes["leader"][0]
+    # 合流したセッションには独立したコピーが返される
+    assert outcomes["joiner"][0] is not outcomes["leader"][0]
+
+
+def test_joiner_receives_the_leaders_exception():
+    coordinator = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            coordinator.run("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call, daemon=True))
+    threads[1].start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ["boom", "boom"]
+    # 失敗した結果は保持されず、次の呼び出しで実行し直す
+    assert coordinator.run("key", lambda: "ok") == ("ok", "leader")
+
+
+def test_cache_if_decides_whether_results_are_reused():
+    coordinator = SingleFlight()
+    partial = {"status": "Success", "failed_items": ["GET /api/orders"]}
+    cache_if = lambda r: r.get("status") == "Success" and not r.get("failed_items")
+
+    assert coordinator.run("key", lambda: partial, cache_if=cache_if)[1] == "leader"
+    # 一部失敗した結果はキャッシュされず、次の呼び出しで再実行される
+    complete = {"status": "Success", "failed_items": []}
+    assert coordinator.run("key", lambda: complete, cache_if=cache_if) == (complete, "leader")
+    roles = []
+    result, role = coordinator.run("key", lambda: pytest.fail("再実行された"), cache_if=cache_if, on_join=roles.append)
+    assert (result, role, roles) == (complete, "cached", ["cached"])
+
+
+def test_cached_results_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(single_flight, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    coordinator = SingleFlight(result_ttl_seconds=60)
+    coordinator.run("key", lambda: "first")
+
+    now[0] += 59
+    assert coordinator.run("key", lambda: "second") == ("first", "cached")
+    now[0] += 2
+    assert coordinator.run("key", lambda: "second") == ("second", "leader")
+
+
+def test_request_key_ignores_the_checkout_location(tmp_path):
+    for checkout in ("a", "b"):
+        (tmp_path / checkout).mkdir()
+        (tmp_path / checkout / "User.java").write_text("public class User {}", encoding="utf-8")
+    key_a = analysis_request_key(str(tmp_path / "a"), [tmp_path / "a" / "User.java"], {"llm_config": {"model": "m"}})
+    key_b = analysis_request_key(str(tmp_path / "b"), [tmp_path / "b" / "User.java"], {"llm_config": {"model": "m"}})
+    assert key_a == key_b
+    assert key_a != analysis_request_key(str(tmp_path / "a"), [tmp_path / "a" / "User.java"], {"llm_config": {"model": "n"}})
@@ -0,0 +1,93 @@
+# core.site_exporter の Markdown レンダラーと検索インデックスのテストです。
+
+import json
+
+import pytest
+
+from core.site_exporter import (_entity_pattern, _make_entity_linker, build_search_index_js, extract_entity_names,
+                                render_markdown)
+
+
+def _html(markdown_text, linker=None):
+    return render_markdown(markdown_text, linker)[0]
+
+
+def test_headings_get_unique_and_table_anchors():
+    html_text, headings = render_markdown("# 概要\n## テーブル名: `users`\n## 概要")
+    assert html_text == ('<h1 id="sec-1">概要</h1>\n<h2 id="table-users">テーブル名: <code>users</code></h2>\n'
+                         '<h2 id="sec-3">概要</h2>')
+    assert [heading["id"] for heading in headings] == ["sec-1", "table-users", "sec-3"]
+
+
+def test_nested_lists_tables_and_quotes():
+    assert _html("- a\n  - b\n- c\n\n1. x") == \
+        "<ul>\n<li>a\n<ul>\n<li>b</li>\n</ul></li>\n<li>c</li>\n</ul>\n<ol>\n<li>x</li>\n</ol>"
+    assert _html("| 名前 | 型 |\n|---|:--:|\n| `id` | **Long** |") == (
+        "<table><thead><tr><th>名前</th><th>型</th></tr></thead><tbody>\n"
+        "<tr><td><code>id</code></td><td><strong>Long</strong></td></tr>\n</tbody></table>")
+    assert _html("> 引用\n> 続き") == "<blockquote><p>引用<br>\n続き</p></blockquote>"
+
+
+def test_code_blocks_and_mermaid_are_escaped():
+    assert _html("```mermaid\nA-->B<C\n```") == '<pre class="mermaid">A--&gt;B&lt;C</pre>'
+    assert _html("```java\nif (a < b) {}\n```") == '<pre><code class="language-java">if (a &lt; b) {}</code></pre>'
+
+
+def test_raw_html_is_escaped():
+    assert _html("<script>alert(1)</script> *強調*") == "<p>&lt;script&gt;alert(1)&lt;/script&gt; <em>強調</em></p>"
+
+
+@pytest.mark.parametrize("markdown_text, expected", [
+    ("[API](https://example.com/a_(b))", '<a href="https://example.com/a_(b)">API</a>'),
+    ("[API](http://example.com)", '<a href="http://example.com">API</a>'),
+    ("[連絡先](mailto:dev@example.com)", '<a href="mailto:dev@example.com">連絡先</a>'),
+    ("[節](#sec-1)", '<a href="#sec-1">節</a>'),
+    ("[DB](../db.html#table-users)", '<a href="../db.html#table-users">DB</a>'),
+])
+def test_safe_links_are_rendered(markdown_text, expected):
+    assert _html(markdown_text) == f"<p>{expected}</p>"
+
+
+@pytest.mark.parametrize("markdown_text", [
+    "[click](javascript:alert(1))",
+    "[click](JavaScript:alert(document.cookie))",
+    "[click](data:text/html;base64,PHNjcmlwdD4=)",
+    "[click](vbscript:msgbox(1))",
+])
+def test_unsafe_links_are_rendered_as_text(markdown_text):
+    rendered = _html(markdown_text)
+    assert "<a " not in rendered
+    assert rendered == f"<p>{markdown_text}</p>"
+
+
+def test_entity_names_are_linked_outside_code():
+    db_document = "### テーブル名: users\n- **クラス名**: `com.example.User`\n### テーブル名: orders\n"
+    anchors = extract_entity_names(db_document)
+    assert anchors == {"users": "table-users", "User": "table-users", "orders": "table-orders"}
+    linker = _make_entity_linker(_entity_pattern(list(anchors)), anchors, "../db.html")
+    assert _html("Userテーブルを参照します (`User` と superUser は除く)。", linker) == (
+        '<p><a class="xref" href="../db.html#table-users">User</a>テーブルを参照します '
+        '(<code>User</code> と superUser は除く)。</p>')
+
+
+def _search_index(pages, snippet_chars=160):
+    script = build_search_index_js(pages, snippet_chars)
+    assert script.startswith("window.SEARCH_INDEX = ") and script.endswith(";\n")
+    return json.loads(script[len("window.SEARCH_INDEX = "):-2])
+
+
+def test_search_index_contains_sorted_postings():
+    index = _search_index([
+        {"title": "GET /api/users", "path": "api/get-users.html", "search_text": "## ユーザー取得\n`getUserById` を呼び出します。"},
+        {"title": "データベース設計書", "path": "db.html", "search_text": "| users | ユーザー |"},
+    ], snippet_chars=12)
+    assert index["docs"] == [["GET /api/users", "api/get-users.html", "ユーザー取得 getUs"],
+                             ["データベース設計書", "db.html", "users ユーザー"]]
+    assert index["keys"] == sorted(index["keys"])
+    postings = dict(zip(index["keys"], index["postings"]))
+    # キャメルケースの分割と日本語の bi-gram
+    assert postings["getuserbyid"] == [0]
+    assert postings["user"] == [0]
+    assert postings["users"] == [0, 1]
+    assert postings["ユー"] == [0, 1]
+    assert postings["設計"] == [1]
@@ -0,0 +1,104 @@
+# core.source_loader のテストです。
+
+import codecs
+import sys
+
+import pytest
+
+from core.source_loader import SourceLoader, decode_source_bytes
+
+JAPANESE_SOURCE = "// 顧客マスタを取得するサービス\npublic class CustomerService {}\n"
+ENCODINGS = ["utf-8", "cp932", "euc_jp", "iso2022_jp"]
+
+
+@pytest.mark.parametrize("data, expected_encoding", [
+    (codecs.BOM_UTF8 + JAPANESE_SOURCE.encode("utf-8"), "utf-8-sig"),
+    (JAPANESE_SOURCE.encode("utf-16"), "utf-16"),
+    (JAPANESE_SOURCE.encode("utf-8"), "utf-8"),
+    (JAPANESE_SOURCE.encode("cp932"), "cp932"),
+    (JAPANESE_SOURCE.encode("euc_jp"), "euc_jp"),
+    (JAPANESE_SOURCE.encode("iso2022_jp"), "iso2022_jp"),
+])
+def test_detects_japanese_encodings(data, expected_encoding):
+    assert decode_source_bytes(data, ENCODINGS) == (JAPANESE_SOURCE, expected_encoding)
+
+
+def test_undecodable_bytes_are_replaced_instead_of_raising():
+    text, encoding = decode_source_bytes(b"class A {} \xff\xfe\xff", ["utf-8"])
+    assert text.startswith("class A {}")
+    assert "�" in text
+    assert encoding == "utf-8 (置換あり)"
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp932"])
+@pytest.mark.parametrize("mmap_threshold_bytes", [1024 * 1024, 1])
+def test_large_files_are_truncated_to_max_file_bytes(tmp_path, encoding, mmap_threshold_bytes):
+    path = tmp_path / "Generated.java"
+    data = ("// 自動生成されたコード\n" * 100).encode(encoding)
+    path.write_bytes(data)
+    # 上限がマルチバイト文字の途中になるようにする
+    max_file_bytes = len("// 自動".encode(encoding)) + 1
+    loader = SourceLoader({"max_file_bytes": max_file_bytes, "mmap_threshold_bytes": mmap_threshold_bytes})
+
+    loaded = loader.read_text(path)
+    assert loaded["error"] is None
+    assert loaded["truncated"] is True
+    assert loaded["size"] == len(data)
+    assert loaded["text"] == "// 自動"
+    assert loaded["encoding"] == encoding
+
+
+def test_max_chars_truncates_the_returned_text(tmp_path):
+    path = tmp_path / "User.java"
+    path.write_text("public class User {}", encoding="utf-8")
+    loaded = SourceLoader().read_text(path, max_chars=6)
+    assert (loaded["text"], loaded["truncated"]) == ("public", True)
+
+
+def test_read_many_keeps_input_order_and_reports_errors(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"Entity{i}.java"
+        path.write_text(f"public class Entity{i} {{}}", encoding="utf-8")
+        paths.append(path)
+    paths.insert(2, tmp_path / "Missing.java")
+
+    results = SourceLoader({"max_workers": 3}).read_many(paths)
+    assert [r["path"] for r in results] == paths
+    assert results[2]["error"] and results[2]["text"] == ""
+    assert [r["text"] for r in results if not r["error"]] == [f"public class Entity{i} {{}}" for i in range(5)]
+
+
+def test_modified_files_are_read_again(tmp_path):
+    path = tmp_path / "User.java"
+    path.write_text("public class User {}", encoding="utf-8")
+    loader = SourceLoader()
+    before = loader.content_hash(path)
+    assert loader.read_text(path)["text"] == "public class User {}"
+
+    path.write_text("public class User { String name; }", encoding="utf-8")
+    assert loader.read_text(path)["text"] == "public class User { String name; }"
+    assert loader.content_hash(path) != before
+
+
+def test_cache_stays_within_the_byte_budget(tmp_path):
+    text = "x" * 1000
+    budget = 3 * sys.getsizeof(text)
+    loader = SourceLoader({"cache_max_bytes": budget})
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"File{i}.java"
+        path.write_text(text, encoding="utf-8")
+        paths.append(path)
+        loader.read_text(path)
+        assert loader._cache_bytes <= budget
+
+    # 古いものから削除され、最近読んだファイルだけが残る
+    assert len(loader._cache) == 3
+    assert [key[1] for key in loader._cache] == [str(p) for p in paths[-3:]]
+
+    # 上限を超える値はキャッシュしない
+    large = tmp_path / "Large.java"
+    large.write_text("y" * (budget * 2), encoding="utf-8")
+    assert loader.read_text(large)["text"] == "y" * (budget * 2)
+    assert str(large) not in [key[1] for key in loader._cache]